@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the clitools framework overhead.
+
+Measures commands registration, argument parsing, mapping of parsed
+arguments to function arguments, docstrings parsing and the cold start
+of a sample application; results are written as JSON, so that they can
+be compared between versions::
+
+    % python benchmarks/run_benchmarks.py --output before.json
+    % git checkout my-branch
+    % python benchmarks/run_benchmarks.py --output after.json \\
+        --compare before.json
+
+Note: this script is not converted by 2to3, so it must run unchanged
+on Python 2 and 3 (clitools itself must be importable, of course).
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from timeit import default_timer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import clitools  # noqa
+from clitools import CliApp, extract_arguments_info  # noqa
+
+
+## Registry of benchmarks: (name, function, number of calls per timing)
+BENCHMARKS = []
+
+
+def benchmark(name, number):
+    """Register a function returning the callable to be timed"""
+    def decorator(func):
+        BENCHMARKS.append((name, func, number))
+        return func
+    return decorator
+
+
+def make_command(index):
+    def command(path, name='world', count=1, ratio=0.5, verbose=False,
+                tags=[str], extra=None):
+        return path, name
+    command.__name__ = 'cmd_{0}'.format(index)
+    return command
+
+
+## Registration
+##----------------------------------------
+
+@benchmark('create_app', number=200)
+def bench_create_app():
+    return CliApp
+
+
+def _bench_register(count):
+    commands = [make_command(i) for i in range(count)]
+
+    def run():
+        cli = CliApp()
+        for func in commands:
+            cli.command(func)
+    return run
+
+
+for _count, _number in ((10, 20), (100, 5), (1000, 1)):
+    benchmark('register_{0}'.format(_count), number=_number)(
+        lambda count=_count: _bench_register(count))
+
+
+## Parsing, for the signatures built by _arg_from_free_value
+##----------------------------------------
+
+PARSE_CASES = [
+    ('positional', ['PATH']),
+    ('flag', ['PATH', '--verbose']),
+    ('str', ['PATH', '--name', 'Python']),
+    ('int_float', ['PATH', '--count', '3', '--ratio', '0.25']),
+    ('append', ['PATH', '--tags', 'a', '--tags', 'b', '--tags', 'c']),
+    ('generic', ['PATH', '--extra', 'spam']),
+    ('all', ['PATH', '--name', 'Python', '--count', '3', '--ratio',
+             '0.25', '--verbose', '--tags', 'a', '--extra', 'spam']),
+]
+
+
+def _make_app():
+    cli = CliApp()
+    cli.command(make_command(0))
+    return cli
+
+
+def _bench_parse(args):
+    parser = _make_app().parser
+    args = ['cmd_0'] + args
+    return lambda: parser.parse_args(args)
+
+
+for _name, _args in PARSE_CASES:
+    benchmark('parse_{0}'.format(_name), number=2000)(
+        lambda args=_args: _bench_parse(args))
+
+
+## Mapping of parsed arguments to function arguments
+##----------------------------------------
+
+@benchmark('call_mapping', number=20000)
+def bench_call_mapping():
+    parsed_args = _make_app().parser.parse_args(['cmd_0', 'PATH'])
+    command = parsed_args.func
+    return lambda: command(parsed_args)
+
+
+@benchmark('get_call_args', number=50000)
+def bench_get_call_args():
+    parsed_args = _make_app().parser.parse_args(['cmd_0', 'PATH'])
+    command = parsed_args.func
+    return lambda: command.get_call_args(parsed_args)
+
+
+@benchmark('get_call_args_wide', number=20000)
+def bench_get_call_args_wide():
+    ## 4 positional and 20 keyword arguments
+    args = ', '.join(['a', 'b', 'c', 'd'] + [
+        'k{0}={0}'.format(i) for i in range(20)])
+    namespace = {}
+    exec('def wide({0}):\n    pass\n'.format(args), namespace)
+    cli = CliApp()
+    cli.command(namespace['wide'])
+    parsed_args = cli.parser.parse_args(['wide', '1', '2', '3', '4'])
+    command = parsed_args.func
+    return lambda: command.get_call_args(parsed_args)
+
+
+## Docstrings parsing
+##----------------------------------------
+
+def _make_docstring(params):
+    lines = ['A command with lots of arguments.', '',
+             'Some longer description of what it does.', '']
+    for i in range(params):
+        lines.append(':param arg{0}: Help text for argument {0},'.format(i))
+        lines.append('    spanning more than one line')
+        lines.append(':type arg{0}: int'.format(i))
+    return '\n'.join(lines)
+
+
+## Parsed docstrings are memoized by extract_arguments_info: the
+## parsing itself is timed (versions without the cache only have
+## extract_arguments_info, which then does the same work).
+parse_arguments_info = getattr(
+    clitools, '_parse_arguments_info', extract_arguments_info)
+
+
+@benchmark('docstring_10_params', number=2000)
+def bench_docstring_small():
+    doc = _make_docstring(10)
+    return lambda: parse_arguments_info(doc)
+
+
+@benchmark('docstring_200_params', number=100)
+def bench_docstring_large():
+    doc = _make_docstring(200)
+    return lambda: parse_arguments_info(doc)
+
+
+## End-to-end
+##----------------------------------------
+
+@benchmark('cold_start_sample_app', number=1)
+def bench_cold_start():
+    script = os.path.join(ROOT_DIR, 'examples', 'sample_app.py')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT_DIR] + [p for p in [env.get('PYTHONPATH')] if p])
+    devnull = open(os.devnull, 'w')
+
+    def run():
+        subprocess.check_call(
+            [sys.executable, script, 'hello', '--name', 'Python'],
+            env=env, stdout=devnull)
+    return run
+
+
+## Runner
+##----------------------------------------
+
+def measure(func, number, repeat):
+    """
+    :return: a list with the time per call, in seconds,
+        for each of the ``repeat`` timings
+    """
+    timings = []
+    for _ in range(repeat):
+        start = default_timer()
+        for _ in range(number):
+            func()
+        timings.append((default_timer() - start) / number)
+    return timings
+
+
+def run_benchmarks(selected=None, repeat=5):
+    results = {}
+    for name, setup, number in BENCHMARKS:
+        if selected and not any(s in name for s in selected):
+            continue
+        timings = measure(setup(), number, repeat)
+        results[name] = {
+            'min': min(timings),
+            'mean': sum(timings) / len(timings),
+            'number': number,
+            'repeat': repeat,
+        }
+        print('{0:<24} {1:12.3f} us'.format(name, min(timings) * 1e6),
+              file=sys.stderr)
+    return results
+
+
+def compare(results, baseline):
+    """Print a comparison table with the baseline results"""
+    print('\n{0:<24} {1:>12} {2:>12} {3:>8}'.format(
+        'benchmark', 'baseline us', 'current us', 'ratio'))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['min'], results[name]['min']
+        print('{0:<24} {1:12.3f} {2:12.3f} {3:7.2f}x'.format(
+            name, old * 1e6, new * 1e6, new / old))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        'benchmarks', nargs='*',
+        help='Only run benchmarks whose name contains any of these')
+    parser.add_argument(
+        '--output', metavar='FILE',
+        help='Write results to FILE, as JSON')
+    parser.add_argument(
+        '--compare', metavar='FILE',
+        help='Compare results with a previous JSON results file')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='Number of timings for each benchmark (default: 5)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.benchmarks, repeat=args.repeat)
+    data = {
+        'clitools_version': clitools.__version__,
+        'python_version': platform.python_version(),
+        'python_implementation': platform.python_implementation(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(results, json.load(fp)['results'])
+
+
+if __name__ == '__main__':
+    main()
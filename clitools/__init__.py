@@ -22,7 +22,16 @@ Example usage::
 
 import argparse
 import logging
+import os
 import sys
+import threading
+import time
+
+try:
+    string_types = basestring
+    text_type = unicode
+except NameError:  # Python 3
+    string_types = text_type = str
 
 
 __version__ = '0.4a2'  # sync with setup.py!
@@ -30,29 +39,271 @@ __version__ = '0.4a2'  # sync with setup.py!
 
 logger = logging.getLogger('clitools')
 
+## Separator of commands in pipelines, see :py:mod:`clitools.pipeline`
+PIPE_SEPARATOR = ':::'
+
+
+class CommandSpec(object):
+    """
+    Information about a command function, as extracted by
+    :py:meth:`CliApp._analyze_function` (in the ``func_info`` dict).
+    """
+
+    __slots__ = (
+        'name', 'help_text', 'positional_args', 'keyword_args',
+        'accepts_varargs', 'varargs_name', 'accepts_kwargs', 'kwargs_name',
+        'is_generator', 'is_coroutine', 'is_async_generator')
+
+    def __init__(self, **kwargs):
+        for key in self.__slots__:
+            setattr(self, key, kwargs.get(key))
+        self.positional_args = tuple(self.positional_args or ())
+        self.keyword_args = tuple(self.keyword_args or ())
+
+    @classmethod
+    def from_func_info(cls, func_info):
+        return cls(**func_info)
+
+    def to_func_info(self):
+        """:return: the information as a ``func_info`` dict"""
+        info = dict((key, getattr(self, key)) for key in self.__slots__)
+        info['positional_args'] = list(self.positional_args)
+        info['keyword_args'] = list(self.keyword_args)
+        return info
+
+
+def compile_args_mapper(spec):
+    """
+    Build a function mapping a parsed arguments namespace to the
+    tuple of arguments to call a command function with.
+
+    The function is generated as code, so that each call just reads
+    the needed attributes from the namespace, in order; if any of
+    the keyword arguments is missing, we fall back to its default.
+    """
+    names = list(spec.positional_args) + [
+        argname for argname, _ in spec.keyword_args]
+
+    def map_args_slow(ns):
+        args = []
+        for argname in spec.positional_args:
+            args.append(getattr(ns, argname))
+        for argname, default in spec.keyword_args:
+            args.append(getattr(ns, argname, default))
+        return tuple(args)
+
+    source = '\n'.join([
+        'def map_args(ns):',
+        '    try:',
+        '        return ({0})'.format(''.join(
+            'ns.{0}, '.format(argname) for argname in names)),
+        '    except AttributeError:',
+        '        return map_args_slow(ns)',
+    ])
+    namespace = {'map_args_slow': map_args_slow}
+    exec(compile(source, '<args mapper: {0}>'.format(spec.name), 'exec'),
+         namespace)
+    return namespace['map_args']
+
 
 class Command(object):
-    def __init__(self, func, func_info):
+    def __init__(self, func, func_info, options=None):
         self.func = func
-        self.func_info = func_info
+        self.spec = CommandSpec.from_func_info(func_info)
+        self.options = options or {}
+        self._map_args = compile_args_mapper(self.spec)
+
+        ## Full name of the command, including groups
+        self.name = self.spec.name
+
+        ## Names of the arguments which may need to be opened as
+        ## files (see :py:mod:`clitools.files`), before calling
+        self.file_args = ()
+
+        ## Position of the argument to map the command over,
+        ## for commands registered with ``map_over``
+        self.map_index = None
+
+        ## Name of the argument taking the items produced by the
+        ## previous command in a pipeline, if any (see ``pipe_input``)
+        self.pipe_input = None
         logger.debug('-- New CliApp instance')
 
+    @property
+    def func_info(self):
+        return self.spec.to_func_info()
+
     def __call__(self, parsed_args):
         """
         We need to map parsed arguments to function arguments
         before calling..
         """
+        args, kwargs = self.get_call_args(parsed_args)
+        return self.invoke(args, kwargs)
 
-        args = []
-        kwargs = {}
+    def get_call_args(self, parsed_args):
+        """
+        Map parsed arguments to function arguments
+
+        :return: an ``(args, kwargs)`` tuple
+        """
+        return self._map_args(parsed_args), {}
 
-        for argname in self.func_info['positional_args']:
-            args.append(getattr(parsed_args, argname))
+    def invoke(self, args, kwargs):
+        """Call the command function, running coroutines to completion"""
+        result = self.func(*args, **kwargs)
 
-        for argname, default in self.func_info['keyword_args']:
-            kwargs[argname] = getattr(parsed_args, argname, default)
+        if self.spec.is_coroutine:
+            from clitools.aio import run_coroutine
+            return run_coroutine(result)
 
-        return self.func(*args, **kwargs)
+        if self.spec.is_async_generator:
+            from clitools.aio import iter_async
+            return iter_async(result)
+
+        return result
+
+
+class _RunState(object):
+    """
+    CliApp attribute for state of the current run, as set by global
+    options: a value set in a thread only applies to that thread, so
+    that commands can be run concurrently with different options (see
+    :py:meth:`CliApp.invoke`). Threads running commands on behalf of
+    a run (eg. for batches) get its state passed explicitly, with
+    :py:meth:`CliApp._get_run_state`.
+    """
+
+    def __init__(self, name, default):
+        self.name = name
+        self.default = default
+
+    def __get__(self, app, owner):
+        if app is None:
+            return self
+        return getattr(app._local, self.name, self.default)
+
+    def __set__(self, app, value):
+        setattr(app._local, self.name, value)
+
+
+class CommandParser(argparse.ArgumentParser):
+    """
+    ArgumentParser taking help texts from the command function
+    docstring (``:param:`` blocks), which is only parsed when the
+    help is actually rendered.
+    """
+
+    #: Docstring of the command function, for command subparsers
+    docstring = None
+
+    def format_help(self):
+        self._apply_docstrings()
+        return argparse.ArgumentParser.format_help(self)
+
+    def _apply_docstrings(self):
+        info = _get_docstring_info(self.docstring)
+        if info is not None:
+            if self.description is None:
+                self.description = info['function_help'].strip() or None
+            for action in self._actions:
+                param = info['params_help'].get(action.dest)
+                if param is not None and action.help is None:
+                    action.help = _escape_help(param.get('help'))
+
+        ## Show just the description in the list of commands,
+        ## instead of the whole docstring
+        for action in self._actions:
+            if not isinstance(action, argparse._SubParsersAction):
+                continue
+            for choice_action in action._choices_actions:
+                subparser = action.choices.get(choice_action.dest)
+                doc = getattr(subparser, 'docstring', None)
+                info = _get_docstring_info(doc)
+                if info is not None and choice_action.help == doc:
+                    choice_action.help = _escape_help(
+                        info['function_help'].strip())
+
+
+def _get_docstring_info(docstring):
+    """
+    Get arguments information from a docstring, if any
+
+    :return: the :py:func:`extract_arguments_info` results, or None
+        if the docstring is missing or can't be parsed.
+    """
+    if docstring is None:
+        return None
+    try:
+        return extract_arguments_info(docstring)
+    except ValueError:
+        logger.debug('Unable to parse docstring', exc_info=True)
+        return None
+
+
+def _escape_help(text):
+    """Escape text for use as help, which gets %-formatted by argparse"""
+    if text is None:
+        return None
+    return text.replace('%', '%%')
+
+
+## Types that can be declared for arguments in docstrings
+## (as import paths, for types only imported if needed)
+DOCSTRING_TYPES = {
+    'int': int,
+    'float': float,
+    'str': str,
+    'file': 'clitools.files:InputFile',
+}
+
+
+def _declares_type(docstring, name):
+    """
+    Quick check for a docstring (possibly) declaring the type of an
+    argument, without parsing it: false positives are harmless.
+    """
+    if docstring is None:
+        return False
+    if ':type {0}:'.format(name) in docstring:
+        return True
+    ## ``:param <type> <name>:``, as opposed to ``:param <name>:``
+    return docstring.count(' {0}:'.format(name)) \
+        > docstring.count(':param {0}:'.format(name))
+
+
+class DocType(object):
+    """
+    Argument type declared in the command function docstring
+    (``:type name: int`` or ``:param int name:``), only looked up
+    when a value actually needs to be converted.
+    """
+
+    def __init__(self, docstring, name):
+        self.docstring = docstring
+        self.name = name
+
+    def resolve(self):
+        """:return: the declared type, or None"""
+        info = _get_docstring_info(self.docstring)
+        if info is None:
+            return None
+        param = info['params_help'].get(self.name, {})
+        type_ = DOCSTRING_TYPES.get(param.get('type'))
+        if isinstance(type_, string_types):
+            type_ = import_object(type_)
+        return type_
+
+    def __call__(self, value):
+        type_ = self.resolve()
+        if type_ is None:
+            return value
+        return type_(value)
+
+    @property
+    def __name__(self):
+        ## Used by argparse in error messages
+        return getattr(self.resolve(), '__name__', 'str')
 
 
 class CliApp(object):
@@ -62,25 +313,576 @@ class CliApp(object):
             self.args = a
             self.kwargs = kw
 
-    def __init__(self, prog_name='cli-app'):
+    ## Whether to read / write cached results, as per
+    ## the --no-cache and --refresh options
+    _cache_read = _RunState('_cache_read', True)
+    _cache_write = _RunState('_cache_write', True)
+
+    ## Output format for results, as per --output-format
+    _output_format = _RunState('_output_format', None)
+
+    ## Concurrency and rate limit for mapped commands, as per
+    ## --map-jobs and --map-rate (None for the command defaults)
+    _map_jobs = _RunState('_map_jobs', None)
+    _map_rate = _RunState('_map_rate', None)
+
+    def __init__(self, prog_name='cli-app', lazy=False, manifest=None,
+                 fast_parse=False, cache_dir=None, cache_size=None,
+                 abbreviations=False):
+        """
+        :param prog_name: Program name, as shown in usage messages
+        :param lazy: If True, commands will only be analyzed and get
+            their subparser built when actually invoked.
+        :param manifest: Path to a manifest file, used to cache
+            the information extracted from command functions.
+        :param fast_parse: If True, arguments of commands with
+            simple signatures will be parsed without going through
+            argparse (which is still used for anything else).
+        :param cache_dir: Directory for the results of commands
+            registered with ``cache=True`` (defaults to a directory
+            named after ``prog_name``, in ``~/.cache/clitools``)
+        :param cache_size: Maximum size of the results cache, in bytes
+        :param abbreviations: If True, commands can be abbreviated
+            to any unique prefix of their name.
+        """
         self.prog_name = prog_name
-        self.parser = argparse.ArgumentParser(prog=prog_name)
+        self.lazy = lazy
+        self.fast_parse = fast_parse
+        self.abbreviations = abbreviations
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self._result_cache = None
+        self.manifest = None
+        if manifest is not None:
+            from clitools.manifest import Manifest
+            self.manifest = Manifest(manifest)
+        self.parser = CommandParser(prog=prog_name)
         self.subparsers = self.parser.add_subparsers(help='sub-commands')
 
+        ## Options handled by CliApp itself, before running any command
+        self._options_parser = argparse.ArgumentParser(
+            prog=prog_name, add_help=False)
+        self._add_global_option(
+            '--batch', metavar='FILE',
+            help='Run commands read from FILE (or - for standard input), '
+            'one per line')
+        self._add_global_option(
+            '--batch-fail-fast', action='store_true', default=False,
+            help='Stop running batch commands at the first failure')
+        self._add_global_option(
+            '--jobs', metavar='N', type=int, default=1,
+            help='Number of batch (or --map-stdin) commands to run '
+            'concurrently')
+        self._add_global_option(
+            '--ordered', action='store_true', default=False,
+            help='Write the output of concurrent batch commands in '
+            'input order')
+        self._add_global_option(
+            '--job-timeout', metavar='SECONDS', type=float, default=None,
+            help='Timeout for each batch command')
+        self._add_global_option(
+            '--map-stdin', action='store_true', default=False,
+            help='Run the command once per line read from standard '
+            'input, passing the line as its positional argument')
+        self._add_global_option(
+            '--profile', metavar='FILE',
+            help='Profile the run, writing statistics to FILE '
+            '(or a text report to standard error, for -)')
+        self._add_global_option(
+            '--profile-sort', metavar='KEY', default='cumulative',
+            help='Sort key for the profile text report')
+        self._add_global_option(
+            '--output-format', metavar='FORMAT',
+            help='Write out return values and yielded items as: lines, '
+            'json, jsonl, csv, tsv or msgpack')
+        self._add_global_option(
+            '--map-jobs', metavar='N', type=int, default=None,
+            help='Number of concurrent calls, for commands mapped '
+            'over a list argument')
+        self._add_global_option(
+            '--map-rate', metavar='RATE', type=float, default=None,
+            help='Maximum number of calls started per second, for '
+            'commands mapped over a list argument')
+        self._add_global_option(
+            '--no-cache', action='store_true', default=False,
+            help="Don't use cached command results")
+        self._add_global_option(
+            '--refresh', action='store_true', default=False,
+            help='Run commands even if their results are cached, '
+            'updating the cache')
+
+        self._init_commands()
+
+        ## Per-thread state of runs, see :py:class:`_RunState`
+        self._local = threading.local()
+
+    def _init_commands(self):
+        """Initialize the commands registry"""
+
+        ## Loaded commands, by name
+        self._commands = {}
+
+        ## Compiled fast-path parsers (or None), by command name
+        self._fast_parsers = {}
+
+        ## Lazily-registered commands, waiting to be loaded
+        self._pending = {}
+        self._pending_names = []
+
+        ## "Stub" subparsers of pending commands, only used
+        ## to list available commands in help / error messages
+        self._stubs = {}
+
+        ## Groups of commands, by name
+        self._groups = {}
+        self._group_names = []
+
+        ## Names of the groups leading to this one, from the app
+        self._path = ()
+
+        ## Prefix tree of all the command names, built when needed
+        ## to resolve unknown names (see :py:mod:`clitools.trie`)
+        self._names_trie = None
+
+        ## Time taken to register / load each command, in seconds
+        self._load_times = {}
+
+        ## Held while loading commands, as commands may be run
+        ## concurrently from different threads
+        self._load_lock = threading.RLock()
+
     def command(self, func=None, **kwargs):
         """
         Decorator to register a command function
 
+        The function can also be passed as a ``'package.module:function'``
+        string: the module will then only be imported when the command
+        is actually run.
+
         :param name: Name for the command
         :param help: Help text for the function
+        :param stream_format: Format for the items yielded by generator
+            commands: ``'lines'`` (the default) or ``'jsonl'``
+        :param flush_every: Flush the output every this many items
+            yielded by generator commands (defaults to 1)
+        :param flush_interval: Flush the output at least every this
+            many seconds, for generator commands
+        :param executor: How to run the command when running batches
+            concurrently: in a ``'thread'`` (the default) or in a
+            ``'process'`` pool.
+        :param cache: If True, the command is assumed to only depend on
+            its arguments: its result and output are cached, and
+            replayed on later runs with the same arguments.
+        :param cache_ttl: Time after which cached results expire,
+            in seconds (defaults to never).
+        :param cache_version: Version of the command results, to be
+            changed to invalidate them (they're also invalidated when
+            the source file of the function changes).
+        :param map_over: Name of a list argument: the function is
+            called once per item, concurrently (see
+            :py:mod:`clitools.fanout`), and the results are written
+            out as for generator commands.
+        :param map_jobs: Number of concurrent calls, for ``map_over``
+            (defaults to 4)
+        :param map_ordered: Write out results of ``map_over`` calls in
+            input order, instead of as soon as they're available.
+        :param map_rate: Maximum number of ``map_over`` calls started
+            per second (defaults to no limit)
+        :param map_burst: Number of calls that can be started at once,
+            within ``map_rate`` (defaults to 1)
+        :param pipe_input: Name of an argument taking the items
+            produced by the previous command, when the command is run
+            in a pipeline (see :py:mod:`clitools.pipeline`), or the
+            lines of standard input, when run on its own. The argument
+            is not available on the command line.
         """
+        if isinstance(func, string_types):
+            self._add_pending_command(func, **kwargs)
+            return
+
         def decorator(func):
-            self._register_command(func, **kwargs)
+            if self.lazy:
+                self._add_pending_command(func, **kwargs)
+            else:
+                self._register_command(func, **kwargs)
             return func
         if func is None:
             return decorator
         return decorator(func)
 
+    def group(self, name, target=None, help=None):
+        """
+        Add a group of commands, run as ``<name> <command> [args]``.
+
+        Commands of the group (and nested groups) are only loaded
+        when the group name is found on the command line.
+
+        :param name: Name of the group
+        :param target: An existing :py:class:`CommandGroup`, or its
+            import path, as a ``'package.module:group'`` string: the
+            module will then only be imported when the group is used.
+        :param help: Help text for the group
+        :return: the :py:class:`CommandGroup`, or None for import paths
+        """
+        if target is None:
+            target = CommandGroup(help=help)
+        self._names_trie = None
+        if name not in self._groups:
+            self._group_names.append(name)
+        self._groups[name] = {
+            'group': None if isinstance(target, string_types) else target,
+            'target': target if isinstance(target, string_types) else None,
+            'help': help,
+            'parser': None,
+        }
+        return self._groups[name]['group']
+
+    def load_plugins(self, group='clitools.commands', index=True):
+        """
+        Register commands from the entry points of installed
+        distributions, as in ``setup(entry_points={'clitools.commands':
+        ['name = package.module:function']})``. Plugin modules are only
+        imported when one of their commands is run.
+
+        :param group: Name of the entry points group
+        :param index: Path of the file caching the entry points found,
+            True for a file in the cache directory, False to disable it
+        """
+        from clitools.plugins import find_entry_points
+
+        if index is True:
+            from clitools.cache import default_cache_dir
+            index = os.path.join(
+                self.cache_dir or default_cache_dir(self.prog_name),
+                'plugins-{0}.json'.format(group))
+        for name, target in find_entry_points(group, index or None):
+            self.command(target, name=name)
+
+    def _get_group_parser(self, name):
+        """Get the subparser of a group, creating it if needed"""
+        entry = self._groups[name]
+        if entry['parser'] is None:
+            help_text = entry['help']
+            if help_text is None and entry['group'] is not None:
+                help_text = entry['group'].help
+            entry['parser'] = self.subparsers.add_parser(
+                name, help=help_text, description=help_text)
+        return entry['parser']
+
+    def _load_group(self, name, args=None):
+        """
+        Load a group, and the commands needed to parse the arguments
+        following the group name (or all of them, if None).
+        """
+        start = time.time()
+
+        entry = self._groups[name]
+        if entry['group'] is None:
+            entry['group'] = import_object(entry['target'])
+        group = entry['group']
+        if group.parser is None:
+            group._attach(self._get_group_parser(name), self, name)
+
+        if args is not None:
+            args = group._load_commands(args)
+        else:
+            group._load_all_commands()
+
+        ## Includes the module import time, for import paths
+        self._load_times[name] = self._load_times.get(name, 0) \
+            + time.time() - start
+        return args
+
+    def _add_global_option(self, *a, **kw):
+        """
+        Add an option to be handled by CliApp itself, when passed
+        before the command name.
+        """
+        self._options_parser.add_argument(*a, **kw)
+
+        ## The main parser needs to know about it too, for help
+        ## messages, but shouldn't set anything in the namespace
+        ## passed to commands.
+        kw['default'] = argparse.SUPPRESS
+        self.parser.add_argument(*a, **kw)
+
+    def _parse_options(self, args):
+        """
+        Parse the global options, passed before the command name.
+
+        :return: a ``(options, command_args)`` tuple; ``command_args``
+            is None if there is no command to run.
+        """
+        index = self._find_command_index(args)
+        head = args if index is None else args[:index]
+        options, extra = self._options_parser.parse_known_args(head)
+        if extra or index is None:
+            ## Let the main parser handle help, errors, ..
+            return options, args
+        return options, args[index:]
+
+    def _get_command_name(self, func_name, kwargs):
+        name = kwargs.get('name')
+        if name is None:
+            name = func_name
+            ## Strip the command_ prefix from function name
+            if name.startswith('command_'):
+                name = name[len('command_'):]
+        return name
+
+    def _add_pending_command(self, func, **kwargs):
+        """
+        Register a command function for lazy loading: we just store
+        the function, to be analyzed only when the command is run.
+
+        :param func: the command function, or its import path,
+            as a ``'package.module:function'`` string.
+        """
+        if isinstance(func, string_types):
+            if ':' not in func:
+                raise ValueError(
+                    "Invalid command path {0!r}: must be in the "
+                    "'package.module:function' form".format(func))
+            target, func = func, None
+            func_name = target.rsplit(':', 1)[1].split('.')[-1]
+            defaults = None
+
+        else:
+            target = None
+            func_name = func.__name__
+
+            ## We replace ``self.arg`` defaults right away, as users
+            ## will expect them to be gone when calling the function
+            ## directly, but keep the originals around to build the
+            ## subparser from later.
+            defaults = func.__defaults__ or ()
+            func.__defaults__ = tuple(
+                (d.kwargs.get('default') if isinstance(d, self.arg) else d)
+                for d in defaults) or None
+
+        name = self._get_command_name(func_name, kwargs)
+        self._names_trie = None
+
+        if name not in self._pending:
+            self._pending_names.append(name)
+        self._pending[name] = {
+            'func': func,
+            'target': target,
+            'kwargs': kwargs,
+            'defaults': defaults,
+        }
+
+    def _get_stub(self, name):
+        """
+        Get a subparser for a pending command, containing just
+        the command name and help text.
+        """
+        if name not in self._stubs:
+            import inspect
+
+            entry = self._pending[name]
+            help_text = docstring = entry['kwargs'].get('help')
+            if help_text is None and entry['func'] is not None:
+                help_text = docstring = inspect.getdoc(entry['func'])
+            elif help_text is None and self.manifest is not None:
+                help_text = docstring = self.manifest.get_help(
+                    entry['target'])
+            self._stubs[name] = self.subparsers.add_parser(
+                name, help=help_text)
+            if entry['kwargs'].get('help') is None:
+                self._stubs[name].docstring = docstring
+        return self._stubs[name]
+
+    def _load_command(self, name):
+        """Fully register a pending command"""
+        logger.debug('Loading command {0!r}'.format(name))
+        start = time.time()
+
+        entry = self._pending.pop(name)
+        self._pending_names.remove(name)
+        subparser = self._stubs.pop(name, None)
+
+        if entry['target'] is not None:
+            ## The function was never seen before: register it
+            ## just as we do for non-lazy commands.
+            func = import_object(entry['target'])
+            if self.manifest is not None:
+                import inspect
+                self.manifest.set_help(
+                    entry['target'], func, inspect.getdoc(func))
+            subparser = self._register_command(
+                func, subparser=subparser, **entry['kwargs'])
+
+        else:
+            func = entry['func']
+            func_info = self._get_func_info(func)
+            kwargs_names = [
+                argname for argname, _ in func_info['keyword_args']]
+            func_info['keyword_args'] = list(
+                zip(kwargs_names, entry['defaults']))
+            subparser = self._add_command(
+                func, func_info, subparser=subparser, **entry['kwargs'])
+
+        ## Includes the module import time, for import paths
+        self._load_times[name] = time.time() - start
+        return subparser
+
+    def _load_commands(self, args):
+        """
+        Load the pending commands needed to parse the given arguments:
+        if a known command was selected, only that one is loaded, else
+        all the stubs are built, to be listed in help / error messages.
+
+        Unknown command names are expanded, if abbreviations are
+        enabled, or reported with suggestions for the nearest names.
+
+        :return: the arguments, with command names expanded
+        """
+        with self._load_lock:
+            index = self._find_command_index(args)
+            name = None if index is None else args[index]
+            if name is not None and not self._is_command_name(name):
+                full_name = self._expand_command_name(name)
+                if full_name is not None:
+                    args = list(args)
+                    args[index] = full_name
+                    name = full_name
+
+            if name in self._pending:
+                self._load_command(name)
+            elif name in self._groups:
+                group_args = self._load_group(name, list(args[index + 1:]))
+                args = list(args[:index + 1]) + group_args
+            else:
+                for stub_name in self._pending_names:
+                    self._get_stub(stub_name)
+                for group_name in self._group_names:
+                    self._get_group_parser(group_name)
+                if name is not None and not self._is_command_name(name):
+                    self._suggest_command_names(name)
+            return args
+
+    def _is_command_name(self, name):
+        return name in self.subparsers.choices or name in self._pending \
+            or name in self._groups
+
+    def _get_names_trie(self):
+        if self._names_trie is None:
+            from clitools.trie import Trie
+            self._names_trie = Trie(self.subparsers.choices)
+            for name in self._pending_names + self._group_names:
+                self._names_trie.add(name)
+        return self._names_trie
+
+    def _expand_command_name(self, name):
+        """:return: the command abbreviated as ``name``, or None"""
+        if not self.abbreviations:
+            return None
+        matches = self._get_names_trie().with_prefix(name)
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+    def _suggest_command_names(self, name):
+        """
+        Report an unknown command name, suggesting the nearest ones;
+        if there are none, argparse will report it as usual.
+        """
+        trie = self._get_names_trie()
+        if self.abbreviations:
+            matches = trie.with_prefix(name)
+            if len(matches) > 1:
+                self.parser.error('ambiguous command {0!r}: could be {1}'
+                                  .format(name, ', '.join(matches)))
+        suggestions = trie.suggest(name)
+        if suggestions:
+            self.parser.error('invalid command {0!r}: did you mean {1}?'
+                              .format(name, ' or '.join(
+                                  repr(s) for s in suggestions)))
+
+    def _parse_args(self, args):
+        """Parse arguments, using the fast-path parser if possible"""
+        if self.fast_parse:
+            parsed_args = self._fast_parse_args(args)
+            if parsed_args is not None:
+                return parsed_args
+        return self.parser.parse_args(args)
+
+    def _fast_parse_args(self, args):
+        """
+        Try parsing arguments with the fast-path parser, for the
+        common case of a command name followed by its arguments.
+
+        :return: the parsed arguments namespace, or None
+        """
+        from clitools.fastparse import compile_parser, get_parser_defaults
+
+        if not args or args[0] not in self.subparsers.choices:
+            return None
+
+        name = args[0]
+        if name not in self._fast_parsers:
+            self._fast_parsers[name] = compile_parser(
+                self.subparsers.choices[name])
+        fast_parser = self._fast_parsers[name]
+        if fast_parser is None:
+            return None
+
+        values = fast_parser.parse(args[1:])
+        if values is None:
+            return None
+
+        parsed_args = argparse.Namespace(**get_parser_defaults(self.parser))
+        for key, value in values.items():
+            setattr(parsed_args, key, value)
+        return parsed_args
+
+    def _load_all_commands(self):
+        """Load all the pending commands, including those in groups"""
+        for name in list(self._pending_names):
+            self._load_command(name)
+        for name in self._group_names:
+            self._load_group(name)
+
+    def _iter_commands(self):
+        """Iterate over the loaded commands, including those in groups"""
+        for command in self._commands.values():
+            yield command
+        for name in self._group_names:
+            group = self._groups[name]['group']
+            if group is not None:
+                for command in group._iter_commands():
+                    yield command
+
+    def _find_command_name(self, args):
+        """
+        Find the sub-command name in a list of arguments, without
+        actually parsing them.
+        """
+        index = self._find_command_index(args)
+        if index is None:
+            return None
+        return args[index]
+
+    def _find_command_index(self, args):
+        """Find the position of the sub-command name in a list of args"""
+        option_actions = self.parser._option_string_actions
+        index = 0
+        while index < len(args):
+            arg = args[index]
+            if arg == '--':
+                index += 1
+                break
+            if not arg.startswith('-'):
+                break
+            action = option_actions.get(arg)
+            if action is not None and action.nargs != 0:
+                index += 1  # skip the option value
+            index += 1
+        if index < len(args):
+            return index
+        return None
+
     def _register_command(self, func, **kwargs):
         """
         Register a command function. We need to hack things a bit here:
@@ -93,7 +895,20 @@ class CliApp(object):
         (yet)! They are just stripped & ignored, ATM..
         """
 
-        func_info = self._analyze_function(func)
+        start = time.time()
+        func_info = self._get_func_info(func)
+        subparser = self._add_command(func, func_info, **kwargs)
+        name = self._get_command_name(func_info['name'], kwargs)
+        self._load_times[name] = time.time() - start
+        return subparser
+
+    def _add_command(self, func, func_info, subparser=None, **kwargs):
+        """
+        Build the subparser for an already analyzed command function.
+
+        :param subparser: An already existing subparser to use,
+            instead of creating a new one.
+        """
 
         ## WARNING! We're not supporting things like this, right now:
         ## def func(a, ((b, c), d)=((1, 2), 3)): pass
@@ -101,29 +916,68 @@ class CliApp(object):
         ## at least for the moment?
 
         ## Read keyword arguments
-        name = kwargs.get('name')
-        if name is None:
-            name = func_info['name']
-            ## Strip the command_ prefix from function name
-            if name.startswith('command_'):
-                name = name[len('command_'):]
+        name = self._get_command_name(func_info['name'], kwargs)
 
         help_text = kwargs.get('help')
         if help_text is None:
             help_text = func_info['help_text']
 
         ## Create the new subparser
-        subparser = self.subparsers.add_parser(name, help=help_text)
+        if subparser is None:
+            subparser = self.subparsers.add_parser(name, help=help_text)
+            self._names_trie = None
+
+        ## Help texts and types are taken from the docstring
+        ## lazily, only if actually needed
+        docstring = subparser.docstring = func_info['help_text']
+
+        ## Arguments which may have to be opened as files
+        file_args = []
+
+        ## Arguments to map the command over, and taking the
+        ## items from the previous command in pipelines, if any
+        map_over = kwargs.get('map_over')
+        pipe_input = kwargs.get('pipe_input')
+        argnames = list(func_info['positional_args']) + [
+            argname for argname, _ in func_info['keyword_args']]
+        if map_over is not None and map_over not in argnames:
+            raise ValueError(
+                'Cannot map command {0!r} over {1!r}: no such argument'
+                .format(name, map_over))
+        if pipe_input is not None and pipe_input not in argnames:
+            raise ValueError(
+                'Cannot pipe input to command {0!r} as {1!r}: no such '
+                'argument'.format(name, pipe_input))
+        if map_over is not None:
+            from clitools.fanout import check_settings
+            check_settings(jobs=kwargs.get('map_jobs'),
+                           rate=kwargs.get('map_rate'),
+                           burst=kwargs.get('map_burst'))
 
         ## Process required positional arguments
         for argname in func_info['positional_args']:
             logger.debug('New argument: {0}'.format(argname))
-            subparser.add_argument(argname)
+            if argname == pipe_input:
+                continue
+            elif argname == map_over:
+                ## Takes one or more items
+                subparser.add_argument(argname, nargs='+')
+            elif _declares_type(docstring, argname):
+                subparser.add_argument(
+                    argname, type=DocType(docstring, argname))
+                file_args.append(argname)
+            else:
+                subparser.add_argument(argname)
 
         ## Process optional keyword arguments
         func_new_defaults = []
         for argname, argvalue in func_info['keyword_args']:
-            if isinstance(argvalue, self.arg):
+            if argname == pipe_input:
+                func_new_defaults.append(
+                    argvalue.kwargs.get('default')
+                    if isinstance(argvalue, self.arg) else argvalue)
+                continue
+            elif isinstance(argvalue, self.arg):
                 ## We already have args / kwargs for this argument
                 a = (['--' + argname] + list(argvalue.args))
                 kw = argvalue.kwargs
@@ -133,21 +987,63 @@ class CliApp(object):
                 ## We need to guess args / kwargs from default value
                 a, kw = self._arg_from_free_value(argname, argvalue)
                 func_new_defaults.append(argvalue)  # just use the old one
+                if kw.get('type') is None \
+                        and kw.get('action') in (None, 'append') \
+                        and _declares_type(docstring, argname):
+                    kw['type'] = DocType(docstring, argname)
 
             logger.debug('New argument: {0!r} {1!r}'.format(a, kwargs))
-            subparser.add_argument(*a, **kw)
-        func.func_defaults = tuple(func_new_defaults)
+            action = subparser.add_argument(*a, **kw)
+            if isinstance(action.type, DocType) \
+                    or getattr(action.type, 'is_input_file', False) \
+                    or getattr(action.default, 'is_input_file', False):
+                file_args.append(action.dest)
+        func.__defaults__ = tuple(func_new_defaults)
 
         ## todo: replace defaults on the original function, to strip
         ##       any instance of ``self.arg``?
 
-        new_function = Command(func=func, func_info=func_info)
+        new_function = Command(func=func, func_info=func_info, options=kwargs)
+        new_function.name = ' '.join(self._path + (name,))
+        new_function.file_args = tuple(file_args)
+        if map_over is not None:
+            new_function.map_index = argnames.index(map_over)
+        if pipe_input is not None:
+            new_function.pipe_input = pipe_input
+            subparser.set_defaults(**{pipe_input: None})
+        self._commands[name] = new_function
 
         ## Positional arguments are treated as required values
         subparser.set_defaults(func=new_function)
 
         return subparser  # for further analysis during tests
 
+    def _get_func_info(self, func):
+        """
+        Get information about a function, from the manifest if
+        possible, else by analyzing it.
+        """
+        if self.manifest is None:
+            return self._analyze_function(func)
+
+        func_info = self.manifest.get_func_info(func)
+        if func_info is None:
+            func_info = self._analyze_function(func)
+            self.manifest.set_func_info(func, func_info)
+        return func_info
+
+    def build_manifest(self):
+        """
+        Load all the commands, in order to store their information
+        in the manifest file.
+        """
+        if self.manifest is None:
+            raise ValueError("This CliApp has no manifest configured")
+        self._load_all_commands()
+        for command in self._iter_commands():
+            self.manifest.set_func_info(command.func, command.func_info)
+        self.manifest.save()
+
     def _analyze_function(self, func):
         """
         Extract information from a function:
@@ -161,21 +1057,36 @@ class CliApp(object):
 
         info = {}
 
-        info['name'] = func.func_name
+        info['name'] = func.__name__
 
         # todo extract arguments docs too!
         info['help_text'] = inspect.getdoc(func)
 
-        argspec = inspect.getargspec(func)
+        try:
+            ## getargspec() is gone in Python 3.11, and doesn't
+            ## support annotations
+            argspec = inspect.getfullargspec(func)
+            varkw = argspec.varkw
+        except AttributeError:  # Python 2
+            argspec = inspect.getargspec(func)
+            varkw = argspec.keywords
         is_generator = inspect.isgeneratorfunction(func)
 
+        ## Coroutines / async generators, for Python >= 3.5 / 3.6
+        is_coroutine = getattr(
+            inspect, 'iscoroutinefunction', lambda f: False)(func)
+        is_async_generator = getattr(
+            inspect, 'isasyncgenfunction', lambda f: False)(func)
+
         info['accepts_varargs'] = argspec.varargs is not None
         info['varargs_name'] = argspec.varargs
 
-        info['accepts_kwargs'] = argspec.keywords is not None
-        info['kwargs_name'] = argspec.keywords
+        info['accepts_kwargs'] = varkw is not None
+        info['kwargs_name'] = varkw
 
         info['is_generator'] = is_generator
+        info['is_coroutine'] = is_coroutine
+        info['is_async_generator'] = is_async_generator
 
         arg_defaults = argspec.defaults or []
         akw_limit = len(argspec.args) - len(arg_defaults)
@@ -183,7 +1094,7 @@ class CliApp(object):
 
         kwargs_names = argspec.args[akw_limit:]
         assert len(kwargs_names) == len(arg_defaults)
-        info['keyword_args'] = zip(kwargs_names, arg_defaults)
+        info['keyword_args'] = list(zip(kwargs_names, arg_defaults))
 
         return info
 
@@ -247,9 +1158,289 @@ class CliApp(object):
             # import ipdb; ipdb.set_trace()
             return o(arg_name, type=type_, default=default)
 
-    def run(self, args=None):
-        """Handle running from the command line"""
-        parsed_args = self.parser.parse_args(args)
+    def run(self, args=None, profile=None):
+        """
+        Handle running from the command line
+
+        :param args: Command line arguments (defaults to ``sys.argv[1:]``)
+        :param profile: Profile the run, writing statistics to this
+            file, or a text report to standard error if ``'-'``
+            (same as the ``--profile`` option).
+        """
+        if args is None:
+            args = sys.argv[1:]
+
+        options, args = self._parse_options(args)
+        if profile is None:
+            profile = options.profile
+        if profile is not None:
+            from clitools.profiling import Profiler
+            with Profiler(self, profile, sort=options.profile_sort):
+                return self._run(options, args)
+        return self._run(options, args)
+
+    def _run(self, options, args):
+        """Run a batch, or the command selected by the arguments"""
+        self._cache_read = not (options.no_cache or options.refresh)
+        self._cache_write = not options.no_cache
+
+        if options.map_jobs is not None or options.map_rate is not None:
+            from clitools.fanout import check_settings
+            try:
+                check_settings(jobs=options.map_jobs, rate=options.map_rate)
+            except ValueError as e:
+                self.parser.error(str(e))
+        self._map_jobs = options.map_jobs
+        self._map_rate = options.map_rate
+
+        self._output_format = options.output_format
+        if options.output_format is not None:
+            from clitools.output import get_encoder
+            try:
+                get_encoder(options.output_format)
+            except ValueError as e:
+                self.parser.error(str(e))
+
+        if options.batch is not None:
+            result = self.run_batch(
+                options.batch, fail_fast=options.batch_fail_fast,
+                jobs=options.jobs, ordered=options.ordered,
+                timeout=options.job_timeout)
+            sys.exit(0 if result.success else 1)
+
+        if options.map_stdin:
+            result = self.map_lines(args, '-', jobs=options.jobs)
+            sys.exit(0 if result.success else 1)
+
+        if PIPE_SEPARATOR in args:
+            return self.run_pipeline(args)
+
+        parsed_args = self._parse_command_line(args)
+        return self._dispatch(parsed_args)
+
+    def invoke(self, args, stdout=None, stderr=None):
+        """
+        Run a command line from Python, as :py:meth:`run` does, but
+        without ever exiting or raising: the outcome is returned.
+
+        Output is captured for the current thread only, so that
+        commands can be invoked concurrently from many threads.
+
+        :param args: Command line arguments
+        :param stdout: Stream to write the command output to
+            (defaults to capturing it in the result)
+        :param stderr: Stream to write the command errors to
+            (defaults to capturing them in the result)
+        :return: a :py:class:`clitools.invocation.InvokeResult`
+        """
+        from clitools.invocation import invoke
+        return invoke(self, args, stdout=stdout, stderr=stderr)
+
+    def run_batch(self, source, fail_fast=False, jobs=1, ordered=False,
+                  timeout=None):
+        """
+        Run many commands, read from a batch file, in this process.
+
+        :param source: Path to a file containing one command line
+            per line, ``'-'`` for standard input, or an iterable
+            of lines.
+        :param fail_fast: Stop at the first failing command,
+            instead of going on with the next ones.
+        :param jobs: Number of commands to run concurrently
+        :param ordered: When running concurrently, write out the
+            output of commands in input order (instead of as soon
+            as they complete).
+        :param timeout: Timeout, in seconds, for each command.
+        :return: a :py:class:`clitools.batch.BatchResult`
+        """
+        from clitools.batch import (
+            BatchResult, ParallelBatch, exit_status, read_batch, run_parsed)
+
+        ## Parsed arguments, for lines seen more than once
+        parsed_cache = {}
+
+        def parse(line, args):
+            if args is None:
+                ## Already reported by read_batch, as a usage error
+                raise SystemExit(2)
+            if line not in parsed_cache:
+                parsed_cache[line] = self._parse_command_line(args)
+            return argparse.Namespace(**vars(parsed_cache[line]))
+
+        lines = read_batch(source)
+
+        if jobs > 1 or timeout is not None:
+            result = ParallelBatch(
+                self, parse, jobs=jobs, ordered=ordered, timeout=timeout,
+                fail_fast=fail_fast).run(lines)
+
+        else:
+            result = BatchResult()
+            for lineno, line, args in lines:
+                try:
+                    parsed_args = parse(line, args)
+                except SystemExit as e:
+                    status = exit_status(e)
+                else:
+                    status = run_parsed(self, parsed_args)
+
+                result.add(lineno, line, status)
+                if fail_fast and status != 0:
+                    break
+
+        sys.stderr.write('Batch: {0}\n'.format(result.summary()))
+        return result
+
+    def map_lines(self, args, source, jobs=1, chunk_size=None):
+        """
+        Run a command taking a single positional argument once per
+        line read from a source, passing the line as that argument.
+
+        Lines are run in order, or concurrently with ``jobs > 1`` (in
+        the pool set by the command ``executor`` option), still
+        writing out the outputs in input order.
+
+        :param args: Command name and options, without the positional
+            argument
+        :param source: Path to a file, ``'-'`` for standard input,
+            or an iterable of lines
+        :param jobs: Number of lines to run concurrently
+        :param chunk_size: Number of lines sent to pool workers at once
+        :return: a :py:class:`clitools.batch.BatchResult`
+        """
+        from clitools.batch import (
+            MAP_CHUNK_SIZE, BatchResult, map_lines, read_lines)
+
+        command = self._get_command(args)
+        if command is None:
+            ## Let argparse report unknown commands
+            self._parse_command_line(args)
+        if command is None or len(command.spec.positional_args) != 1:
+            self.parser.error('mapping lines needs a command taking '
+                              'a single positional argument')
+
+        result = BatchResult()
+        for lineno, line, status in map_lines(
+                self, args, read_lines(source), jobs=jobs,
+                executor=command.options.get('executor', 'thread'),
+                chunk_size=chunk_size or MAP_CHUNK_SIZE):
+            result.add(lineno, line, status)
+
+        if not result.success:
+            sys.stderr.write('Map: {0}\n'.format(result.summary()))
+        return result
+
+    def run_pipeline(self, args):
+        """
+        Run a pipeline of commands, separated by ``:::`` on the
+        command line, passing the items produced by each command to
+        the ``pipe_input`` argument of the next one.
+
+        All the command lines are parsed before running anything;
+        the result of the last command is handled as usual.
+
+        :param args: Command line arguments, including separators
+        """
+        from clitools.pipeline import split_pipeline
+
+        stages = []
+        for index, stage_args in enumerate(split_pipeline(args)):
+            parsed_args = self._parse_command_line(stage_args)
+            function = getattr(parsed_args, 'func', None)
+            if function is None:
+                self.parser.error('missing command in pipeline')
+            if index > 0 and function.pipe_input is None:
+                self.parser.error(
+                    "command '{0}' can't take input from a pipeline"
+                    .format(function.name))
+            stages.append(parsed_args)
+
+        ## The first command gets standard input, as when run alone
+        self._set_default_input(stages[0].func, stages[0])
+        return self._run_stages(stages, None)
+
+    def _run_stages(self, stages, items):
+        """Run the first stage of a pipeline, then the next ones"""
+        parsed_args = stages[0]
+        function = parsed_args.func
+        if items is not None:
+            setattr(parsed_args, function.pipe_input, items)
+        if len(stages) == 1:
+            return self._dispatch(parsed_args)
+
+        ## Files must stay open while next stages consume the items
+        if function.file_args:
+            from clitools.files import open_inputs
+            with open_inputs(parsed_args, function.file_args):
+                return self._run_stages(
+                    stages[1:], self._produce(function, parsed_args))
+        return self._run_stages(
+            stages[1:], self._produce(function, parsed_args))
+
+    def _produce(self, function, parsed_args):
+        """Call a command, to get the items for the next one"""
+        if function.map_index is not None:
+            from clitools.fanout import run_mapped
+            args, kwargs = function.get_call_args(parsed_args)
+            return run_mapped(function, args, jobs=self._map_jobs,
+                              rate=self._map_rate)
+        result = function(parsed_args)
+        if result is None:
+            return ()
+        return result
+
+    def serve(self, socket_path, workers=4, max_requests=1000):
+        """
+        Keep serving commands on a Unix socket, from a pool of
+        pre-forked processes with all the commands already loaded.
+
+        Use ``clitools-client SOCKET [ARGS...]`` (or
+        ``python -m clitools.client``) to run commands.
+
+        :param socket_path: Path to the Unix socket to listen on
+        :param workers: Number of worker processes
+        :param max_requests: Number of requests after which
+            a worker gets replaced by a fresh one
+        """
+        from clitools.server import serve
+        serve(self, socket_path, workers=workers, max_requests=max_requests)
+
+    def _parse_command_line(self, args):
+        """Load the needed commands, and parse the arguments"""
+        with self._load_lock:
+            args = self._load_commands(args)
+            if self.manifest is not None:
+                self.manifest.save()
+        return self._parse_args(args)
+
+    def _set_default_input(self, function, parsed_args):
+        """
+        Give commands taking ``pipe_input``, when not fed by another
+        command in a pipeline, the lines of standard input
+        """
+        if function.pipe_input is not None \
+                and getattr(parsed_args, function.pipe_input) is None:
+            from clitools.pipeline import iter_lines
+            setattr(parsed_args, function.pipe_input, iter_lines())
+
+    def _get_command(self, args):
+        """
+        Load the command selected by some arguments (in groups too)
+
+        :return: the :py:class:`Command`, or None if none was selected
+        """
+        args = self._load_commands(args)
+        index = self._find_command_index(args)
+        if index is None:
+            return None
+        name = args[index]
+        if name in self._groups:
+            return self._groups[name]['group']._get_command(
+                args[index + 1:])
+        return self._commands.get(name)
+
+    def _dispatch(self, parsed_args):
+        """Run the command selected in the parsed arguments"""
         function = getattr(parsed_args, 'func', None)
 
         if function is None:
@@ -257,13 +1448,155 @@ class CliApp(object):
             self.parser.print_help(sys.stderr)
             sys.exit(2)
 
-        # function = parsed_args.func
-        return parsed_args.func(parsed_args)
+        self._set_default_input(function, parsed_args)
+
+        if function.file_args:
+            from clitools.files import open_inputs
+            with open_inputs(parsed_args, function.file_args):
+                return self._call_maybe_cached(function, parsed_args)
+        return self._call_maybe_cached(function, parsed_args)
+
+    def _get_run_state(self):
+        """
+        :return: the run state of the current thread, as a dict,
+            to be passed to :py:meth:`_set_run_state` in other threads
+        """
+        state = {}
+        for name in dir(type(self)):
+            if isinstance(getattr(type(self), name, None), _RunState):
+                state[name] = getattr(self, name)
+        return state
+
+    def _set_run_state(self, state):
+        """Set the run state of the current thread"""
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def result_cache(self):
+        """The :py:class:`clitools.cache.ResultCache` for the app"""
+        if self._result_cache is None:
+            from clitools.cache import (
+                DEFAULT_MAX_SIZE, ResultCache, default_cache_dir)
+            self._result_cache = ResultCache(
+                self.cache_dir or default_cache_dir(self.prog_name),
+                max_size=self.cache_size or DEFAULT_MAX_SIZE)
+        return self._result_cache
+
+    def _call_maybe_cached(self, function, parsed_args):
+        """Call a command, going through the cache if enabled"""
+        if not (function.options.get('cache') and self._cache_write):
+            return self._call(function, parsed_args)
+
+        from clitools.cache import call_cached, code_version, make_key
+
+        args, kwargs = function.get_call_args(parsed_args)
+        ## The cached output is already encoded
+        key = make_key(function.name, args, kwargs, context=(
+            self._output_format, function.options.get('cache_version'),
+            code_version(function.func)))
+        if key is None:
+            return self._call(function, parsed_args)
+        return call_cached(
+            self.result_cache, key,
+            lambda: self._call(function, parsed_args),
+            ttl=function.options.get('cache_ttl'), read=self._cache_read)
+
+    def _call(self, function, parsed_args):
+        """Call a command function, streaming its output if needed"""
+        if function.map_index is not None:
+            from clitools.fanout import run_mapped
+            args, kwargs = function.get_call_args(parsed_args)
+            self._stream_output(
+                run_mapped(function, args, jobs=self._map_jobs,
+                           rate=self._map_rate),
+                function.options)
+            return None
+
+        result = function(parsed_args)
+
+        if function.spec.is_generator or function.spec.is_async_generator:
+            self._stream_output(result, function.options)
+            return None
+
+        if self._output_format is not None and result is not None:
+            from clitools.output import get_encoder, write_value
+            write_value(result, get_encoder(self._output_format))
+
+        return result
+
+    def _stream_output(self, items, options):
+        """Write out items yielded by a generator command"""
+        from clitools.output import get_encoder, stream_output
+
+        if self._output_format is not None:
+            ## Items are written in batches, unless told otherwise
+            stream_output(
+                items, encoder=get_encoder(self._output_format),
+                flush_every=options.get('flush_every'),
+                flush_interval=options.get('flush_interval'))
+            return
+
+        stream_output(
+            items,
+            format=options.get('stream_format', 'lines'),
+            flush_every=options.get('flush_every', 1),
+            flush_interval=options.get('flush_interval'))
+
+
+class CommandGroup(CliApp):
+    """
+    Group of commands, to be added to a CliApp (or to another group)
+    with :py:meth:`CliApp.group`.
+
+    Commands are registered with the :py:meth:`command` decorator, as
+    for CliApp, but they're always loaded lazily: nothing is done until
+    the group name is found on the command line. Groups can't be run by
+    themselves, and global options belong to the app.
+
+    :param help: Help text for the group
+    """
+
+    def __init__(self, help=None):
+        self.help = help
+        self.lazy = True
+        self.fast_parse = False
+        self.abbreviations = False
+        self.manifest = None
+        self.parser = self.subparsers = None
+        self._init_commands()
+
+    def _attach(self, parser, parent, name):
+        """Start building the group, in a subparser of its parent"""
+        self.parser = parser
+        if parser.description is None:
+            ## Not known yet when listed, for groups given by import path
+            parser.description = self.help
+        self.subparsers = parser.add_subparsers(help='sub-commands')
+        self.manifest = parent.manifest
+        self.abbreviations = parent.abbreviations
+        self._path = parent._path + (name,)
 
 
 ## Utility methods
 ##----------------------------------------
 
+def import_object(path):
+    """
+    Import an object from its ``'package.module:name'`` path.
+
+    >>> import_object('os.path:join') is __import__('os').path.join
+    True
+    """
+    import importlib
+
+    module_name, obj_name = path.split(':', 1)
+    obj = importlib.import_module(module_name)
+    for attr in obj_name.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
 def split_function_doc(doc):
     """
     Performs a very simple splitting of a function documentation:
@@ -311,6 +1644,8 @@ def extract_arguments_info(doc):
     from the function docstring and return them in a dictionary,
     along with function docstring.
 
+    Results are memoized, by docstring: they must not be modified.
+
     >>> extract_arguments_info('''
     ... My example function.
     ...
@@ -328,42 +1663,64 @@ def extract_arguments_info(doc):
     ... }
     True
     """
-    from collections import defaultdict
+    try:
+        return _arguments_info_cache[doc]
+    except KeyError:
+        pass
+    info = _arguments_info_cache[doc] = _parse_arguments_info(doc)
+    return info
 
+
+## Results of extract_arguments_info(), by docstring
+_arguments_info_cache = {}
+
+
+def _parse_arguments_info(doc):
+    """Implementation of :py:func:`extract_arguments_info`, in one pass"""
     func_doc = []
-    args_doc = defaultdict(dict)
+    args_doc = {}
 
-    for block_info, block_data in split_function_doc(doc):
-        if block_info is None:
-            func_doc.append(block_data)
-        else:
-            block_type = block_info[0]
+    def add_block(block_info, block_lines):
+        block_type = block_info[0]
+        block_data = '\n'.join(block_lines).strip()
 
-            # :param <type> <name>: <doc>
-            # :param <name>: <doc>
-            # :type <name>: <type>
+        # :param <type> <name>: <doc>
+        # :param <name>: <doc>
+        # :type <name>: <type>
 
-            if block_type in ('param', 'type'):
-                if block_type == 'param' and len(block_info) == 3:
-                    p_type, p_name = block_info[1:3]
-                    p_help = block_data
-                    args_doc[p_name]['type'] = p_type
-                    args_doc[p_name]['help'] = p_help
+        if block_type not in ('param', 'type'):
+            return
 
-                elif block_type == 'param' and len(block_info) == 2:
-                    p_name = block_info[1]
-                    p_help = block_data
-                    args_doc[p_name]['help'] = p_help
+        if block_type == 'param' and len(block_info) == 3:
+            p_type, p_name = block_info[1:3]
+            args_doc.setdefault(p_name, {}).update(
+                type=p_type, help=block_data)
 
-                elif block_type == 'type' and len(block_info) == 2:
-                    p_name = block_info[1]
-                    p_type = block_data
-                    args_doc[p_name]['type'] = p_type
+        elif block_type == 'param' and len(block_info) == 2:
+            args_doc.setdefault(block_info[1], {})['help'] = block_data
 
-                else:
-                    raise ValueError("Wrong block information")
+        elif block_type == 'type' and len(block_info) == 2:
+            args_doc.setdefault(block_info[1], {})['type'] = block_data
+
+        else:
+            raise ValueError("Wrong block information")
+
+    ## Lines of the block being read, after the :info: part
+    block_info, block_lines = None, func_doc
+
+    for line in doc.splitlines():
+        if line.startswith(':') and line.count(':') > 1:
+            if block_info is not None:
+                add_block(block_info, block_lines)
+            _, args, data = line.split(':', 2)
+            block_info, block_lines = tuple(args.split()), [data]
+        else:
+            block_lines.append(line)
+
+    if block_info is not None:
+        add_block(block_info, block_lines)
 
     return {
         'function_help': '\n'.join(func_doc).strip() + '\n',
-        'params_help': dict(args_doc),
+        'params_help': args_doc,
     }
@@ -0,0 +1,68 @@
+"""
+Command line utilities for applications built with clitools.
+
+Usage::
+
+    python -m clitools build-manifest myapp.cli:cli
+    python -m clitools completion bash --app myapp.cli:cli --prog myapp
+"""
+
+from __future__ import print_function
+
+import sys
+
+from clitools import CliApp, import_object
+
+
+cli = CliApp(prog_name='clitools')
+
+
+@cli.command(name='build-manifest')
+def build_manifest(app, manifest=None):
+    """
+    Pre-generate the commands manifest of an application,
+    given the import path of its CliApp, as 'package.module:cli'.
+    """
+    from clitools.manifest import Manifest
+
+    app = import_object(app)
+    if manifest is not None:
+        app.manifest = Manifest(manifest)
+    app.build_manifest()
+    print("Manifest written to {0}".format(app.manifest.path))
+
+
+@cli.command
+def completion(shell, app=None, prog=None, index=None):
+    """
+    Write a shell completion script to standard output.
+
+    :param shell: Shell to complete for: bash, zsh or fish
+    :param app: Import path of the application CliApp, as
+        'package.module:cli'
+    :param prog: Name of the program to complete (defaults
+        to the application prog_name)
+    :param index: Completion index file: written when the app is
+        given, else read instead of importing the app
+    """
+    from clitools import completion as _completion
+
+    if shell not in _completion.SHELLS:
+        sys.exit('Unsupported shell: {0}'.format(shell))
+    if app is not None:
+        data = _completion.build_index(import_object(app))
+        if index is not None:
+            _completion.save_index(data, index)
+    elif index is not None:
+        data = _completion.load_index(index)
+    else:
+        sys.exit('Either --app or --index is required')
+    sys.stdout.write(_completion.generate_script(data, shell, prog=prog))
+
+
+def main():
+    cli.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Support for asyncio-based commands (Python >= 3.5).
+
+Coroutine functions are run to completion on a new event loop (using
+``uvloop``, if installed); async generators are turned into plain
+iterators, so their items can be streamed as for normal generators.
+
+Note: this module avoids the ``async`` / ``yield from`` syntax, so that
+it can still be imported on older Python versions; ``asyncio`` itself is
+only imported when needed, as it takes a while.
+"""
+
+from __future__ import absolute_import
+
+
+def new_event_loop():
+    """Create a new event loop, using uvloop if available"""
+    import asyncio
+
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.new_event_loop()
+    return uvloop.new_event_loop()
+
+
+def run_coroutine(coro):
+    """Run a coroutine on a new event loop, and return its result"""
+    import asyncio
+
+    loop = new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def iter_async(agen):
+    """
+    Iterate an async generator synchronously, running it on a new
+    event loop; the generator is finalized if iteration stops early.
+    """
+    import asyncio
+
+    loop = new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+            yield item
+    finally:
+        try:
+            loop.run_until_complete(agen.aclose())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+def gather(aws, limit=None):
+    """
+    Run awaitables concurrently, with at most ``limit`` of them
+    running at the same time; awaitables are only taken from the
+    ``aws`` iterable when they can be run, so they can be created
+    lazily by a generator.
+
+    :return: a future, whose result will be the list of results
+        of the awaitables, in the same order.
+    """
+    import asyncio
+
+    if limit is None:
+        return asyncio.gather(*aws)
+
+    loop = asyncio.get_event_loop()
+    outcome = loop.create_future()
+    aws = iter(aws)
+    results = {}
+    state = {'started': 0, 'running': 0, 'exhausted': False}
+
+    def start_next():
+        while not state['exhausted'] and state['running'] < limit:
+            try:
+                aw = next(aws)
+            except StopIteration:
+                state['exhausted'] = True
+                break
+            index = state['started']
+            state['started'] += 1
+            state['running'] += 1
+            future = asyncio.ensure_future(aw)
+            future.add_done_callback(
+                lambda future, index=index: on_done(index, future))
+
+        if state['exhausted'] and state['running'] == 0 \
+                and not outcome.done():
+            outcome.set_result(
+                [results[i] for i in range(state['started'])])
+
+    def on_done(index, future):
+        state['running'] -= 1
+        if outcome.done():
+            return
+        if future.cancelled():
+            outcome.cancel()
+        elif future.exception() is not None:
+            outcome.set_exception(future.exception())
+        else:
+            results[index] = future.result()
+            start_next()
+
+    start_next()
+    return outcome
@@ -0,0 +1,476 @@
+"""
+Batch execution of many command lines in a single process.
+
+Batch files contain one command line per line, quoted as in a shell;
+empty lines and lines starting with ``#`` are ignored.
+
+Commands can also be run concurrently, on a pool of threads or (for
+commands registered with ``executor='process'``) of processes; the
+output of each of them is captured and written out as a whole when
+the command completes, so that outputs of different commands never
+get interleaved.
+
+A single command can also be run once per line of input, with the line
+as its positional argument (as with ``xargs``, but without starting a
+new process for each line): lines are sent to the pool in chunks, and
+the outputs are written out in input order.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import functools
+import itertools
+import multiprocessing
+import shlex
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.pool import ThreadPool
+
+from clitools import capture, string_types
+
+
+def read_batch(source):
+    """
+    Read command lines from a batch source.
+
+    :param source: Path to a batch file, ``'-'`` for standard input,
+        or an iterable of lines (eg. an open file).
+    :yields: ``(line_number, line, argv)`` tuples, with None for
+        ``argv`` if the line can't be split (eg. unclosed quotes):
+        the error is reported on standard error.
+    """
+    if source == '-':
+        source = sys.stdin
+    elif isinstance(source, string_types):
+        with open(source) as fp:
+            for item in read_batch(fp):
+                yield item
+        return
+
+    for lineno, line in enumerate(source, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            sys.stderr.write('Batch line {0}: {1}\n'.format(lineno, e))
+            argv = None
+        yield lineno, line, argv
+
+
+def read_lines(source):
+    """
+    Read the lines to map a command over, skipping empty lines.
+
+    :param source: Path to a file, ``'-'`` for standard input,
+        or an iterable of lines.
+    :yields: ``(line_number, line)`` tuples, without line endings
+    """
+    if source == '-':
+        source = sys.stdin
+    elif isinstance(source, string_types):
+        with open(source) as fp:
+            for item in read_lines(fp):
+                yield item
+        return
+
+    for lineno, line in enumerate(source, 1):
+        line = line.rstrip('\r\n')
+        if line:
+            yield lineno, line
+
+
+def exit_status(exc):
+    """
+    Get the exit status a :py:class:`SystemExit` exception would
+    make the interpreter exit with.
+    """
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    ## sys.exit('message') prints the message and exits with 1
+    sys.stderr.write('{0}\n'.format(code))
+    return 1
+
+
+def run_parsed(app, parsed_args):
+    """
+    Run the command selected by some parsed arguments
+
+    :return: the command exit status
+    """
+    try:
+        app._dispatch(parsed_args)
+    except SystemExit as e:
+        return exit_status(e)
+    except Exception:
+        ## Report the error, as the interpreter would do
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+class BatchResult(object):
+    """
+    Results of a batch execution
+
+    :ivar statuses: list of ``(line_number, line, exit_status)``
+    """
+
+    def __init__(self):
+        self.statuses = []
+
+    def add(self, lineno, line, status):
+        """Record the exit status of a command, reporting failures"""
+        self.statuses.append((lineno, line, status))
+        if status != 0:
+            sys.stderr.write('Batch line {0}: exit status {1}\n'
+                             .format(lineno, status))
+
+    @property
+    def failed(self):
+        return [item for item in self.statuses if item[2] != 0]
+
+    @property
+    def success(self):
+        return not self.failed
+
+    def summary(self):
+        return '{0} commands run, {1} failed'.format(
+            len(self.statuses), len(self.failed))
+
+
+## Exit status for commands that timed out, as for timeout(1)
+TIMEOUT_STATUS = 124
+
+## The CliApp used by process pool workers, inherited via fork()
+_worker_app = None
+
+
+def _write_output(data):
+    """Write out the captured output of a command, as bytes"""
+    from clitools.output import get_binary_stream
+
+    stream = get_binary_stream()
+    stream.write(data)
+    stream.flush()
+
+
+def _init_process_worker():
+    ## Locks might have been held by other threads while forking
+    capture._lock = threading.Lock()
+
+
+## Pool workers get the run state of the calling thread (see
+## CliApp._get_run_state), as they run commands on its behalf.
+
+def _run_in_thread(app, state, parsed_args):
+    app._set_run_state(state)
+    with capture.capture_output() as (out, err):
+        status = run_parsed(app, parsed_args)
+    return status, out.getbytes(), err.getvalue()
+
+
+def _parse_and_run(app, state, args):
+    app._set_run_state(state)
+    with capture.capture_output() as (out, err):
+        try:
+            parsed_args = app._parse_command_line(args)
+        except SystemExit as e:
+            status = exit_status(e)
+        else:
+            status = run_parsed(app, parsed_args)
+    return status, out.getbytes(), err.getvalue()
+
+
+def _run_in_process(state, args):
+    return _parse_and_run(_worker_app, state, args)
+
+
+def _run_lines(app, state, tasks):
+    results = []
+    for lineno, line, args in tasks:
+        status, out, err = _parse_and_run(app, state, args)
+        results.append((lineno, line, status, out, err))
+    return results
+
+
+def _run_lines_in_process(state, tasks):
+    return _run_lines(_worker_app, state, tasks)
+
+
+class _FinishedResult(object):
+    """Stand-in for ``AsyncResult``, for jobs completed right away"""
+
+    def __init__(self, value):
+        self._value = value
+
+    def ready(self):
+        return True
+
+    def wait(self, timeout=None):
+        pass
+
+    def get(self, timeout=None):
+        return self._value
+
+
+class _Job(object):
+    def __init__(self, lineno, line, async_result, deadline=None,
+                 pool=None):
+        self.lineno = lineno
+        self.line = line
+        self.async_result = async_result
+        self.deadline = deadline
+        self.pool = pool
+
+    def is_done(self, now):
+        if self.async_result.ready():
+            return True
+        return self.deadline is not None and now >= self.deadline
+
+
+class ParallelBatch(object):
+    """
+    Run batch commands concurrently.
+
+    At most ``jobs`` commands are submitted at once, so that each
+    one starts running right away and per-job timeouts can be
+    counted from submission. When a command times out, its pool is
+    retired, as the worker is still busy with it: later commands go
+    to a new pool, instead of waiting for a worker to be free.
+
+    :param app: The CliApp to run commands from
+    :param parse: Function parsing a ``(line, args)`` batch line
+        into an arguments namespace
+    :param jobs: Number of concurrent jobs
+    :param ordered: Write out command outputs in input order,
+        instead of as soon as they complete
+    :param timeout: Timeout, in seconds, for each command
+    :param fail_fast: Stop submitting commands after a failure
+    """
+
+    def __init__(self, app, parse, jobs, ordered=False, timeout=None,
+                 fail_fast=False):
+        self.app = app
+        self.parse = parse
+        self.jobs = jobs
+        self.ordered = ordered
+        self.timeout = timeout
+        self.fail_fast = fail_fast
+        self.result = BatchResult()
+        self._state = app._get_run_state()
+        self._pools = {}
+        self._pending = collections.deque()
+
+        ## Pools with workers still running timed-out commands
+        self._retired = []
+
+    def run(self, lines):
+        """
+        :param lines: iterable of ``(line_number, line, args)``
+        :return: a :py:class:`BatchResult`
+        """
+        try:
+            for lineno, line, args in lines:
+                if self.fail_fast and not self.result.success:
+                    break
+                self._submit(lineno, line, args)
+                while len(self._pending) >= self.jobs:
+                    self._collect()
+            while self._pending:
+                self._collect()
+        finally:
+            self._close_pools()
+        return self.result
+
+    def _get_pool(self, executor):
+        if executor not in self._pools:
+            if executor == 'process':
+                global _worker_app
+                _worker_app = self.app
+                pool = multiprocessing.Pool(
+                    self.jobs, initializer=_init_process_worker)
+            else:
+                pool = ThreadPool(self.jobs)
+            self._pools[executor] = pool
+        return self._pools[executor]
+
+    def _close_pools(self):
+        for pool in self._pools.values():
+            pool.close()
+            pool.join()
+        self._pools = {}
+        for pool in self._retired:
+            self._terminate_pool(pool)
+        self._retired = []
+
+    def _terminate_pool(self, pool):
+        ## Worker threads cannot be killed: they're left running
+        ## (as daemons), while processes are killed.
+        pool.terminate()
+        if not isinstance(pool, ThreadPool):
+            pool.join()
+
+    def _retire_pool(self, pool):
+        """Stop using a pool with a worker stuck on a timed-out job"""
+        for executor, item in list(self._pools.items()):
+            if item is pool:
+                del self._pools[executor]
+        if pool not in self._retired:
+            self._retired.append(pool)
+
+    def _reap_retired_pools(self):
+        """Terminate retired pools, once their other jobs are done"""
+        busy = [job.pool for job in self._pending]
+        for pool in list(self._retired):
+            if not any(item is pool for item in busy):
+                self._retired.remove(pool)
+                self._terminate_pool(pool)
+
+    def _submit(self, lineno, line, args):
+        with capture.capture_output() as (out, err):
+            try:
+                parsed_args = self.parse(line, args)
+            except SystemExit as e:
+                parsed_args = None
+                status = exit_status(e)
+
+        if parsed_args is None:
+            async_result = _FinishedResult(
+                (status, out.getbytes(), err.getvalue()))
+            self._pending.append(_Job(lineno, line, async_result))
+            return
+
+        command = getattr(parsed_args, 'func', None)
+        executor = 'thread'
+        if command is not None:
+            executor = command.options.get('executor', 'thread')
+
+        pool = self._get_pool(executor)
+        if executor == 'process':
+            async_result = pool.apply_async(
+                _run_in_process, (self._state, args))
+        else:
+            async_result = pool.apply_async(
+                _run_in_thread, (self.app, self._state, parsed_args))
+
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+        self._pending.append(
+            _Job(lineno, line, async_result, deadline, pool))
+
+    def _collect(self):
+        """Wait for a job to complete, and write out its results"""
+        if self.ordered:
+            job = self._pending.popleft()
+            timeout = None
+            if job.deadline is not None:
+                timeout = max(job.deadline - time.time(), 0)
+            job.async_result.wait(timeout)
+
+        else:
+            job = None
+            while job is None:
+                now = time.time()
+                for item in self._pending:
+                    if item.is_done(now):
+                        job = item
+                        break
+                else:
+                    self._pending[0].async_result.wait(0.01)
+            self._pending.remove(job)
+
+        if job.async_result.ready():
+            try:
+                status, out, err = job.async_result.get()
+            except Exception:
+                status, out, err = 1, b'', traceback.format_exc()
+        else:
+            self._retire_pool(job.pool)
+            status, out = TIMEOUT_STATUS, b''
+            err = 'Batch line {0}: timed out after {1} seconds\n'.format(
+                job.lineno, self.timeout)
+        if self._retired:
+            self._reap_retired_pools()
+
+        _write_output(out)
+        sys.stderr.write(err)
+        self.result.add(job.lineno, job.line, status)
+
+
+## Number of lines sent to pool workers at once, by default
+MAP_CHUNK_SIZE = 16
+
+
+def map_lines(app, args, lines, jobs=1, executor='thread',
+              chunk_size=MAP_CHUNK_SIZE):
+    """
+    Run a command once per line, appending the line to its arguments
+    (after ``--``, so that it's always taken as a positional value).
+
+    Lines are read as needed: at most two chunks per job are sent to
+    the pool, or waiting to be written out, at any time.
+
+    :param app: The CliApp to run the command from
+    :param args: Command line of the command, without the line
+    :param lines: Iterable of ``(line_number, line)`` tuples
+    :param jobs: Number of concurrent jobs (the command is run in
+        this thread if 1)
+    :param executor: Run jobs in a ``'thread'`` or ``'process'`` pool
+    :param chunk_size: Number of lines sent to pool workers at once
+    :yields: ``(line_number, line, exit_status)`` tuples, in order
+    """
+    tasks = ((lineno, line, list(args) + ['--', line])
+             for lineno, line in lines)
+
+    if jobs <= 1:
+        for lineno, line, line_args in tasks:
+            try:
+                parsed_args = app._parse_command_line(line_args)
+            except SystemExit as e:
+                status = exit_status(e)
+            else:
+                status = run_parsed(app, parsed_args)
+            yield lineno, line, status
+        return
+
+    state = app._get_run_state()
+    if executor == 'process':
+        global _worker_app
+        _worker_app = app
+        pool = multiprocessing.Pool(jobs, initializer=_init_process_worker)
+        func = functools.partial(_run_lines_in_process, state)
+    else:
+        pool = ThreadPool(jobs)
+        func = functools.partial(_run_lines, app, state)
+
+    pending = collections.deque()
+    finished = False
+    try:
+        while True:
+            while len(pending) < jobs * 2:
+                chunk = list(itertools.islice(tasks, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(func, (chunk,)))
+            if not pending:
+                break
+            for lineno, line, status, out, err in pending.popleft().get():
+                _write_output(out)
+                sys.stderr.write(err)
+                yield lineno, line, status
+        finished = True
+    finally:
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
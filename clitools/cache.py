@@ -0,0 +1,293 @@
+"""
+On-disk cache of command results.
+
+Commands registered with ``cache=True`` are assumed to be pure functions
+of their arguments: their return value and standard output are stored,
+keyed on the command name and the arguments the function gets called
+with, and replayed on later runs with the same arguments. Keys also
+include the modification time and size of the source file defining the
+function (and its ``cache_version`` option, if any), so that results
+don't outlive changes to the code.
+
+Each entry is a pickle file in the cache directory; the modification
+time of entry files is updated on each hit, so that the least recently
+used ones can be evicted when the cache grows over its maximum size.
+Entries of commands registered with ``cache_ttl`` expire after that
+many seconds.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import logging
+import os
+import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from clitools import capture
+
+
+logger = logging.getLogger('clitools.cache')
+
+## Default maximum size of the cache directory, in bytes
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+## Suffix of entry files
+_SUFFIX = '.pickle'
+
+
+def default_cache_dir(prog_name):
+    """:return: the cache directory for an application, by default"""
+    base = os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'clitools', prog_name)
+
+
+def code_version(func):
+    """
+    :return: the modification time and size of the source file of the
+        module defining a function, or None if not known
+    """
+    from clitools.manifest import get_source_file
+
+    filename = get_source_file(getattr(func, '__module__', None))
+    if filename is None:
+        return None
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+def make_key(command_name, args, kwargs, context=()):
+    """
+    :param context: Other values the output depends on (eg. the
+        output format, or the version of the code)
+    :return: the cache key for a command call, or None if the
+        arguments can't be serialized (eg. opened files)
+    """
+    try:
+        data = pickle.dumps(
+            (command_name, tuple(args), sorted(kwargs.items()),
+             tuple(context)), 2)
+    except (pickle.PicklingError, TypeError):
+        return None
+    return hashlib.sha1(data).hexdigest()
+
+
+class CacheEntry(object):
+    """A cached command result, along with its standard output (bytes)"""
+
+    def __init__(self, result, stdout, expires=None):
+        self.result = result
+        self.stdout = stdout
+        self.expires = expires
+
+    def replay(self):
+        """Write out the cached output, return the cached result"""
+        if self.stdout:
+            from clitools.output import get_binary_stream
+            stream = get_binary_stream()
+            stream.write(self.stdout)
+            stream.flush()
+        return self.result
+
+
+class ResultCache(object):
+    """
+    Size-bounded LRU cache of command results, stored on disk.
+
+    :param directory: Directory to store entries in
+    :param max_size: Maximum total size of the entries, in bytes
+
+    :ivar hits: Number of lookups that found a valid entry
+    :ivar misses: Number of lookups that didn't
+    :ivar evictions: Number of entries removed to free up space
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key):
+        """:return: the :py:class:`CacheEntry` for a key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fp:
+                entry = pickle.load(fp)
+        except IOError:
+            entry = None
+        except Exception:
+            ## Corrupted, or written by an incompatible version
+            logger.debug('Invalid cache entry {0}'.format(path),
+                         exc_info=True)
+            entry = None
+
+        if entry is not None and entry.expires is not None \
+                and entry.expires < time.time():
+            self._remove(path)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        try:
+            os.utime(path, None)  # mark as recently used
+        except OSError:
+            pass
+        return entry
+
+    def set(self, key, entry):
+        """Store an entry, evicting old ones if needed"""
+        try:
+            data = pickle.dumps(entry, 2)
+        except (pickle.PicklingError, TypeError):
+            logger.debug('Result not cacheable', exc_info=True)
+            return
+        if len(data) > self.max_size:
+            return
+
+        path = self._path(key)
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(tmp_path, 'wb') as fp:
+                fp.write(data)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            logger.warning('Unable to write cache entry {0}: {1}'
+                           .format(path, e))
+            return
+        self._evict()
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Remove the least recently used entries, while over size"""
+        entries = []
+        total_size = 0
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total_size += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            self._remove(path)
+            total_size -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all the entries"""
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename.endswith(_SUFFIX):
+                self._remove(os.path.join(self.directory, filename))
+
+
+class _Tee(object):
+    """
+    Stream writing to two streams at once
+
+    :ivar broken: Whether writing to the main stream failed
+        (eg. broken pipe), so the copy might be incomplete
+    """
+
+    def __init__(self, stream, copy, parent=None):
+        self.stream = stream
+        self.copy = copy
+        self.broken = False
+        self._parent = parent
+        self._buffer = None
+
+    @property
+    def buffer(self):
+        """Tee for binary output, as for ``sys.stdout.buffer``"""
+        if self._buffer is None:
+            from clitools.output import get_binary_stream
+            self._buffer = _Tee(
+                get_binary_stream(self.stream), self.copy.buffer, self)
+        return self._buffer
+
+    def _set_broken(self):
+        self.broken = True
+        if self._parent is not None:
+            self._parent._set_broken()
+
+    def write(self, data):
+        self.copy.write(data)
+        try:
+            self.stream.write(data)
+        except Exception:
+            self._set_broken()
+            raise
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        try:
+            self.stream.flush()
+        except Exception:
+            self._set_broken()
+            raise
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.stream, name)
+
+
+def call_cached(cache, key, func, ttl=None, read=True):
+    """
+    Get the result of a call from the cache, or call the function
+    (writing out its output as usual) and store its result.
+
+    :param func: Function to call, on cache misses
+    :param ttl: Time to live of the new entry, in seconds
+    :param read: If False, always call the function (the new
+        result is stored anyways)
+    """
+    if read:
+        entry = cache.get(key)
+        if entry is not None:
+            return entry.replay()
+
+    stdout, stderr = capture.current_streams()
+    stdout = _Tee(stdout, capture.OutputBuffer())
+    with capture.capture_output(stdout, stderr):
+        result = func()
+    if stdout.broken:
+        return result
+
+    expires = None if ttl is None else time.time() + ttl
+    cache.set(key, CacheEntry(result, stdout.copy.getbytes(), expires))
+    return result
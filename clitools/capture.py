@@ -0,0 +1,162 @@
+"""
+Per-thread capture of standard output / error.
+
+``sys.stdout`` and ``sys.stderr`` are process-wide: to capture the
+output of commands running concurrently in different threads, they're
+replaced by proxies forwarding writes to a stream chosen per-thread
+(or to the original stream, for threads not capturing anything).
+"""
+
+from __future__ import absolute_import
+
+import io
+import sys
+import threading
+from contextlib import contextmanager
+
+from clitools import text_type
+
+
+class OutputBuffer(object):
+    """
+    In-memory output stream, accepting text as well as bytes written
+    to its ``buffer`` (as for ``sys.stdout`` on Python 3), so that
+    binary output can be captured too.
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        if isinstance(data, text_type):
+            data = data.encode('utf-8')
+        self.buffer.write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def getbytes(self):
+        """:return: everything written, as bytes"""
+        return self.buffer.getvalue()
+
+    def getvalue(self):
+        """:return: everything written, as text"""
+        data = self.buffer.getvalue()
+        if str is bytes:
+            return data
+        return data.decode('utf-8', 'replace')
+
+
+class ThreadLocalStream(object):
+    """
+    Proxy to a stream, which can be redirected for the current thread.
+
+    :param default: The stream to be used by threads that
+        didn't redirect their output.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        return getattr(self._local, 'stream', None) or self.default
+
+    def redirect(self, stream):
+        """Redirect output of the current thread (None to reset)"""
+        self._local.stream = stream
+
+    def write(self, data):
+        self.current.write(data)
+
+    def writelines(self, lines):
+        self.current.writelines(lines)
+
+    def flush(self):
+        self.current.flush()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.current, name)
+
+
+_lock = threading.Lock()
+_state = {'users': 0, 'stdout': None, 'stderr': None}
+
+
+def _install():
+    """Install the proxies (if not already there), return them"""
+    with _lock:
+        if sys.stdout is not _state['stdout'] \
+                or sys.stderr is not _state['stderr']:
+            ## Not installed yet, or streams were replaced meanwhile
+            _state['stdout'] = sys.stdout = ThreadLocalStream(sys.stdout)
+            _state['stderr'] = sys.stderr = ThreadLocalStream(sys.stderr)
+            _state['users'] = 0
+        _state['users'] += 1
+        return _state['stdout'], _state['stderr']
+
+
+def _uninstall(proxies):
+    """Remove the proxies, when nobody is using them any more"""
+    with _lock:
+        if proxies != (_state['stdout'], _state['stderr']):
+            return  # Already replaced by somebody else
+        _state['users'] -= 1
+        if _state['users'] == 0:
+            if sys.stdout is _state['stdout']:
+                sys.stdout = _state['stdout'].default
+            if sys.stderr is _state['stderr']:
+                sys.stderr = _state['stderr'].default
+            _state['stdout'] = _state['stderr'] = None
+
+
+def current_streams():
+    """
+    :return: the ``(stdout, stderr)`` streams that output of the
+        current thread goes to, for other threads to write there too
+    """
+    streams = []
+    for stream in (sys.stdout, sys.stderr):
+        if isinstance(stream, ThreadLocalStream):
+            stream = stream.current
+        streams.append(stream)
+    return tuple(streams)
+
+
+@contextmanager
+def capture_output(stdout=None, stderr=None):
+    """
+    Capture standard output / error of the current thread only.
+
+    :param stdout: Stream to write output to (defaults to a new
+        :py:class:`OutputBuffer`)
+    :param stderr: Stream to write errors to (defaults to a new
+        :py:class:`OutputBuffer`)
+    :yields: a ``(stdout, stderr)`` tuple
+    """
+    if stdout is None:
+        stdout = OutputBuffer()
+    if stderr is None:
+        stderr = OutputBuffer()
+
+    proxies = stdout_proxy, stderr_proxy = _install()
+    previous = (getattr(stdout_proxy._local, 'stream', None),
+                getattr(stderr_proxy._local, 'stream', None))
+    try:
+        stdout_proxy.redirect(stdout)
+        stderr_proxy.redirect(stderr)
+        yield stdout, stderr
+    finally:
+        stdout_proxy.redirect(previous[0])
+        stderr_proxy.redirect(previous[1])
+        _uninstall(proxies)
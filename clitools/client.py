@@ -0,0 +1,140 @@
+"""
+Thin client for :py:mod:`clitools.server`.
+
+Forwards command line arguments, environment, working directory and
+standard input to the server, relaying back standard output / error
+and the exit status::
+
+    python -m clitools.client /run/myapp.sock hello --name=world
+
+The socket path can also be passed in the ``CLITOOLS_SOCKET``
+environment variable.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import json
+import os
+import select
+import socket
+import sys
+
+from clitools.server import (
+    Channel, FRAME_REQUEST, FRAME_STATUS, FRAME_STDERR, FRAME_STDIN,
+    FRAME_STDIN_EOF, FRAME_STDOUT, encode_frame)
+
+## Errors for sockets that would block, or closed by the other end
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+_CLOSED = (errno.EPIPE, errno.ECONNRESET)
+
+
+def _write_all(fd, data):
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def run_client(socket_path, args, stdin=None, stdout=None, stderr=None):
+    """
+    Run a command on a server
+
+    :param socket_path: Path to the server Unix socket
+    :param args: Command line arguments
+    :param stdin: File to forward as standard input (default: sys.stdin)
+    :param stdout: File to write output to (default: sys.stdout)
+    :param stderr: File to write errors to (default: sys.stderr)
+    :return: the command exit status
+    """
+    stdin_fd = (sys.stdin if stdin is None else stdin).fileno()
+    output_fds = {
+        FRAME_STDOUT: (sys.stdout if stdout is None else stdout).fileno(),
+        FRAME_STDERR: (sys.stderr if stderr is None else stderr).fileno(),
+    }
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    channel = Channel(sock)
+
+    request = {'argv': list(args), 'env': dict(os.environ),
+               'cwd': os.getcwd()}
+    channel.send(FRAME_REQUEST, json.dumps(request).encode('utf-8'))
+
+    ## From here on, the socket is only written to when select()
+    ## tells it's writable, so that we keep reading output while the
+    ## command is not reading its input (else both ends could block
+    ## on full socket buffers); standard input is only read once the
+    ## previous data was sent.
+    sock.setblocking(False)
+    stdin_open = True
+    outgoing = b''
+    try:
+        while True:
+            readers = [sock]
+            writers = []
+            if outgoing:
+                writers.append(sock)
+            elif stdin_open:
+                readers.append(stdin_fd)
+            readable, writable, _ = select.select(readers, writers, [])
+
+            if writable:
+                try:
+                    outgoing = outgoing[sock.send(outgoing):]
+                except socket.error as e:
+                    if e.errno in _CLOSED:
+                        ## The command completed without reading all
+                        ## of its input: we still need to read results.
+                        outgoing = b''
+                        stdin_open = False
+                    elif e.errno not in _WOULD_BLOCK:
+                        raise
+
+            if stdin_fd in readable:
+                data = os.read(stdin_fd, 65536)
+                if data:
+                    outgoing = encode_frame(FRAME_STDIN, data)
+                else:
+                    outgoing = encode_frame(FRAME_STDIN_EOF)
+                    stdin_open = False
+
+            if sock in readable:
+                try:
+                    data = sock.recv(65536)
+                except socket.error as e:
+                    if e.errno in _WOULD_BLOCK:
+                        continue
+                    raise
+                if not data:
+                    sys.stderr.write('Connection to server lost\n')
+                    return 1
+                for kind, payload in channel.feed(data):
+                    if kind == FRAME_STATUS:
+                        return int(payload)
+                    try:
+                        _write_all(output_fds[kind], payload)
+                    except OSError as e:
+                        if e.errno != errno.EPIPE:
+                            raise
+                        ## Our output was closed (eg. piped to head)
+                        return 0
+
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    socket_path = os.environ.get('CLITOOLS_SOCKET')
+    if socket_path is None:
+        if not argv:
+            sys.stderr.write(
+                'Usage: clitools-client SOCKET [ARGS...]\n')
+            sys.exit(2)
+        socket_path, argv = argv[0], argv[1:]
+    sys.exit(run_client(socket_path, argv))
+
+
+if __name__ == '__main__':
+    main()
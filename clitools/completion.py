@@ -0,0 +1,363 @@
+"""
+Static shell completion scripts.
+
+Completion scripts are generated from the application parsers, with
+all the commands, options and choices embedded, so that completing
+doesn't need to start the interpreter (and import all the commands)
+on each keystroke; values of options without choices, and positional
+arguments, are completed as file names.
+
+Generation goes through a completion index (a JSON-serializable dict),
+which can be saved to a file and used to regenerate the scripts later,
+without importing the application again::
+
+    python -m clitools completion bash --app myapp.cli:cli \\
+        --prog myapp --index ~/.cache/myapp-completion.json \\
+        > /etc/bash_completion.d/myapp
+
+Scripts must be regenerated when commands change.
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import json
+import re
+
+INDEX_VERSION = 2
+
+
+def _first_line(text):
+    if not text or text == argparse.SUPPRESS:
+        return ''
+    return text.strip().split('\n', 1)[0].replace('%%', '%')
+
+
+def _get_options(parser):
+    """:return: a ``(options, positionals_count)`` tuple"""
+    options = []
+    positionals = 0
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            continue
+        if not action.option_strings:
+            positionals += 1
+            continue
+        if action.help == argparse.SUPPRESS:
+            continue
+        choices = None
+        if action.choices is not None:
+            choices = [str(choice) for choice in action.choices]
+        options.append({
+            'strings': list(action.option_strings),
+            'takes_value': action.nargs != 0,
+            'choices': choices,
+            'help': _first_line(action.help),
+        })
+    return options, positionals
+
+
+def _get_subparsers(parser):
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            return action
+    return None
+
+
+def _add_commands(commands, subparsers, prefix=''):
+    """
+    Add the commands of a subparsers action to the index, recursing
+    into groups.
+
+    :return: the sorted command names
+    """
+    commands_help = {}
+    for choice_action in subparsers._choices_actions:
+        commands_help[choice_action.dest] = _first_line(choice_action.help)
+
+    for name, subparser in subparsers.choices.items():
+        path = prefix + name
+        subparser._apply_docstrings()
+        options, positionals = _get_options(subparser)
+        commands[path] = {
+            'help': commands_help.get(name, ''),
+            'options': options,
+            'positionals': positionals,
+            'commands': [],
+        }
+        group_subparsers = _get_subparsers(subparser)
+        if group_subparsers is not None:
+            commands[path]['commands'] = _add_commands(
+                commands, group_subparsers, path + ' ')
+    return sorted(subparsers.choices)
+
+
+def build_index(app):
+    """
+    Build the completion index of an application, loading all
+    of its commands.
+
+    Commands are keyed by their path, as in ``'group command'`` for
+    commands in groups; groups list the names of their commands.
+    """
+    app._load_all_commands()
+    app.parser._apply_docstrings()
+
+    commands = {}
+    names = _add_commands(commands, app.subparsers)
+    options, _ = _get_options(app.parser)
+    return {
+        'version': INDEX_VERSION,
+        'prog': app.prog_name,
+        'options': options,
+        'commands': commands,
+        'names': names,
+    }
+
+
+def save_index(index, path):
+    with open(path, 'w') as fp:
+        json.dump(index, fp, indent=2, sort_keys=True)
+
+
+def load_index(path):
+    with open(path) as fp:
+        index = json.load(fp)
+    if index.get('version') != INDEX_VERSION:
+        raise ValueError('Unsupported completion index version: {0!r}'
+                         .format(index.get('version')))
+    return index
+
+
+def _sh_quote(text):
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+def _function_name(prog):
+    return '_clitools_' + re.sub(r'\W', '_', prog)
+
+
+def _iter_contexts(index):
+    """
+    :yields: ``(path, options, positionals, commands)`` for the top
+        level (with an empty path) and each command or group
+    """
+    yield '', index['options'], 0, index['names']
+    for path in sorted(index['commands']):
+        command = index['commands'][path]
+        yield (path, command['options'], command['positionals'],
+               command['commands'])
+
+
+def _option_strings(options, takes_value=None):
+    strings = []
+    for option in options:
+        if takes_value is None or option['takes_value'] == takes_value:
+            strings.extend(option['strings'])
+    return strings
+
+
+def bash_script(index, prog=None):
+    prog = prog or index['prog']
+    commands = sorted(index['commands'])
+    lines = [
+        '# bash completion for {0}, generated by clitools'.format(prog),
+        '',
+        '{0}() {{'.format(_function_name(prog)),
+        '    local cur prev cmd i opts value_opts files subcommands',
+        '    cur="${COMP_WORDS[COMP_CWORD]}"',
+        '    prev="${COMP_WORDS[COMP_CWORD-1]}"',
+        '    cmd=',
+        '    for ((i = 1; i < COMP_CWORD; i++)); do',
+        '        case "${cmd:+$cmd }${COMP_WORDS[i]}" in',
+        '            {0}) cmd="${{cmd:+$cmd }}${{COMP_WORDS[i]}}" ;;'.format(
+            '|'.join(_sh_quote(name) for name in commands) or "''"),
+        '        esac',
+        '    done',
+        '',
+        '    case "$cmd $prev" in',
+    ]
+    for name, options, _, _ in _iter_contexts(index):
+        for option in options:
+            if option['choices'] is None:
+                continue
+            for string in option['strings']:
+                lines.append(
+                    '        {0}) COMPREPLY=($(compgen -W {1} -- "$cur"));'
+                    ' return ;;'.format(
+                        _sh_quote('{0} {1}'.format(name, string)),
+                        _sh_quote(' '.join(option['choices']))))
+    lines += [
+        '    esac',
+        '',
+        '    case "$cmd" in',
+    ]
+    for name, options, positionals, subcommands in _iter_contexts(index):
+        lines.append('        {0}) opts={1}; value_opts={2}; files={3};'
+                     ' subcommands={4} ;;'
+                     .format(_sh_quote(name),
+                             _sh_quote(' '.join(_option_strings(options))),
+                             _sh_quote(' '.join(
+                                 _option_strings(options, True))),
+                             '1' if positionals else '',
+                             _sh_quote(' '.join(subcommands))))
+    lines += [
+        '    esac',
+        '',
+        '    if [[ -n "$value_opts" && " $value_opts " == *" $prev "* ]]',
+        '    then',
+        '        COMPREPLY=($(compgen -f -- "$cur"))',
+        '    elif [[ "$cur" == -* ]]; then',
+        '        COMPREPLY=($(compgen -W "$opts" -- "$cur"))',
+        '    elif [[ -n "$subcommands" ]]; then',
+        '        COMPREPLY=($(compgen -W "$subcommands" -- "$cur"))',
+        '    elif [[ -n "$files" ]]; then',
+        '        COMPREPLY=($(compgen -f -- "$cur"))',
+        '    fi',
+        '}',
+        '',
+        'complete -o filenames -F {0} {1}'.format(
+            _function_name(prog), _sh_quote(prog)),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def zsh_script(index, prog=None):
+    prog = prog or index['prog']
+    commands = sorted(index['commands'])
+    lines = [
+        '# zsh completion for {0}, generated by clitools:'.format(prog),
+        '# source it after running compinit.',
+        '',
+        '{0}() {{'.format(_function_name(prog)),
+        '    local cur="${words[CURRENT]}" prev="${words[CURRENT-1]}"',
+        '    local cmd files i',
+        '    local -a opts value_opts commands',
+        '    for ((i = 2; i < CURRENT; i++)); do',
+        '        case "${cmd:+$cmd }${words[i]}" in',
+        '            ({0}) cmd="${{cmd:+$cmd }}${{words[i]}}" ;;'.format(
+            '|'.join(_sh_quote(name) for name in commands) or "''"),
+        '        esac',
+        '    done',
+        '',
+        '    case "$cmd $prev" in',
+    ]
+    for name, options, _, _ in _iter_contexts(index):
+        for option in options:
+            if option['choices'] is None:
+                continue
+            for string in option['strings']:
+                lines.append('        ({0}) compadd -- {1}; return ;;'.format(
+                    _sh_quote('{0} {1}'.format(name, string)),
+                    ' '.join(_sh_quote(c) for c in option['choices'])))
+    lines += [
+        '    esac',
+        '',
+        '    case "$cmd" in',
+    ]
+    for name, options, positionals, subcommands in _iter_contexts(index):
+        prefix = name + ' ' if name else ''
+        lines.append('        ({0}) opts=({1}); value_opts=({2}); files={3}'
+                     .format(_sh_quote(name),
+                             ' '.join(_option_strings(options)),
+                             ' '.join(_option_strings(options, True)),
+                             '1' if positionals else ''))
+        lines.append('            commands=({0}) ;;'.format(' '.join(
+            _sh_quote('{0}:{1}'.format(
+                sub.replace(':', '\\:'),
+                index['commands'][prefix + sub]['help']))
+            for sub in subcommands)))
+    lines += [
+        '    esac',
+        '',
+        '    if (( ${value_opts[(Ie)$prev]} )); then',
+        '        _files',
+        '    elif [[ "$cur" == -* ]]; then',
+        '        compadd -- $opts',
+        '    elif (( ${#commands} )); then',
+        "        _describe -t commands 'command' commands",
+        '    elif [[ -n "$files" ]]; then',
+        '        _files',
+        '    fi',
+        '}',
+        '',
+        'compdef {0} {1}'.format(_function_name(prog), _sh_quote(prog)),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def _fish_quote(text):
+    return "'" + text.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _fish_option(option):
+    args = []
+    for string in option['strings']:
+        if string.startswith('--'):
+            args.append('-l ' + _fish_quote(string[2:]))
+        elif len(string) == 2:
+            args.append('-s ' + _fish_quote(string[1:]))
+        else:
+            args.append('-o ' + _fish_quote(string[1:]))
+    if option['choices'] is not None:
+        args.append('-x -a ' + _fish_quote(' '.join(option['choices'])))
+    elif option['takes_value']:
+        args.append('-r -F')
+    if option['help']:
+        args.append('-d ' + _fish_quote(option['help']))
+    return ' '.join(args)
+
+
+def fish_script(index, prog=None):
+    prog = prog or index['prog']
+    complete = 'complete -c {0}'.format(_fish_quote(prog))
+    lines = [
+        '# fish completion for {0}, generated by clitools'.format(prog),
+        '',
+        complete + ' -f',
+    ]
+    for name, options, positionals, subcommands in _iter_contexts(index):
+        if name:
+            condition = '; and '.join(
+                '__fish_seen_subcommand_from ' + word
+                for word in name.split(' '))
+            in_command = '{0} -n {1}'.format(complete, _fish_quote(condition))
+            ## Group commands, until one of them is given
+            in_group = '{0} -n {1}'.format(complete, _fish_quote(
+                condition + '; and not __fish_seen_subcommand_from '
+                + ' '.join(subcommands)))
+        else:
+            in_command = in_group = complete + ' -n __fish_use_subcommand'
+        prefix = name + ' ' if name else ''
+        for sub in subcommands:
+            command = index['commands'][prefix + sub]
+            line = '{0} -a {1}'.format(in_group, _fish_quote(sub))
+            if command['help']:
+                line += ' -d ' + _fish_quote(command['help'])
+            lines.append(line)
+        for option in options:
+            lines.append('{0} {1}'.format(in_command, _fish_option(option)))
+        if positionals:
+            lines.append(in_command + ' -F')
+    return '\n'.join(lines) + '\n'
+
+
+SHELLS = {
+    'bash': bash_script,
+    'zsh': zsh_script,
+    'fish': fish_script,
+}
+
+
+def generate_script(index, shell, prog=None):
+    """
+    Generate a completion script
+
+    :param index: The completion index, from :py:func:`build_index`
+    :param shell: ``'bash'``, ``'zsh'`` or ``'fish'``
+    :param prog: Name of the program to complete
+        (defaults to the application ``prog_name``)
+    """
+    if shell not in SHELLS:
+        raise ValueError('Unsupported shell: {0!r}'.format(shell))
+    return SHELLS[shell](index, prog)
@@ -0,0 +1,248 @@
+"""
+Fan-out of commands over the items of a list argument.
+
+Commands registered with ``map_over='<argument>'`` are called once per
+item of that argument, on a pool of threads: results are written out
+as soon as they're available (or in input order, if requested), and
+failures for single items are reported without stopping the others.
+
+Calls can be rate limited with a token bucket, so that running a
+command over many items doesn't overload the systems it talks to.
+"""
+
+from __future__ import absolute_import
+
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.pool import ThreadPool
+
+from clitools import capture
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+
+## Default number of concurrent calls
+DEFAULT_JOBS = 4
+
+
+def check_settings(jobs=None, rate=None, burst=None):
+    """
+    Check concurrency and rate limit settings (None for defaults)
+
+    :raises ValueError: if any of them is not valid
+    """
+    if jobs is not None and jobs < 1:
+        raise ValueError('Number of jobs must be at least 1, got {0!r}'
+                         .format(jobs))
+    if rate is not None and rate <= 0:
+        raise ValueError('Rate must be positive, got {0!r}'.format(rate))
+    if burst is not None and burst < 1:
+        raise ValueError('Burst must be at least 1, got {0!r}'
+                         .format(burst))
+
+
+class TokenBucket(object):
+    """
+    Token bucket rate limiter: allows ``rate`` calls per second on
+    average, and bursts of up to ``burst`` calls.
+
+    :param rate: Tokens added per second
+    :param burst: Maximum number of tokens held
+    """
+
+    def __init__(self, rate, burst=1, clock=time.time, sleep=time.sleep):
+        check_settings(rate=rate, burst=burst)
+        self.rate = float(rate)
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting for one to be available if needed
+
+        :return: the time waited, in seconds
+        """
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            ## The token is taken right away (possibly going below
+            ## zero), so that concurrent callers queue up fairly.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class Outcome(object):
+    """
+    Outcome of calling a function on one item
+
+    :ivar index: Position of the item in the input
+    :ivar error: The exception raised, if the call failed
+    :ivar traceback: The formatted traceback, if the call failed
+    """
+
+    __slots__ = ('index', 'item', 'result', 'error', 'traceback')
+
+    def __init__(self, index, item, result=None, error=None, tb=None):
+        self.index = index
+        self.item = item
+        self.result = result
+        self.error = error
+        self.traceback = tb
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+def _call_item(func, index, item):
+    try:
+        result = func(item)
+    except (Exception, SystemExit) as e:
+        return Outcome(index, item, error=e, tb=traceback.format_exc())
+    return Outcome(index, item, result)
+
+
+def map_items(func, items, jobs=DEFAULT_JOBS, ordered=False, bucket=None):
+    """
+    Call a function on each item, concurrently
+
+    At most ``jobs`` calls are submitted at once, so that rate limiting
+    applies to calls actually starting.
+
+    :param func: Function to call with each item
+    :param items: Iterable of items
+    :param jobs: Number of concurrent calls
+    :param ordered: Yield outcomes in input order, instead of
+        as soon as the calls complete
+    :param bucket: A :py:class:`TokenBucket` to take a token from
+        before each call
+    :yields: an :py:class:`Outcome` for each item
+    """
+    check_settings(jobs=jobs)
+    done = Queue()
+    pool = ThreadPool(jobs)
+    items = enumerate(items)
+    running = 0
+    exhausted = False
+
+    ## Outcomes completed out of order, by index
+    completed = {}
+    next_index = 0
+
+    try:
+        while True:
+            while not exhausted and running < jobs:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if bucket is not None:
+                    bucket.acquire()
+                pool.apply_async(
+                    _call_item, (func, index, item), callback=done.put)
+                running += 1
+
+            if running == 0:
+                break
+
+            outcome = done.get()
+            running -= 1
+            if not ordered:
+                yield outcome
+                continue
+            completed[outcome.index] = outcome
+            while next_index in completed:
+                yield completed.pop(next_index)
+                next_index += 1
+
+    finally:
+        if running:
+            ## Stopped early: calls still running are abandoned
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+
+
+def run_mapped(command, args, jobs=None, rate=None):
+    """
+    Run a command registered with ``map_over``, on each item of the
+    mapped argument.
+
+    Failures are reported on standard error as they happen; once all
+    the calls are done, the process exits with status 1 if any failed.
+
+    :param command: The :py:class:`clitools.Command` to run
+    :param args: Arguments to call the command with, including
+        the full list of items for the mapped argument
+    :param jobs: Number of concurrent calls (overrides ``map_jobs``)
+    :param rate: Maximum calls per second (overrides ``map_rate``)
+    :yields: the results of the calls (the items, for generator
+        commands), skipping None results
+    """
+    options = command.options
+    position = command.map_index
+    items = args[position]
+    if items is None:
+        items = ()
+    elif not isinstance(items, (list, tuple)):
+        items = (items,)
+
+    if jobs is None:
+        jobs = options.get('map_jobs', DEFAULT_JOBS)
+    if rate is None:
+        rate = options.get('map_rate')
+    bucket = None
+    if rate is not None:
+        bucket = TokenBucket(rate, burst=options.get('map_burst', 1))
+
+    is_generator = command.spec.is_generator \
+        or command.spec.is_async_generator
+
+    ## Output of the calls goes where the caller's does (eg. when
+    ## captured by CliApp.invoke)
+    stdout, stderr = capture.current_streams()
+
+    def call(item):
+        call_args = list(args)
+        call_args[position] = item
+        with capture.capture_output(stdout, stderr):
+            result = command.invoke(call_args, {})
+            if is_generator:
+                ## Consumed in the worker, for the items to be produced
+                ## concurrently too
+                return list(result)
+        return result
+
+    failed = 0
+    for outcome in map_items(call, items, jobs=jobs,
+                             ordered=options.get('map_ordered', False),
+                             bucket=bucket):
+        if outcome.failed:
+            failed += 1
+            sys.stderr.write('Failed for {0!r}:\n{1}'.format(
+                outcome.item, outcome.traceback))
+        elif is_generator:
+            for item in outcome.result:
+                yield item
+        elif outcome.result is not None:
+            yield outcome.result
+
+    if failed:
+        sys.exit('{0} of {1} calls failed'.format(failed, len(items)))
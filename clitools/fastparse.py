@@ -0,0 +1,161 @@
+"""
+Fast-path parsing of command line arguments.
+
+Most commands only have plain positional arguments, on/off flags and
+``--name value`` options: for those, the generic ``argparse`` machinery
+is way more than what's needed. Here we "compile" such subparsers into
+a simple tokenizer, mapping arguments directly to values.
+
+Anything unexpected (unknown or abbreviated options, ``--help``, values
+looking like options, wrong number of positionals, type conversion
+errors, ..) makes the fast parser give up: the arguments are then parsed
+by ``argparse``, to get exactly the same behavior and error messages.
+"""
+
+from __future__ import absolute_import
+
+import argparse
+
+from clitools import string_types
+
+
+## Action types supported by the fast parser
+_STORE_ACTIONS = (argparse._StoreAction,)
+_FLAG_ACTIONS = (argparse._StoreTrueAction, argparse._StoreFalseAction)
+_IGNORED_ACTIONS = (argparse._HelpAction,)
+
+
+class NotSupported(Exception):
+    """The parser cannot be handled by the fast parser"""
+
+
+def _get_type_func(parser, action):
+    type_func = parser._registry_get('type', action.type, action.type)
+    if not callable(type_func):
+        raise NotSupported('Unsupported type {0!r}'.format(action.type))
+    return type_func
+
+
+def get_parser_defaults(parser):
+    """
+    Get the values argparse would set on the namespace for
+    a parser, if no arguments at all were passed.
+    """
+    defaults = {}
+    for action in parser._actions:
+        if action.dest is argparse.SUPPRESS:
+            continue
+        if action.default is argparse.SUPPRESS:
+            continue
+        default = action.default
+        if isinstance(default, string_types) and action.option_strings:
+            ## argparse converts string defaults of options that
+            ## were not passed, as if they were passed in argv
+            type_func = _get_type_func(parser, action)
+            try:
+                default = type_func(default)
+            except (argparse.ArgumentTypeError, TypeError, ValueError):
+                raise NotSupported('Invalid default for {0}'
+                                   .format(action.dest))
+        defaults[action.dest] = default
+    for dest, default in parser._defaults.items():
+        defaults.setdefault(dest, default)
+    return defaults
+
+
+class FastParser(object):
+    """
+    Arguments parser for a "simple" subparser.
+
+    :raises NotSupported: if the subparser contains arguments
+        that cannot be handled.
+    """
+
+    def __init__(self, parser):
+        self.positionals = []  # [(dest, type_func)]
+        self.options = {}  # {option_string: (dest, type_func, const)}
+
+        for action in parser._actions:
+            if isinstance(action, _IGNORED_ACTIONS):
+                continue
+
+            if action.required and action.option_strings:
+                raise NotSupported('Required option')
+            if action.choices is not None:
+                raise NotSupported('Choices')
+
+            if isinstance(action, _FLAG_ACTIONS):
+                spec = (action.dest, None, action.const)
+
+            elif isinstance(action, _STORE_ACTIONS):
+                if action.nargs is not None:
+                    raise NotSupported('nargs={0!r}'.format(action.nargs))
+                spec = (action.dest, _get_type_func(parser, action), None)
+
+            else:
+                raise NotSupported('Unsupported action {0!r}'
+                                   .format(type(action).__name__))
+
+            if action.option_strings:
+                for option_string in action.option_strings:
+                    self.options[option_string] = spec
+            else:
+                self.positionals.append(spec[:2])
+
+        self.defaults = get_parser_defaults(parser)
+
+    def parse(self, args):
+        """
+        Parse a list of arguments, returning a dict of values
+        or None if argparse is needed to handle them.
+        """
+        values = self.defaults.copy()
+        positionals = []
+
+        args = iter(args)
+        for arg in args:
+            if not arg.startswith('-') or arg == '-':
+                positionals.append(arg)
+                continue
+
+            option_string, has_value, value = arg.partition('=')
+            try:
+                dest, type_func, const = self.options[option_string]
+            except KeyError:
+                return None
+
+            if type_func is None:
+                ## On/off flag
+                if has_value:
+                    return None
+                values[dest] = const
+                continue
+
+            if not has_value:
+                value = next(args, None)
+                if value is None or value.startswith('-'):
+                    return None
+
+            try:
+                values[dest] = type_func(value)
+            except (argparse.ArgumentTypeError, TypeError, ValueError):
+                return None
+
+        if len(positionals) != len(self.positionals):
+            return None
+
+        for (dest, type_func), value in zip(self.positionals, positionals):
+            try:
+                values[dest] = type_func(value)
+            except (argparse.ArgumentTypeError, TypeError, ValueError):
+                return None
+
+        return values
+
+
+def compile_parser(parser):
+    """Get a :py:class:`FastParser` for a parser, or None if unsupported"""
+    try:
+        return FastParser(parser)
+    except NotSupported:
+        return None
@@ -0,0 +1,154 @@
+"""
+File arguments, opened by the framework.
+
+Arguments of type :py:class:`InputFile` are passed to commands already
+opened, and get closed when the command completes (including the
+streaming of items yielded by generators):
+
+- regular files are memory-mapped, and commands get a read-only
+  ``mmap`` object: it can be sliced, searched and read like a file,
+  without copying the whole file in memory;
+- standard input (``-``), pipes, devices, empty files (which can't be
+  mapped) are passed as buffered binary readers instead.
+
+Both support ``read(size)``, ``readline()`` and :py:func:`iter_chunks`.
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import io
+import mmap
+import os
+import stat
+import sys
+from contextlib import contextmanager
+
+
+## Size of chunks read from non-mapped files
+CHUNK_SIZE = 1024 * 1024
+
+
+class InputFile(object):
+    """
+    Argument type for files to be read: parsing only checks that the
+    file exists, the file is opened right before running the command.
+
+    Use it as a default value (``def cmd(data=InputFile)``), with
+    ``CliApp.arg(type=InputFile)``, or as the ``file`` type in
+    docstrings (``:type data: file``).
+
+    :param path: Path of the file, or ``'-'`` for standard input
+    """
+
+    #: Tells CliApp to open arguments of this type
+    is_input_file = True
+
+    def __init__(self, path):
+        self.path = path
+        if path != '-':
+            try:
+                os.stat(path)
+            except OSError as e:
+                raise argparse.ArgumentTypeError(
+                    "can't open '{0}': {1}".format(path, e.strerror))
+
+    def __repr__(self):
+        return 'InputFile({0!r})'.format(self.path)
+
+    def open(self):
+        """
+        :return: a read-only ``mmap`` for regular files, else
+            a buffered binary reader
+        """
+        if self.path == '-':
+            return _open_stdin()
+
+        fp = io.open(self.path, 'rb', buffering=CHUNK_SIZE)
+        try:
+            st = os.fstat(fp.fileno())
+            if stat.S_ISREG(st.st_mode) and st.st_size > 0:
+                data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                fp.close()  # the mapping stays valid
+                if hasattr(data, 'madvise'):  # Python >= 3.8
+                    data.madvise(mmap.MADV_SEQUENTIAL)
+                return data
+        except (EnvironmentError, ValueError):
+            ## Not mappable: fall back to reading it
+            pass
+        return fp
+
+
+def _open_stdin():
+    try:
+        fileno = sys.stdin.fileno()
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        ## Replaced by something not backed by a file descriptor
+        return getattr(sys.stdin, 'buffer', sys.stdin)
+    return io.open(fileno, 'rb', buffering=CHUNK_SIZE, closefd=False)
+
+
+def iter_chunks(data, size=CHUNK_SIZE):
+    """
+    Iterate over the contents of an opened file argument, in chunks
+    of up to ``size`` bytes; for memory-mapped files, chunks are
+    views on the mapping, not copies.
+    """
+    if not isinstance(data, mmap.mmap):
+        for chunk in iter(lambda: data.read(size), b''):
+            yield chunk
+        return
+
+    try:
+        view = memoryview(data)
+    except TypeError:
+        ## Python 2 mmaps only support the old buffer interface
+        view = None
+    for offset in range(0, len(data), size):
+        if view is None:
+            yield buffer(data, offset, size)
+        else:
+            yield view[offset:offset + size]
+
+
+def _close(data):
+    if data is sys.stdin or data is getattr(sys.stdin, 'buffer', None):
+        return
+    try:
+        data.close()
+    except BufferError:
+        ## Views on the mapping are still around: it will
+        ## be closed when garbage-collected
+        pass
+
+
+@contextmanager
+def open_inputs(parsed_args, names):
+    """
+    Open the file arguments in a parsed arguments namespace,
+    replacing them with the opened files until the context exits.
+
+    :param names: Names of the arguments which may be files
+        (or lists of files)
+    """
+    opened = []
+
+    def _open(value):
+        if isinstance(value, InputFile):
+            value = value.open()
+            opened.append(value)
+        return value
+
+    try:
+        for name in names:
+            if not hasattr(parsed_args, name):
+                continue
+            value = getattr(parsed_args, name)
+            if isinstance(value, list):
+                setattr(parsed_args, name, [_open(v) for v in value])
+            else:
+                setattr(parsed_args, name, _open(value))
+        yield parsed_args
+    finally:
+        for data in reversed(opened):
+            _close(data)
@@ -0,0 +1,84 @@
+"""
+Running commands from Python, without exiting.
+
+:py:meth:`clitools.CliApp.run` behaves as a program would: argparse
+exits on errors, and exceptions are raised to the caller. To run
+commands from a long-running process (eg. a job runner), use
+:py:meth:`clitools.CliApp.invoke` instead, returning an
+:py:class:`InvokeResult` with everything about the run.
+"""
+
+from __future__ import absolute_import
+
+import sys
+import time
+
+from clitools import capture
+
+
+class InvokeResult(object):
+    """
+    Outcome of a command run with :py:meth:`clitools.CliApp.invoke`
+
+    :ivar exit_code: Exit status the process would have exited with
+    :ivar return_value: Value returned by the command function
+    :ivar stdout: Output of the command (None if written to a
+        stream passed to ``invoke``)
+    :ivar stdout_bytes: Output of the command, as bytes (for binary
+        output formats)
+    :ivar stderr: Errors of the command (None if written to a
+        stream passed to ``invoke``)
+    :ivar exception: Exception raised by the command, if any
+    :ivar exc_info: ``sys.exc_info()`` for the exception, if any
+    :ivar duration: Time taken by the run, in seconds
+    """
+
+    def __init__(self, exit_code=0, return_value=None, stdout=None,
+                 stderr=None, exc_info=None, duration=None,
+                 stdout_bytes=None):
+        self.exit_code = exit_code
+        self.return_value = return_value
+        self.stdout = stdout
+        self.stdout_bytes = stdout_bytes
+        self.stderr = stderr
+        self.exc_info = exc_info
+        self.exception = exc_info[1] if exc_info is not None else None
+        self.duration = duration
+
+    @property
+    def success(self):
+        return self.exit_code == 0
+
+    def __repr__(self):
+        return '<InvokeResult exit_code={0!r} return_value={1!r}>'.format(
+            self.exit_code, self.return_value)
+
+
+def invoke(app, args, stdout=None, stderr=None):
+    """
+    Run a command line, capturing its output and outcome
+
+    See :py:meth:`clitools.CliApp.invoke`
+    """
+    from clitools.batch import exit_status
+
+    return_value = exc_info = None
+    exit_code = 0
+    start = time.time()
+    with capture.capture_output(stdout, stderr) as (out, err):
+        try:
+            return_value = app.run(list(args))
+        except SystemExit as e:
+            ## Messages passed to sys.exit() go to the captured errors
+            exit_code = exit_status(e)
+        except Exception:
+            exc_info = sys.exc_info()
+            exit_code = 1
+    duration = time.time() - start
+
+    return InvokeResult(
+        exit_code=exit_code, return_value=return_value,
+        stdout=out.getvalue() if stdout is None else None,
+        stdout_bytes=out.getbytes() if stdout is None else None,
+        stderr=err.getvalue() if stderr is None else None,
+        exc_info=exc_info, duration=duration)
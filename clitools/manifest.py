@@ -0,0 +1,183 @@
+"""
+Commands manifest: an on-disk cache for the information extracted
+from command functions, to avoid analyzing them on each run.
+
+Entries are grouped by the source file of the module defining
+the commands; each group is invalidated as soon as that file
+modification time or size change.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+import sys
+
+
+logger = logging.getLogger('clitools.manifest')
+
+MANIFEST_VERSION = 2
+
+## Keys of the ``func_info`` dict stored in the manifest. The keyword
+## argument defaults are not stored, as they might not be serializable:
+## they're taken from the function object instead.
+_STORED_KEYS = (
+    'name', 'help_text', 'accepts_varargs', 'varargs_name',
+    'accepts_kwargs', 'kwargs_name', 'is_generator', 'is_coroutine',
+    'is_async_generator', 'positional_args')
+
+
+def get_source_file(module_name):
+    """Get the (absolute) path to the source file of a loaded module"""
+    module = sys.modules.get(module_name)
+    filename = getattr(module, '__file__', None)
+    if filename is None:
+        return None
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+    return os.path.abspath(filename)
+
+
+def _file_signature(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return {'mtime': st.st_mtime, 'size': st.st_size}
+
+
+class Manifest(object):
+    """
+    Cache of analyzed command functions, stored as a JSON file.
+
+    :param path: Path to the manifest file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dirty = False
+        self._modules = None
+
+        ## Source files already checked for changes by this process
+        self._checked = set()
+
+    @property
+    def modules(self):
+        if self._modules is None:
+            self._modules = self._read()
+        return self._modules
+
+    def _read(self):
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+        except (IOError, ValueError):
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return data.get('modules', {})
+
+    def _get_module(self, filename, create=False):
+        """
+        Get the entries for a given source file, discarding them
+        if the file changed since they were stored.
+        """
+        if filename not in self._checked:
+            self._checked.add(filename)
+            entry = self.modules.get(filename)
+            signature = _file_signature(filename)
+            if entry is not None and (
+                    signature is None or
+                    entry['signature'] != signature):
+                logger.debug('Manifest: {0} changed'.format(filename))
+                del self.modules[filename]
+                self.dirty = True
+
+        if create and filename not in self.modules:
+            self.modules[filename] = {
+                'signature': _file_signature(filename),
+                'commands': {},
+            }
+            self.dirty = True
+        return self.modules.get(filename)
+
+    @staticmethod
+    def _func_key(func):
+        ## The line number is needed to tell apart functions
+        ## with the same name, eg. defined in a closure
+        return '{0}:{1}'.format(func.__name__, func.__code__.co_firstlineno)
+
+    def get_func_info(self, func):
+        """
+        Get the cached information for a function, in the format
+        returned by ``CliApp._analyze_function()``, or None.
+        """
+        filename = get_source_file(func.__module__)
+        if filename is None:
+            return None
+        module = self._get_module(filename)
+        if module is None:
+            return None
+        cached = module['commands'].get(self._func_key(func))
+        if cached is None:
+            return None
+
+        info = dict((key, cached[key]) for key in _STORED_KEYS)
+        info['positional_args'] = [str(x) for x in info['positional_args']]
+        info['keyword_args'] = list(zip(
+            [str(x) for x in cached['keyword_args']],
+            func.__defaults__ or ()))
+        return info
+
+    def set_func_info(self, func, func_info):
+        """Store the analyzed information for a function"""
+        filename = get_source_file(func.__module__)
+        if filename is None or _file_signature(filename) is None:
+            return
+        module = self._get_module(filename, create=True)
+        cached = dict((key, func_info[key]) for key in _STORED_KEYS)
+        cached['keyword_args'] = [
+            name for name, _ in func_info['keyword_args']]
+        module['commands'][self._func_key(func)] = cached
+        self.dirty = True
+
+    def get_help(self, target):
+        """
+        Get the help text of a command registered by its import path,
+        without importing it, or None.
+        """
+        module_name = target.split(':', 1)[0]
+        for filename, module in self.modules.items():
+            if module.get('module') != module_name:
+                continue
+            if self._get_module(filename) is None:
+                return None
+            return module.get('targets', {}).get(target)
+        return None
+
+    def set_help(self, target, func, help_text):
+        """Store the help text of a command registered by import path"""
+        filename = get_source_file(func.__module__)
+        if filename is None or _file_signature(filename) is None:
+            return
+        module = self._get_module(filename, create=True)
+        module['module'] = target.split(':', 1)[0]
+        module.setdefault('targets', {})[target] = help_text
+        self.dirty = True
+
+    def save(self):
+        """Write the manifest to disk, if anything changed"""
+        if not self.dirty:
+            return
+        data = {'version': MANIFEST_VERSION, 'modules': self.modules}
+        tmp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as fp:
+                json.dump(data, fp)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            logger.warning('Unable to write manifest {0}: {1}'
+                           .format(self.path, e))
+            return
+        self.dirty = False
@@ -0,0 +1,382 @@
+"""
+Output of command results.
+
+Items yielded by generator commands are written to the output as soon
+as they're produced, through a buffered writer, so that even huge
+outputs can be generated using constant memory.
+
+With ``--output-format``, return values and items are serialized by
+encoders producing bytes, written straight to the binary standard
+output (``sys.stdout.buffer``) when available; JSON is encoded with
+``orjson`` or ``ujson`` if installed (output is compact JSON anyways).
+"""
+
+from __future__ import absolute_import
+
+import csv
+import errno
+import json
+import os
+import sys
+import time
+
+from clitools import string_types
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class OutputClosed(Exception):
+    """The output stream was closed by the other end"""
+
+
+class StreamWriter(object):
+    """
+    Buffered writer, with a configurable flush policy.
+
+    :param stream: The stream to write to (defaults to ``sys.stdout``)
+    :param flush_every: Flush after this many items were written
+        (None to disable).
+    :param flush_interval: Flush when at least this many seconds
+        passed since the last flush (None to disable).
+    :param buffer_size: Flush anyways when this many characters
+        are waiting in the buffer.
+    :param binary: Whether data is bytes, rather than text
+    """
+
+    def __init__(self, stream=None, flush_every=1, flush_interval=None,
+                 buffer_size=65536, binary=False):
+        self.stream = sys.stdout if stream is None else stream
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self._empty = b'' if binary else ''
+        self._buffer = []
+        self._buffered_items = 0
+        self._buffered_size = 0
+        self._last_flush = time.time()
+
+    def write(self, data):
+        """Write one item to the stream (possibly buffering it)"""
+        self._buffer.append(data)
+        self._buffered_items += 1
+        self._buffered_size += len(data)
+
+        if self.flush_every is not None \
+                and self._buffered_items >= self.flush_every:
+            self.flush()
+        elif self._buffered_size >= self.buffer_size:
+            self.flush()
+        elif self.flush_interval is not None \
+                and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out the buffered data
+
+        :raises OutputClosed: if the stream was closed (eg. broken pipe)
+        """
+        data = self._empty.join(self._buffer)
+        del self._buffer[:]
+        self._buffered_items = self._buffered_size = 0
+        self._last_flush = time.time()
+
+        try:
+            if data:
+                self.stream.write(data)
+            self.stream.flush()
+        except IOError as e:
+            if e.errno == errno.EPIPE:
+                raise OutputClosed()
+            raise
+        except ValueError:
+            ## Write to a closed file
+            if getattr(self.stream, 'closed', False):
+                raise OutputClosed()
+            raise
+
+
+def format_line(item):
+    """Format an item as a line of text"""
+    if not isinstance(item, string_types):
+        item = str(item)
+    return item + '\n'
+
+
+def format_json_line(item):
+    """Format an item as a line of JSON"""
+    return json.dumps(item) + '\n'
+
+
+FORMATTERS = {
+    'lines': format_line,
+    'jsonl': format_json_line,
+}
+
+
+def _to_bytes(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
+
+
+def _get_json_dumps():
+    """:return: the fastest available function encoding JSON to bytes"""
+    try:
+        import orjson
+        return orjson.dumps
+    except ImportError:
+        pass
+    try:
+        import ujson
+    except ImportError:
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+        return lambda obj: _to_bytes(encode(obj))
+    return lambda obj: _to_bytes(
+        ujson.dumps(obj, escape_forward_slashes=False))
+
+
+class Encoder(object):
+    """
+    Base class for output encoders, turning command return values and
+    items yielded by generators into bytes.
+
+    Encoders can hold state (eg. to write headers), so a new one is
+    needed for each output.
+    """
+
+    def begin(self):
+        """:return: data to be written before the first item"""
+        return b''
+
+    def encode_item(self, item):
+        raise NotImplementedError
+
+    def end(self):
+        """:return: data to be written after the last item"""
+        return b''
+
+    def encode_value(self, value):
+        """Encode a return value; lists are written as many items"""
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        return self.begin() + b''.join(
+            [self.encode_item(item) for item in value]) + self.end()
+
+
+class LinesEncoder(Encoder):
+    def encode_item(self, item):
+        return _to_bytes(format_line(item))
+
+
+class JsonLinesEncoder(Encoder):
+    def __init__(self):
+        self.dumps = _get_json_dumps()
+
+    def encode_item(self, item):
+        return self.dumps(item) + b'\n'
+
+
+class JsonEncoder(Encoder):
+    """Items are written as a JSON list"""
+
+    def __init__(self):
+        self.dumps = _get_json_dumps()
+        self._first = True
+
+    def begin(self):
+        return b'['
+
+    def encode_item(self, item):
+        if self._first:
+            self._first = False
+            return self.dumps(item)
+        return b',\n' + self.dumps(item)
+
+    def end(self):
+        return b']\n'
+
+    def encode_value(self, value):
+        return self.dumps(value) + b'\n'
+
+
+class CsvEncoder(Encoder):
+    """
+    Items are written as rows: dicts get their keys written as header
+    (from the first one), other sequences are written as they are.
+    """
+
+    def __init__(self, dialect='excel'):
+        self._buffer = StringIO()
+        self._writer = csv.writer(self._buffer, dialect=dialect)
+        self._fields = None
+
+    def _row(self, item):
+        if isinstance(item, dict):
+            if self._fields is None:
+                self._fields = list(item)
+                self._writer.writerow(self._fields)
+            return [item.get(field, '') for field in self._fields]
+        if isinstance(item, (list, tuple)):
+            return item
+        return [item]
+
+    def encode_item(self, item):
+        self._writer.writerow(self._row(item))
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return _to_bytes(data)
+
+    def encode_value(self, value):
+        if isinstance(value, dict):
+            value = [value]
+        return Encoder.encode_value(self, value)
+
+
+class MsgpackEncoder(Encoder):
+    """Items are written as a stream of MessagePack objects"""
+
+    def __init__(self):
+        import msgpack
+        self._packer = msgpack.Packer(use_bin_type=True)
+
+    def encode_item(self, item):
+        return self._packer.pack(item)
+
+    def encode_value(self, value):
+        return self._packer.pack(value)
+
+
+## Output formats for --output-format: factories of encoders
+ENCODERS = {
+    'lines': LinesEncoder,
+    'json': JsonEncoder,
+    'jsonl': JsonLinesEncoder,
+    'csv': CsvEncoder,
+    'tsv': lambda: CsvEncoder(dialect='excel-tab'),
+    'msgpack': MsgpackEncoder,
+}
+
+
+def get_encoder(format):
+    """
+    :return: a new encoder for an output format
+    :raises ValueError: if the format is not supported, or its
+        dependencies are missing
+    """
+    if format not in ENCODERS:
+        raise ValueError('Unsupported output format: {0}'.format(format))
+    try:
+        return ENCODERS[format]()
+    except ImportError as e:
+        raise ValueError('Output format {0} not available: {1}'
+                         .format(format, e))
+
+
+class _TextAdapter(object):
+    """Stream accepting bytes, writing them out to a text stream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        self.stream.write(data.decode('utf-8'))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.stream, name)
+
+
+def get_binary_stream(stream=None):
+    """
+    :return: a stream accepting bytes, writing to ``stream``
+        (defaults to ``sys.stdout``)
+    """
+    if stream is None:
+        stream = sys.stdout
+    if str is bytes:
+        return stream
+    buffer = getattr(stream, 'buffer', None)
+    if buffer is None:
+        return _TextAdapter(stream)
+    ## Text written so far must come first
+    stream.flush()
+    return buffer
+
+
+def write_value(value, encoder, stream=None):
+    """Write out a command return value, with an encoder"""
+    stream = get_binary_stream(stream)
+    try:
+        stream.write(encoder.encode_value(value))
+        stream.flush()
+    except IOError as e:
+        if e.errno != errno.EPIPE:
+            raise
+        _silence_stream(stream)
+
+
+def _silence_stream(stream):
+    """
+    Redirect the file descriptor behind a stream to /dev/null, to avoid
+    errors when the interpreter tries flushing it again on exit.
+    """
+    try:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, stream.fileno())
+        os.close(devnull)
+    except (AttributeError, ValueError, IOError, OSError):
+        pass
+
+
+def stream_output(items, stream=None, format='lines', flush_every=1,
+                  flush_interval=None, encoder=None):
+    """
+    Write items to a stream, as soon as they're produced.
+
+    If the stream gets closed by the other end (eg. output is piped
+    to ``head``), the items generator is closed and we stop quietly.
+
+    :param items: Iterable of items to be written
+    :param format: Output format: ``'lines'`` or ``'jsonl'``
+    :param flush_every: see :py:class:`StreamWriter`
+    :param flush_interval: see :py:class:`StreamWriter`
+    :param encoder: An :py:class:`Encoder` to write items with,
+        as bytes, instead of using ``format``
+    :return: the number of items written
+    """
+    if encoder is None:
+        formatter = FORMATTERS[format]
+        writer = StreamWriter(stream, flush_every=flush_every,
+                              flush_interval=flush_interval)
+    else:
+        formatter = encoder.encode_item
+        writer = StreamWriter(get_binary_stream(stream),
+                              flush_every=flush_every,
+                              flush_interval=flush_interval, binary=True)
+
+    count = 0
+    try:
+        try:
+            if encoder is not None and encoder.begin():
+                writer.write(encoder.begin())
+            for item in items:
+                writer.write(formatter(item))
+                count += 1
+            if encoder is not None and encoder.end():
+                writer.write(encoder.end())
+        finally:
+            ## Make sure we don't lose output if the generator fails
+            writer.flush()
+
+    except OutputClosed:
+        if hasattr(items, 'close'):
+            items.close()
+        _silence_stream(writer.stream)
+
+    return count
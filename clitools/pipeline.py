@@ -0,0 +1,47 @@
+"""
+In-process pipelines of commands.
+
+Command lines can be chained with ``:::``, as in::
+
+    cli-app extract --src data.csv ::: filter --min 3 ::: load
+
+The items yielded by each command (or the iterable it returns) are
+passed, as they are, to the argument of the next command named by its
+``pipe_input`` option: nothing is serialized, and generators are
+consumed lazily, one item at a time, so that memory use doesn't depend
+on the number of items.
+"""
+
+from __future__ import absolute_import
+
+import sys
+
+from clitools import PIPE_SEPARATOR
+
+
+def split_pipeline(args):
+    """
+    Split a command line into the command lines of a pipeline
+
+    >>> split_pipeline(['a', '-x', ':::', 'b', ':::', 'c', '1'])
+    [['a', '-x'], ['b'], ['c', '1']]
+    """
+    stages = [[]]
+    for arg in args:
+        if arg == PIPE_SEPARATOR:
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+    return stages
+
+
+def iter_lines(stream=None):
+    """
+    Iterate the lines of a text stream (standard input by default),
+    without line endings: used as input for pipeline commands run
+    on their own.
+    """
+    if stream is None:
+        stream = sys.stdin
+    for line in stream:
+        yield line.rstrip('\r\n')
@@ -0,0 +1,131 @@
+"""
+Discovery of commands from the entry points of installed distributions.
+
+Scanning entry points means reading metadata of all the installed
+distributions, which can be slow in large environments: the list of
+entry points found is cached in an index file, which is only rebuilt
+when the installed distributions change (as told by the names of their
+metadata directories, which include versions, and their modification
+times). Plugin modules are not imported at all while scanning.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import json
+import logging
+import os
+import sys
+
+
+logger = logging.getLogger('clitools.plugins')
+
+INDEX_VERSION = 1
+
+## Default entry points group for commands
+DEFAULT_GROUP = 'clitools.commands'
+
+_METADATA_SUFFIXES = ('.dist-info', '.egg-info', '.egg', '.egg-link')
+
+
+def environment_key():
+    """
+    :return: a key changing whenever distributions are installed,
+        upgraded or removed, from all the ``sys.path`` directories
+    """
+    digest = hashlib.sha1()
+    for path in sys.path:
+        digest.update(repr(path).encode('utf-8'))
+        try:
+            names = sorted(os.listdir(path or '.'))
+        except OSError:
+            continue
+        for name in names:
+            if not name.endswith(_METADATA_SUFFIXES):
+                continue
+            try:
+                mtime = os.stat(os.path.join(path, name)).st_mtime
+            except OSError:
+                mtime = None
+            digest.update(repr((name, mtime)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def scan_entry_points(group):
+    """
+    Scan installed distributions for entry points in a group
+
+    :return: a list of ``(name, 'package.module:object')`` tuples
+    """
+    try:
+        from importlib import metadata
+    except ImportError:
+        ## Python < 3.8
+        import pkg_resources
+        entry_points = [
+            (ep.name, ':'.join([ep.module_name] + (
+                ['.'.join(ep.attrs)] if ep.attrs else [])))
+            for ep in pkg_resources.WorkingSet(sys.path)
+            .iter_entry_points(group)]
+    else:
+        all_entry_points = metadata.entry_points()
+        if hasattr(all_entry_points, 'select'):  # Python >= 3.10
+            found = all_entry_points.select(group=group)
+        else:
+            found = all_entry_points.get(group, ())
+        entry_points = [(ep.name, ep.value) for ep in found]
+
+    result = []
+    for name, value in entry_points:
+        ## Strip extras, as in 'package.module:function [extra]'
+        value = value.split('[', 1)[0].strip()
+        if ':' not in value:
+            logger.warning('Ignoring entry point {0} = {1}: not in the '
+                           "'package.module:function' form"
+                           .format(name, value))
+            continue
+        result.append((name, value))
+    return sorted(set(result))
+
+
+def find_entry_points(group=DEFAULT_GROUP, index_path=None):
+    """
+    Get the entry points in a group, from the index if still valid
+
+    :param index_path: Path to the index file (None to always scan)
+    :return: a list of ``(name, 'package.module:object')`` tuples
+    """
+    if index_path is None:
+        return scan_entry_points(group)
+
+    key = environment_key()
+    try:
+        with open(index_path) as fp:
+            index = json.load(fp)
+    except (IOError, ValueError):
+        index = {}
+    if index.get('version') == INDEX_VERSION and index.get('key') == key \
+            and index.get('group') == group:
+        return [(str(name), str(value))
+                for name, value in index['entry_points']]
+
+    logger.debug('Scanning entry points for {0}'.format(group))
+    entry_points = scan_entry_points(group)
+    index = {
+        'version': INDEX_VERSION,
+        'key': key,
+        'group': group,
+        'entry_points': entry_points,
+    }
+    tmp_path = '{0}.{1}.tmp'.format(index_path, os.getpid())
+    try:
+        directory = os.path.dirname(index_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(tmp_path, 'w') as fp:
+            json.dump(index, fp)
+        os.rename(tmp_path, index_path)
+    except (IOError, OSError) as e:
+        logger.warning('Unable to write plugins index {0}: {1}'
+                       .format(index_path, e))
+    return entry_points
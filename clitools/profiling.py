@@ -0,0 +1,151 @@
+"""
+Profiling of CliApp runs.
+
+The whole run is profiled with ``cProfile``, and statistics are either
+dumped to a file (to be loaded with :py:mod:`pstats`, or tools such
+as ``snakeviz``) or written to standard error as a sorted text report.
+
+A breakdown of the time spent in each phase of the run is written to
+standard error as well, to tell the framework overhead apart from the
+time spent in the command itself:
+
+- ``registration``: analysis and subparser building, for each command
+  (including module import, for commands registered by import path;
+  for eagerly registered commands, this happened before the run)
+- ``parsing``: command line parsing
+- ``mapping``: mapping of parsed arguments to function arguments
+- ``command``: the command function itself (including the streaming
+  of items yielded by generators)
+
+Note that all the timings include the profiler overhead.
+"""
+
+from __future__ import absolute_import
+
+import cProfile
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+
+## Number of functions listed in text reports
+REPORT_LIMIT = 30
+
+PHASES = ('parsing', 'mapping', 'command')
+
+
+class PhaseTimer(object):
+    """Accumulate the time spent in each phase"""
+
+    def __init__(self):
+        self.times = dict((phase, 0.0) for phase in PHASES)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.times[name] += time.time() - start
+
+    def wrap(self, name, func):
+        """Wrap a function, accounting its run time to a phase"""
+        def wrapper(*a, **kw):
+            with self.phase(name):
+                return func(*a, **kw)
+        return wrapper
+
+
+class Profiler(object):
+    """
+    Context manager profiling a run of a CliApp.
+
+    The app methods involved in each phase get wrapped (on the
+    instance only) for as long as the context is active.
+
+    :param app: The CliApp being run
+    :param output: Path of the file to write statistics to,
+        or ``'-'`` to write a text report to standard error
+    :param sort: Sort key for the text report
+        (see :py:meth:`pstats.Stats.sort_stats`)
+    """
+
+    def __init__(self, app, output, sort='cumulative'):
+        self.app = app
+        self.output = output
+        self.sort = sort
+        self.timer = PhaseTimer()
+        self.profile = cProfile.Profile()
+        self.total = None
+        self._start = None
+        self._loaded_before = set(app._load_times)
+
+    def __enter__(self):
+        app, timer = self.app, self.timer
+        dispatch = app._dispatch
+
+        def _dispatch(parsed_args):
+            command = getattr(parsed_args, 'func', None)
+            if command is None:
+                return dispatch(parsed_args)
+            command.get_call_args = timer.wrap(
+                'mapping', command.get_call_args)
+            command.invoke = timer.wrap('command', command.invoke)
+            try:
+                return dispatch(parsed_args)
+            finally:
+                del command.get_call_args, command.invoke
+
+        app._parse_args = timer.wrap('parsing', app._parse_args)
+        app._stream_output = timer.wrap('command', app._stream_output)
+        app._dispatch = _dispatch
+
+        self._start = time.time()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.profile.disable()
+        self.total = time.time() - self._start
+        del self.app._parse_args, self.app._stream_output, self.app._dispatch
+
+        if self.output == '-':
+            self.print_stats(sys.stderr)
+        else:
+            self.profile.dump_stats(self.output)
+        sys.stderr.write(self.format_phases())
+
+    def print_stats(self, stream):
+        """Write a sorted text report of the profile statistics"""
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats(self.sort).print_stats(REPORT_LIMIT)
+
+    def format_phases(self):
+        """:return: the phases breakdown, as text"""
+        load_times = self.app._load_times
+
+        def line(label, seconds, indent=2):
+            return '{0}{1:<{2}} {3:10.3f} ms\n'.format(
+                ' ' * indent, label, 30 - indent, seconds * 1000)
+
+        text = 'Phases breakdown:\n'
+        text += line('registration', sum(load_times.values()))
+        for name in sorted(load_times):
+            label = name
+            if name in self._loaded_before:
+                label += ' (before run)'
+            text += line(label, load_times[name], indent=4)
+
+        during_run = 0.0
+        for name in load_times:
+            if name not in self._loaded_before:
+                during_run += load_times[name]
+        accounted = during_run
+        for phase in PHASES:
+            text += line(phase, self.timer.times[phase])
+            accounted += self.timer.times[phase]
+
+        text += line('other', max(self.total - accounted, 0))
+        text += line('total (run)', self.total)
+        return text
@@ -0,0 +1,310 @@
+"""
+Persistent server mode, to avoid paying interpreter start-up, imports
+and commands registration on each invocation.
+
+The server loads all the commands, then forks a pool of workers
+accepting connections on a Unix socket. Each request carries the
+command line arguments, environment and working directory of the
+client; standard input / output / error are relayed through the
+socket, and the exit status is sent back when the command completes.
+
+Workers handle requests one at a time, and get replaced after
+serving a given number of them, to limit the effects of any state
+leaking between requests.
+
+Use :py:mod:`clitools.client` to send requests to the server.
+"""
+
+from __future__ import absolute_import
+
+import gc
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+
+from clitools import text_type
+
+
+logger = logging.getLogger('clitools.server')
+
+## Frame types. Client to server:
+FRAME_REQUEST = b'R'  # JSON: {"argv": [...], "env": {...}, "cwd": "..."}
+FRAME_STDIN = b'I'  # Standard input data
+FRAME_STDIN_EOF = b'E'  # End of standard input
+
+## Server to client:
+FRAME_STDOUT = b'O'
+FRAME_STDERR = b'X'
+FRAME_STATUS = b'S'  # Exit status, as a decimal string
+
+_HEADER = struct.Struct('!cI')
+
+
+def encode_frame(kind, data=b''):
+    """:return: the bytes to send for a frame"""
+    return _HEADER.pack(kind, len(data)) + data
+
+
+class ConnectionClosed(IOError):
+    """The other end closed the connection"""
+
+
+class Channel(object):
+    """Exchange frames over a socket"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._buffer = b''
+
+    def send(self, kind, data=b''):
+        self.sock.sendall(encode_frame(kind, data))
+
+    def _recv_exactly(self, size):
+        while len(self._buffer) < size:
+            data = self.sock.recv(max(65536, size - len(self._buffer)))
+            if not data:
+                raise ConnectionClosed('Connection closed')
+            self._buffer += data
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def recv(self):
+        """:return: a ``(kind, data)`` tuple"""
+        kind, size = _HEADER.unpack(self._recv_exactly(_HEADER.size))
+        return kind, self._recv_exactly(size)
+
+    def feed(self, data):
+        """
+        Parse frames from data received by the caller.
+
+        :return: a list of ``(kind, data)`` tuples
+        """
+        self._buffer += data
+        frames = []
+        while len(self._buffer) >= _HEADER.size:
+            kind, size = _HEADER.unpack(self._buffer[:_HEADER.size])
+            end = _HEADER.size + size
+            if len(self._buffer) < end:
+                break
+            frames.append((kind, self._buffer[_HEADER.size:end]))
+            self._buffer = self._buffer[end:]
+        return frames
+
+
+class _RemoteInput(io.RawIOBase):
+    """Standard input, read from the client"""
+
+    def __init__(self, channel):
+        self._channel = channel
+        self._data = b''
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._data and not self._eof:
+            kind, data = self._channel.recv()
+            if kind == FRAME_STDIN:
+                self._data = data
+            elif kind == FRAME_STDIN_EOF:
+                self._eof = True
+        size = min(len(b), len(self._data))
+        b[:size] = self._data[:size]
+        self._data = self._data[size:]
+        return size
+
+
+class _RemoteOutput(object):
+    """Standard output / error, sent to the client"""
+
+    def __init__(self, channel, kind):
+        self._channel = channel
+        self._kind = kind
+
+        ## For Python 3 code writing bytes to sys.stdout.buffer
+        self.buffer = self
+
+    def write(self, data):
+        if isinstance(data, text_type):
+            data = data.encode('utf-8')
+        if data:
+            self._channel.send(self._kind, data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def handle_request(app, channel):
+    """
+    Run a command from a client request, in this process
+
+    :return: the command exit status
+    """
+    from clitools.batch import exit_status
+
+    kind, data = channel.recv()
+    if kind != FRAME_REQUEST:
+        raise ValueError('Unexpected frame: {0!r}'.format(kind))
+    request = json.loads(data.decode('utf-8'))
+
+    stdin = io.BufferedReader(_RemoteInput(channel))
+    if sys.version_info >= (3,):
+        stdin = io.TextIOWrapper(stdin, encoding='utf-8')
+
+    saved_env = dict(os.environ)
+    saved_cwd = os.getcwd()
+    saved_streams = sys.stdin, sys.stdout, sys.stderr
+    saved_argv = sys.argv
+
+    try:
+        os.environ.clear()
+        os.environ.update(request['env'])
+        os.chdir(request['cwd'])
+        sys.argv = [app.prog_name] + request['argv']
+        sys.stdin = stdin
+        sys.stdout = _RemoteOutput(channel, FRAME_STDOUT)
+        sys.stderr = _RemoteOutput(channel, FRAME_STDERR)
+
+        try:
+            app.run(request['argv'])
+        except SystemExit as e:
+            status = exit_status(e)
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        else:
+            status = 0
+
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+        sys.argv = saved_argv
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+    channel.send(FRAME_STATUS, str(status).encode('ascii'))
+    return status
+
+
+def _worker(app, listener, max_requests):
+    """Worker process main loop"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    for _ in range(max_requests):
+        conn, _ = listener.accept()
+        try:
+            handle_request(app, Channel(conn))
+        except (IOError, OSError):
+            ## Most likely, the client went away
+            logger.debug('Request failed', exc_info=True)
+        except Exception:
+            logger.exception('Request failed')
+        finally:
+            conn.close()
+
+
+def _stop_workers(children, timeout=5):
+    """
+    Terminate the worker processes, killing them if they're still
+    running after ``timeout`` seconds.
+
+    SIGTERM is sent again until workers exit, as it can get lost by
+    a worker that was just forked (before the interpreter is ready
+    to handle signals in the new process).
+    """
+    deadline = time.time() + timeout
+    children = set(children)
+    while children:
+        sig = signal.SIGTERM if time.time() < deadline else signal.SIGKILL
+        for pid in list(children):
+            try:
+                os.kill(pid, sig)
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    children.discard(pid)
+            except OSError:
+                children.discard(pid)
+        if children:
+            time.sleep(0.05)
+
+
+def serve(app, socket_path, workers=4, max_requests=1000):
+    """
+    Serve commands from a CliApp on a Unix socket, until terminated.
+
+    :param app: The CliApp whose commands are to be run
+    :param socket_path: Path to the Unix socket to listen on
+    :param workers: Number of worker processes
+    :param max_requests: Number of requests after which
+        a worker gets replaced by a fresh one
+    """
+
+    ## Get everything ready, before forking workers
+    app._load_all_commands()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    ## Move everything allocated so far out of the garbage collector
+    ## tracking, so that workers don't touch (and copy) the pages
+    ## shared with the master (Python >= 3.7)
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    state = {'forking': False, 'terminated': False}
+
+    def _terminate(signum, frame):
+        if state['forking']:
+            ## Wait until the new worker is in the children to kill
+            state['terminated'] = True
+        else:
+            sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _terminate)
+
+    children = set()
+    try:
+        while True:
+            while len(children) < workers:
+                state['forking'] = True
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        _worker(app, listener, max_requests)
+                    finally:
+                        os._exit(0)
+                children.add(pid)
+                state['forking'] = False
+                if state['terminated']:
+                    sys.exit(0)
+
+            pid, _ = os.wait()
+            children.discard(pid)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        _stop_workers(children)
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
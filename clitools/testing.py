@@ -0,0 +1,125 @@
+"""
+Utilities for testing applications built with clitools.
+
+:py:class:`CliRunner` runs commands in the test process, with their
+input, output, environment and working directory isolated: no new
+interpreter is started for each test case, and commands (and their
+parsers) are loaded only once per application.
+"""
+
+from __future__ import absolute_import
+
+import io
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from clitools import string_types, text_type
+
+
+def _make_input(input):
+    """Build a stream to replace standard input with"""
+    if input is None:
+        input = b''
+    elif hasattr(input, 'read'):
+        return input
+    if isinstance(input, text_type):
+        input = input.encode('utf-8')
+    stream = io.BytesIO(input)
+    if sys.version_info[0] >= 3:
+        ## With the ``buffer`` attribute, as for the actual stdin
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return stream
+
+
+class CliRunner(object):
+    """
+    Run commands of a CliApp in-process, for tests
+
+    Create one runner per application (eg. in a module-scoped
+    fixture), so that commands loaded by a test are reused by the
+    next ones.
+
+    :param app: The CliApp to run commands from
+    :param env: Environment variables to set for all the runs
+        (with None values for variables to unset)
+    :param cwd: Working directory for all the runs
+    """
+
+    def __init__(self, app, env=None, cwd=None):
+        self.app = app
+        self.env = env or {}
+        self.cwd = cwd
+
+    def invoke(self, args, input=None, env=None, cwd=None):
+        """
+        Run a command line
+
+        :param args: Command line arguments, as a list or as a
+            string to be split as a shell would
+        :param input: Standard input for the command, as a string
+            or a file-like object (empty by default)
+        :param env: Environment variables to set for this run
+        :param cwd: Working directory for this run
+        :return: a :py:class:`clitools.invocation.InvokeResult`
+        """
+        if isinstance(args, string_types):
+            args = shlex.split(args)
+        with self.isolation(input=input, env=env, cwd=cwd):
+            return self.app.invoke(args)
+
+    @contextmanager
+    def isolation(self, input=None, env=None, cwd=None):
+        """
+        Replace standard input, environment variables and working
+        directory while running a command; output is captured by
+        :py:meth:`clitools.CliApp.invoke`.
+        """
+        all_env = dict(self.env)
+        all_env.update(env or {})
+        if cwd is None:
+            cwd = self.cwd
+
+        old_stdin = sys.stdin
+        old_env = {}
+        old_cwd = os.getcwd() if cwd is not None else None
+        sys.stdin = _make_input(input)
+        try:
+            for name, value in all_env.items():
+                old_env[name] = os.environ.get(name)
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            if cwd is not None:
+                os.chdir(cwd)
+            yield
+
+        finally:
+            sys.stdin = old_stdin
+            for name, value in old_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            if old_cwd is not None:
+                os.chdir(old_cwd)
+
+    @contextmanager
+    def isolated_filesystem(self):
+        """
+        Run commands in a new temporary directory, removed afterwards
+
+        :yields: the path of the directory
+        """
+        path = tempfile.mkdtemp(prefix='clitools-test-')
+        old_cwd = self.cwd
+        self.cwd = path
+        try:
+            yield path
+        finally:
+            self.cwd = old_cwd
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,96 @@
+"""
+Tests for asyncio-based commands
+"""
+
+from __future__ import print_function
+
+import sys
+
+import pytest
+
+from clitools import CliApp
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 6), reason='asyncio / async generators needed')
+
+
+## Kept in a string, as the syntax is not valid on older Pythons
+ASYNC_COMMANDS = '''
+import asyncio
+
+from clitools.aio import gather
+
+
+@cli.command
+async def fetch(name='world', delay=0.01):
+    await asyncio.sleep(delay)
+    return 'Hello, {0}!'.format(name)
+
+
+@cli.command(stream_format='jsonl')
+async def numbers(limit=3):
+    for i in range(limit):
+        await asyncio.sleep(0)
+        yield {'number': i}
+
+
+@cli.command
+async def fan_out(count=20, limit=5):
+    state = {'running': 0, 'max_running': 0}
+
+    async def task(i):
+        state['running'] += 1
+        state['max_running'] = max(state['max_running'], state['running'])
+        await asyncio.sleep(0.01)
+        state['running'] -= 1
+        return i * 2
+
+    results = await gather((task(i) for i in range(count)), limit=limit)
+    return results, state['max_running']
+
+
+@cli.command
+async def fail():
+    raise ValueError('Something went wrong')
+'''
+
+
+@pytest.fixture
+def async_script():
+    cli = CliApp()
+    exec(ASYNC_COMMANDS, {'cli': cli})
+    return cli
+
+
+def test_coroutine_command(async_script):
+    info = async_script._commands['fetch'].func_info
+    assert info['is_coroutine'] and not info['is_async_generator']
+    assert async_script.run(['fetch', '--name', 'asyncio']) \
+        == 'Hello, asyncio!'
+
+
+def test_async_generator_command(async_script, capsys):
+    info = async_script._commands['numbers'].func_info
+    assert info['is_async_generator'] and not info['is_coroutine']
+    assert async_script.run(['numbers', '--limit', '2']) is None
+    out, err = capsys.readouterr()
+    assert out == '{"number": 0}\n{"number": 1}\n'
+
+
+def test_gather_limit(async_script):
+    results, max_running = async_script.run(['fan_out'])
+    assert results == [i * 2 for i in range(20)]
+    assert max_running == 5
+
+
+def test_coroutine_failure(async_script):
+    with pytest.raises(ValueError):
+        async_script.run(['fail'])
+
+
+def test_async_batch(async_script, capsys):
+    result = async_script.run_batch(
+        ['numbers --limit 1\n'] * 4 + ['fail\n'], jobs=3)
+    out, err = capsys.readouterr()
+    assert [status for _, _, status in result.statuses] == [0] * 4 + [1]
+    assert out == '{"number": 0}\n' * 4
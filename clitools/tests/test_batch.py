@@ -0,0 +1,339 @@
+"""
+Tests for running batches of commands
+"""
+
+from __future__ import print_function
+
+import io
+import sys
+
+import pytest
+
+from clitools import CliApp
+
+
+@pytest.fixture
+def batch_script():
+    cli = CliApp()
+
+    @cli.command
+    def hello(name='world'):
+        print("Hello, {0}!".format(name))
+
+    @cli.command
+    def fail(code=1):
+        sys.exit(code)
+
+    @cli.command
+    def crash():
+        raise ValueError("Something went wrong")
+
+    return cli
+
+
+BATCH = u'''\
+# Comments and empty lines are ignored
+
+hello
+hello --name 'Python developers'
+fail --code 3
+hello --name=spam
+'''
+
+
+def test_run_batch(batch_script, capsys):
+    result = batch_script.run_batch(io.StringIO(BATCH))
+    out, err = capsys.readouterr()
+
+    assert out == ('Hello, world!\n'
+                   'Hello, Python developers!\n'
+                   'Hello, spam!\n')
+    assert err == ('Batch line 5: exit status 3\n'
+                   'Batch: 4 commands run, 1 failed\n')
+
+    assert not result.success
+    assert result.statuses == [
+        (3, 'hello', 0),
+        (4, "hello --name 'Python developers'", 0),
+        (5, 'fail --code 3', 3),
+        (6, 'hello --name=spam', 0),
+    ]
+
+
+def test_run_batch_fail_fast(batch_script, capsys):
+    result = batch_script.run_batch(io.StringIO(BATCH), fail_fast=True)
+    out, err = capsys.readouterr()
+    assert out == 'Hello, world!\nHello, Python developers!\n'
+    assert [status for _, _, status in result.statuses] == [0, 0, 3]
+
+
+def test_run_batch_errors(batch_script, capsys):
+    result = batch_script.run_batch([
+        'crash\n', 'non_existent_command\n', 'hello --garbage\n', 'hello\n'])
+    out, err = capsys.readouterr()
+    assert out == 'Hello, world!\n'
+    assert [status for _, _, status in result.statuses] == [1, 2, 2, 0]
+    assert 'Something went wrong' in err
+    assert 'invalid choice' in err
+    assert 'unrecognized arguments: --garbage' in err
+
+
+def test_run_batch_reuses_parsed_args(batch_script, monkeypatch, capsys):
+    parsed = []
+    orig_parse_args = batch_script._parse_args
+
+    def _parse_args(args):
+        parsed.append(args)
+        return orig_parse_args(args)
+
+    monkeypatch.setattr(batch_script, '_parse_args', _parse_args)
+    result = batch_script.run_batch(['hello --name x\n'] * 3 + ['hello\n'])
+    assert result.success
+    assert parsed == [['hello', '--name', 'x'], ['hello']]
+
+    out, err = capsys.readouterr()
+    assert out == 'Hello, x!\n' * 3 + 'Hello, world!\n'
+
+
+def test_batch_option(batch_script, tmpdir, capsys):
+    batch_file = tmpdir.join('commands.txt')
+    batch_file.write('hello\nhello --name Python\n')
+
+    with pytest.raises(SystemExit) as excinfo:
+        batch_script.run(['--batch', str(batch_file)])
+    assert excinfo.value.code == 0
+    out, err = capsys.readouterr()
+    assert out == 'Hello, world!\nHello, Python!\n'
+
+    batch_file.write('fail\nhello\n')
+    with pytest.raises(SystemExit) as excinfo:
+        batch_script.run(['--batch', str(batch_file), '--batch-fail-fast'])
+    assert excinfo.value.code == 1
+    out, err = capsys.readouterr()
+    assert out == ''
+
+
+def test_batch_option_stdin(batch_script, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(u'hello\n'))
+    with pytest.raises(SystemExit) as excinfo:
+        batch_script.run(['--batch=-'])
+    assert excinfo.value.code == 0
+    out, err = capsys.readouterr()
+    assert out == 'Hello, world!\n'
+
+
+@pytest.fixture
+def parallel_script():
+    import os
+    import time
+
+    cli = CliApp()
+
+    @cli.command
+    def slow(name, delay=0.0, lines=3):
+        for i in range(lines):
+            print("{0}: {1}".format(name, i))
+            time.sleep(delay / lines)
+
+    @cli.command(executor='process')
+    def getpid():
+        print(os.getpid())
+
+    @cli.command(executor='process')
+    def slow_process(delay=0.0):
+        time.sleep(delay)
+        print("done")
+
+    return cli
+
+
+def test_run_batch_parallel(parallel_script, capsys):
+    result = parallel_script.run_batch([
+        'slow aaa --delay 0.3\n',
+        'slow bbb --delay 0.1\n',
+        'slow ccc\n',
+    ], jobs=3)
+    out, err = capsys.readouterr()
+    assert result.success
+    assert out == ('ccc: 0\nccc: 1\nccc: 2\n'
+                   'bbb: 0\nbbb: 1\nbbb: 2\n'
+                   'aaa: 0\naaa: 1\naaa: 2\n')
+
+
+def test_run_batch_parallel_ordered(parallel_script, capsys):
+    result = parallel_script.run_batch([
+        'slow aaa --delay 0.2\n',
+        'slow bbb --garbage\n',
+        'slow ccc\n',
+    ], jobs=3, ordered=True)
+    out, err = capsys.readouterr()
+    assert [status for _, _, status in result.statuses] == [0, 2, 0]
+    assert out == ('aaa: 0\naaa: 1\naaa: 2\n'
+                   'ccc: 0\nccc: 1\nccc: 2\n')
+    assert 'unrecognized arguments: --garbage' in err
+
+
+def test_run_batch_processes(parallel_script, capsys):
+    import os
+
+    result = parallel_script.run_batch(['getpid\n'] * 4, jobs=2)
+    out, err = capsys.readouterr()
+    assert result.success
+
+    pids = set(int(x) for x in out.splitlines())
+    assert len(pids) in (1, 2)
+    assert os.getpid() not in pids
+
+
+## Timed out threads cannot be stopped: the command only writes before
+## sleeping, not to write to the output of any later test.
+@pytest.mark.parametrize('command', [
+    'slow x --delay 5 --lines 1', 'slow_process --delay 5'])
+def test_run_batch_timeout(parallel_script, capsys, command):
+    import time
+
+    start = time.time()
+    result = parallel_script.run_batch(
+        [command, 'slow y'], jobs=2, timeout=0.3)
+    assert time.time() - start < 3
+
+    out, err = capsys.readouterr()
+    assert [status for _, _, status in result.statuses] == [0, 124]
+    assert out == 'y: 0\ny: 1\ny: 2\n'
+    assert 'Batch line 1: timed out after 0.3 seconds' in err
+
+
+@pytest.mark.parametrize('command', [
+    'slow x --delay 5 --lines 1', 'slow_process --delay 5'])
+def test_run_batch_timeout_queued(parallel_script, capsys, command):
+    import time
+
+    ## Commands after a timed-out one get a free worker
+    start = time.time()
+    result = parallel_script.run_batch(
+        [command, 'slow y --delay 0.2', 'slow z --delay 0.2'],
+        jobs=1, timeout=0.5)
+    assert time.time() - start < 3
+
+    out, err = capsys.readouterr()
+    assert [status for _, _, status in result.statuses] == [124, 0, 0]
+    assert out.endswith('y: 0\ny: 1\ny: 2\nz: 0\nz: 1\nz: 2\n')
+
+
+def test_jobs_option(parallel_script, tmpdir, capsys):
+    batch_file = tmpdir.join('commands.txt')
+    batch_file.write('slow aaa --delay 0.2\nslow bbb\n')
+
+    with pytest.raises(SystemExit) as excinfo:
+        parallel_script.run(['--batch', str(batch_file), '--jobs', '2',
+                             '--ordered'])
+    assert excinfo.value.code == 0
+    out, err = capsys.readouterr()
+    assert out == 'aaa: 0\naaa: 1\naaa: 2\nbbb: 0\nbbb: 1\nbbb: 2\n'
+
+
+@pytest.fixture
+def map_script():
+    import os
+
+    cli = CliApp()
+
+    @cli.command
+    def square(number, verbose=False):
+        number = int(number)
+        if number < 0:
+            raise ValueError("Negative number")
+        print(number * number)
+        if verbose:
+            print("(squared {0})".format(number))
+
+    @cli.command(executor='process')
+    def getpid(name):
+        print('{0} {1}'.format(name, os.getpid()))
+
+    @cli.command
+    def add(a, b):
+        pass
+
+    return cli
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_map_lines(map_script, capsys, jobs):
+    lines = [u'{0}\n'.format(i) for i in range(50)]
+    result = map_script.map_lines(
+        ['square', '--verbose'], lines + [u'\n', u'-3\n', u'4\n'],
+        jobs=jobs, chunk_size=4)
+    out, err = capsys.readouterr()
+
+    expected = ''.join('{0}\n(squared {1})\n'.format(i * i, i)
+                       for i in list(range(50)) + [4])
+    assert out == expected
+    assert not result.success
+    assert result.failed == [(52, '-3', 1)]
+    assert 'Negative number' in err
+    assert 'Map: 52 commands run, 1 failed' in err
+
+
+def test_map_lines_reads_as_needed(map_script, capsys):
+    from clitools.batch import map_lines
+
+    read = []
+
+    def lines():
+        for i in range(10000):
+            read.append(i)
+            yield i + 1, str(i)
+
+    results = map_lines(map_script, ['square'], lines(), jobs=4,
+                        chunk_size=10)
+    assert next(results) == (1, '0', 0)
+    assert len(read) <= 4 * 2 * 10 + 10
+    results.close()
+
+
+def test_map_lines_processes(map_script, capsys):
+    import os
+
+    result = map_script.map_lines(
+        ['getpid'], [u'line {0}\n'.format(i) for i in range(20)], jobs=2)
+    out, err = capsys.readouterr()
+    assert result.success
+
+    lines = [line.rsplit(' ', 1) for line in out.splitlines()]
+    assert [name for name, _ in lines] \
+        == ['line {0}'.format(i) for i in range(20)]
+    assert os.getpid() not in set(int(pid) for _, pid in lines)
+
+
+def test_map_stdin_option(map_script, monkeypatch, capsys):
+    ## Lines looking like options are still taken as values
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(u'2\n--3\n5\n'))
+    with pytest.raises(SystemExit) as excinfo:
+        map_script.run(['--map-stdin', '--jobs', '2', 'square'])
+    assert excinfo.value.code == 1
+    out, err = capsys.readouterr()
+    assert out == '4\n25\n'
+    assert "invalid literal for int() with base 10: '--3'" in err
+
+    with pytest.raises(SystemExit) as excinfo:
+        map_script.run(['--map-stdin', 'add'])
+    assert excinfo.value.code == 2
+    out, err = capsys.readouterr()
+    assert 'needs a command taking a single positional argument' in err
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_run_batch_malformed_line(batch_script, capsys, jobs):
+    lines = ['hello\n', "hello --name 'spam\n", 'hello --name eggs\n']
+    result = batch_script.run_batch(lines, jobs=jobs, ordered=True)
+    out, err = capsys.readouterr()
+    assert out == 'Hello, world!\nHello, eggs!\n'
+    assert 'Batch line 2: No closing quotation\n' in err
+    assert 'Batch line 2: exit status 2\n' in err
+    assert [status for _, _, status in result.statuses] == [0, 2, 0]
+
+    result = batch_script.run_batch(lines, fail_fast=True)
+    out, err = capsys.readouterr()
+    assert out == 'Hello, world!\n'
+    assert [status for _, _, status in result.statuses] == [0, 2]
@@ -0,0 +1,146 @@
+"""
+Tests for the results cache
+"""
+
+import os
+
+import pytest
+
+from clitools import CliApp
+from clitools.cache import CacheEntry, ResultCache
+
+
+@pytest.fixture(params=['eager', 'lazy'])
+def cli(request, tmpdir):
+    cli = CliApp(lazy=(request.param == 'lazy'),
+                 cache_dir=str(tmpdir.join('cache')))
+    cli.calls = []
+
+    @cli.command(cache=True)
+    def square(value=0):
+        cli.calls.append(value)
+        print('Squaring {0}'.format(value))
+        return value * value
+
+    @cli.command(cache=True, cache_ttl=60)
+    def countdown(start=3):
+        cli.calls.append(start)
+        for i in range(start, 0, -1):
+            yield i
+
+    @cli.command
+    def uncached(value=0):
+        cli.calls.append(value)
+        return value
+
+    return cli
+
+
+def test_cached_result(cli, capsys):
+    assert cli.run(['square', '--value', '3']) == 9
+    assert cli.run(['square', '--value', '3']) == 9
+    assert cli.run(['square', '--value', '4']) == 16
+    assert cli.calls == [3, 4]
+
+    out, err = capsys.readouterr()
+    assert out == 'Squaring 3\nSquaring 3\nSquaring 4\n'
+    assert cli.result_cache.hits == 1
+    assert cli.result_cache.misses == 2
+
+    assert cli.run(['uncached', '--value', '3']) == 3
+    assert cli.run(['uncached', '--value', '3']) == 3
+    assert cli.calls == [3, 4, 3, 3]
+
+
+def test_cached_generator(cli, capsys, monkeypatch):
+    import clitools.cache
+
+    assert cli.run(['countdown']) is None
+    assert cli.run(['countdown']) is None
+    assert cli.calls == [3]
+    out, err = capsys.readouterr()
+    assert out == '3\n2\n1\n' * 2
+
+    ## Expired
+    now = clitools.cache.time.time() + 61
+    monkeypatch.setattr(clitools.cache.time, 'time', lambda: now)
+    assert cli.run(['countdown']) is None
+    assert cli.calls == [3, 3]
+
+
+def test_no_cache_and_refresh(cli, capsys):
+    assert cli.run(['--no-cache', 'square', '--value', '2']) == 4
+    assert cli.run(['square', '--value', '2']) == 4
+    assert cli.calls == [2, 2]
+
+    assert cli.run(['--refresh', 'square', '--value', '2']) == 4
+    assert cli.calls == [2, 2, 2]
+    assert cli.run(['square', '--value', '2']) == 4
+    assert cli.calls == [2, 2, 2]
+    assert cli.result_cache.hits == 1
+
+
+def test_lru_eviction(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.set(key, CacheEntry('x' * 300, ''))
+        os.utime(str(tmpdir.join(key + '.pickle')), (i, i))
+    ## Room for 3 entries
+    cache.max_size = tmpdir.join('a.pickle').size() * 3.5
+    assert cache.evictions == 0
+
+    ## Use 'a', so that 'b' is the least recently used
+    assert cache.get('a').result == 'x' * 300
+    cache.set('d', CacheEntry('x' * 300, ''))
+    assert cache.evictions == 1
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+    cache.clear()
+    assert cache.get('d') is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_cache_output_format(cli, capsys):
+    cli.run(['--output-format', 'json', 'square', '--value', '3'])
+    out, err = capsys.readouterr()
+    assert out == 'Squaring 3\n9\n'
+
+    cli.run(['--output-format', 'csv', 'square', '--value', '3'])
+    cli.run(['square', '--value', '3'])
+    out, err = capsys.readouterr()
+    assert out == 'Squaring 3\n9\r\nSquaring 3\n'
+    assert cli.calls == [3, 3, 3]
+
+    cli.run(['--output-format', 'json', 'square', '--value', '3'])
+    out, err = capsys.readouterr()
+    assert out == 'Squaring 3\n9\n'
+    assert cli.calls == [3, 3, 3]
+
+
+def test_cache_invalidated_by_code(tmpdir, monkeypatch, capsys):
+    import sys
+
+    source = tmpdir.join('clitools_cached_cmds.py')
+    source.write('def double(value=0):\n    return value * 2\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.delitem(sys.modules, 'clitools_cached_cmds', raising=False)
+
+    cli = CliApp(cache_dir=str(tmpdir.join('cache')))
+    cli.command('clitools_cached_cmds:double', cache=True)
+    assert cli.run(['double', '--value', '2']) == 4
+    assert cli.run(['double', '--value', '2']) == 4
+    assert (cli.result_cache.hits, cli.result_cache.misses) == (1, 1)
+
+    ## Modified source (the module isn't reloaded here)
+    source.write('def double(value=0):\n    return value * 2  # fixed\n')
+    assert cli.run(['double', '--value', '2']) == 4
+    assert (cli.result_cache.hits, cli.result_cache.misses) == (1, 2)
+
+    ## Changed version
+    cli = CliApp(cache_dir=str(tmpdir.join('cache')))
+    cli.command('clitools_cached_cmds:double', cache=True, cache_version=2)
+    assert cli.run(['double', '--value', '2']) == 4
+    assert (cli.result_cache.hits, cli.result_cache.misses) == (0, 1)
+    sys.modules.pop('clitools_cached_cmds', None)
@@ -0,0 +1,59 @@
+"""
+Tests for per-thread output capture
+"""
+
+from __future__ import print_function
+
+import sys
+import threading
+
+from clitools.capture import ThreadLocalStream, capture_output
+
+
+def test_capture_output(capsys):
+    print('before')
+    with capture_output() as (out, err):
+        assert isinstance(sys.stdout, ThreadLocalStream)
+        print('captured')
+        print('captured error', file=sys.stderr)
+        with capture_output() as (inner_out, inner_err):
+            print('inner')
+        print('captured again')
+    print('after')
+
+    assert not isinstance(sys.stdout, ThreadLocalStream)
+    assert out.getvalue() == 'captured\ncaptured again\n'
+    assert err.getvalue() == 'captured error\n'
+    assert inner_out.getvalue() == 'inner\n'
+
+    stdout, stderr = capsys.readouterr()
+    assert stdout == 'before\nafter\n'
+
+
+def test_capture_output_threads(capsys):
+    results = {}
+    barrier = threading.Event()
+
+    def worker(name):
+        with capture_output() as (out, err):
+            for i in range(100):
+                print('{0}-{1}'.format(name, i))
+                if i == 50:
+                    barrier.wait(1)
+        results[name] = out.getvalue()
+
+    threads = [threading.Thread(target=worker, args=(name,))
+               for name in ('a', 'b', 'c')]
+    for thread in threads:
+        thread.start()
+    print('main thread')
+    barrier.set()
+    for thread in threads:
+        thread.join()
+
+    for name in ('a', 'b', 'c'):
+        assert results[name] == ''.join(
+            '{0}-{1}\n'.format(name, i) for i in range(100))
+
+    stdout, stderr = capsys.readouterr()
+    assert stdout == 'main thread\n'
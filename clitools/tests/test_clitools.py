@@ -12,10 +12,11 @@ import pytest
 from clitools import CliApp
 
 
-@pytest.fixture
-def sample_script():
+@pytest.fixture(params=[{}, {'lazy': True}, {'fast_parse': True}],
+                ids=['eager', 'lazy', 'fast_parse'])
+def sample_script(request):
 
-    cli = CliApp()
+    cli = CliApp(**request.param)
 
     @cli.command
     def hello():
@@ -162,7 +163,7 @@ def test_simple_script_internal(sample_script, args, result, capsys):
     try:
         sample_script.run(args)
 
-    except SystemExit, e:
+    except SystemExit as e:
         ## Record exit code on failure
         return_code = e.code
 
@@ -205,3 +206,22 @@ def test_make_sure_we_clean_default_args(sample_script, capsys):
     cmd_with_explicit_args()
     out, err = capsys.readouterr()
     assert out == 'aaa: spam\nbbb: 100\nccc: example\n'
+
+
+def test_lazy_commands_clean_default_args(capsys):
+    cli = CliApp(lazy=True)
+
+    @cli.command
+    def cmd_with_explicit_args(aaa=cli.arg(default='spam'),
+                               bbb=cli.arg(type=int, default=100)):
+        print('aaa: {0}'.format(aaa))
+        print('bbb: {0}'.format(bbb))
+
+    ## Defaults must be cleaned even before the command gets loaded
+    cmd_with_explicit_args()
+    out, err = capsys.readouterr()
+    assert out == 'aaa: spam\nbbb: 100\n'
+
+    cli.run(['cmd_with_explicit_args', '--bbb', '123'])
+    out, err = capsys.readouterr()
+    assert out == 'aaa: spam\nbbb: 123\n'
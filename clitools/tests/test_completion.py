@@ -0,0 +1,164 @@
+"""
+Tests for the shell completion scripts
+"""
+
+import json
+import os
+import subprocess
+
+import pytest
+
+from clitools import CliApp
+from clitools.completion import build_index, generate_script, load_index
+
+
+@pytest.fixture
+def completion_app():
+    cli = CliApp(prog_name='my-app', lazy=True)
+
+    @cli.command
+    def hello(name='world', bye=False,
+              color=cli.arg(choices=['red', 'green'], default='red')):
+        """
+        Say hello
+
+        :param name: Who to greet
+        """
+
+    @cli.command
+    def cat(path):
+        """Print a file"""
+
+    return cli
+
+
+def test_build_index(completion_app):
+    index = build_index(completion_app)
+    ## Must be serializable
+    index = json.loads(json.dumps(index))
+
+    assert index['prog'] == 'my-app'
+    assert sorted(index['commands']) == ['cat', 'hello']
+    assert index['commands']['hello']['help'] == 'Say hello'
+    assert index['commands']['cat']['positionals'] == 1
+
+    options = dict((o['strings'][-1], o)
+                   for o in index['commands']['hello']['options'])
+    assert options['--name']['takes_value']
+    assert options['--name']['help'] == 'Who to greet'
+    assert not options['--bye']['takes_value']
+    assert options['--color']['choices'] == ['red', 'green']
+
+    global_options = [o['strings'][-1] for o in index['options']]
+    assert '--batch' in global_options
+
+
+def test_completion_command(completion_app, tmpdir, monkeypatch, capsys):
+    from clitools.__main__ import cli as clitools_cli
+    import clitools.tests.test_completion as this_module
+
+    monkeypatch.setattr(this_module, 'app', completion_app, raising=False)
+    index_file = str(tmpdir.join('index.json'))
+
+    clitools_cli.run([
+        'completion', 'fish', '--app', 'clitools.tests.test_completion:app',
+        '--index', index_file])
+    out, err = capsys.readouterr()
+    assert "complete -c 'my-app' -n __fish_use_subcommand -a 'hello'" \
+        " -d 'Say hello'" in out
+    assert load_index(index_file)['prog'] == 'my-app'
+
+    ## The index can be used instead of the app
+    clitools_cli.run(['completion', 'zsh', '--index', index_file,
+                      '--prog', 'other'])
+    out, err = capsys.readouterr()
+    assert "compdef _clitools_other 'other'" in out
+    assert "'hello:Say hello'" in out
+
+
+def _bash_complete(script, words):
+    """Run the completion function in bash, return the completions"""
+    code = '\n'.join([
+        script,
+        'COMP_WORDS=({0})'.format(' '.join(
+            "'{0}'".format(word) for word in words)),
+        'COMP_CWORD={0}'.format(len(words) - 1),
+        '_clitools_my_app',
+        'printf "%s\\n" "${COMPREPLY[@]}"',
+    ])
+    output = subprocess.check_output(['bash', '-c', code])
+    return sorted(output.decode('utf-8').split())
+
+
+@pytest.mark.skipif(not os.path.exists('/bin/bash'), reason='bash needed')
+def test_bash_completion(completion_app, tmpdir):
+    script = generate_script(build_index(completion_app), 'bash')
+
+    assert _bash_complete(script, ['my-app', '']) == ['cat', 'hello']
+    assert _bash_complete(script, ['my-app', 'he']) == ['hello']
+    assert _bash_complete(script, ['my-app', '--ba']) \
+        == ['--batch', '--batch-fail-fast']
+    assert _bash_complete(script, ['my-app', 'hello', '--']) == [
+        '--bye', '--color', '--help', '--name']
+    assert _bash_complete(script, ['my-app', 'hello', '--color', '']) \
+        == ['green', 'red']
+
+    tmpdir.join('spam.txt').write('')
+    with tmpdir.as_cwd():
+        assert _bash_complete(script, ['my-app', 'cat', 'sp']) \
+            == ['spam.txt']
+        assert _bash_complete(script, ['my-app', 'hello', 'sp']) == []
+
+
+@pytest.fixture
+def group_app(completion_app):
+    db = completion_app.group('db', help='Database commands')
+
+    @db.command
+    def migrate(engine=completion_app.arg(choices=['pg', 'sqlite'],
+                                          default='pg')):
+        """Run migrations"""
+
+    users = db.group('users', help='Manage users')
+
+    @users.command
+    def add(name):
+        """Add a user"""
+
+    return completion_app
+
+
+def test_build_index_groups(group_app):
+    index = json.loads(json.dumps(build_index(group_app)))
+    assert index['names'] == ['cat', 'db', 'hello']
+    assert sorted(index['commands']) == [
+        'cat', 'db', 'db migrate', 'db users', 'db users add', 'hello']
+    assert index['commands']['db']['help'] == 'Database commands'
+    assert index['commands']['db']['commands'] == ['migrate', 'users']
+    assert index['commands']['db users']['commands'] == ['add']
+    assert index['commands']['db users add']['help'] == 'Add a user'
+    assert index['commands']['db users add']['positionals'] == 1
+    assert index['commands']['hello']['commands'] == []
+
+    script = generate_script(index, 'fish')
+    assert "complete -c 'my-app' -n '__fish_seen_subcommand_from db;" \
+        " and not __fish_seen_subcommand_from migrate users' -a 'migrate'" \
+        " -d 'Run migrations'" in script
+    script = generate_script(index, 'zsh')
+    assert "commands=('add:Add a user')" in script
+
+
+@pytest.mark.skipif(not os.path.exists('/bin/bash'), reason='bash needed')
+def test_bash_completion_groups(group_app):
+    script = generate_script(build_index(group_app), 'bash')
+
+    assert _bash_complete(script, ['my-app', '']) == ['cat', 'db', 'hello']
+    assert _bash_complete(script, ['my-app', 'db', '']) \
+        == ['migrate', 'users']
+    assert _bash_complete(script, ['my-app', 'db', 'users', '']) == ['add']
+    assert _bash_complete(script, ['my-app', 'db', 'migrate', '--']) \
+        == ['--engine', '--help']
+    assert _bash_complete(script, ['my-app', 'db', 'migrate', '--engine',
+                                   '']) == ['pg', 'sqlite']
+    assert _bash_complete(script, ['my-app', 'hello', '--color', '']) \
+        == ['green', 'red']
@@ -2,6 +2,8 @@
 Unit tests for the internal components
 """
 
+import re
+
 import pytest
 
 from clitools import CliApp
@@ -50,6 +52,8 @@ def generate_analyze_function_params():
         'accepts_varargs': False,
         'accepts_kwargs': False,
         'is_generator': False,
+        'is_coroutine': False,
+        'is_async_generator': False,
         'kwargs_name': None,
         'varargs_name': None,
         'positional_args': [],
@@ -65,6 +69,8 @@ def generate_analyze_function_params():
         'accepts_varargs': False,
         'accepts_kwargs': False,
         'is_generator': False,
+        'is_coroutine': False,
+        'is_async_generator': False,
         'kwargs_name': None,
         'varargs_name': None,
         'positional_args': ['aaa', 'bbb', 'ccc'],
@@ -80,6 +86,8 @@ def generate_analyze_function_params():
         'accepts_varargs': False,
         'accepts_kwargs': False,
         'is_generator': False,
+        'is_coroutine': False,
+        'is_async_generator': False,
         'kwargs_name': None,
         'varargs_name': None,
         'positional_args': ['aaa', 'bbb', 'ccc'],
@@ -95,6 +103,8 @@ def generate_analyze_function_params():
         'accepts_varargs': True,
         'accepts_kwargs': False,
         'is_generator': False,
+        'is_coroutine': False,
+        'is_async_generator': False,
         'kwargs_name': None,
         'varargs_name': 'args',
         'positional_args': ['aa'],
@@ -110,6 +120,8 @@ def generate_analyze_function_params():
         'accepts_varargs': False,
         'accepts_kwargs': False,
         'is_generator': False,
+        'is_coroutine': False,
+        'is_async_generator': False,
         'kwargs_name': None,
         'varargs_name': None,
         'positional_args': [],
@@ -126,6 +138,8 @@ def generate_analyze_function_params():
         'accepts_varargs': True,
         'accepts_kwargs': True,
         'is_generator': False,
+        'is_coroutine': False,
+        'is_async_generator': False,
         'kwargs_name': 'kwargs',
         'varargs_name': 'args',
         'positional_args': ['arg1', 'arg2'],
@@ -144,6 +158,8 @@ def generate_analyze_function_params():
         'accepts_varargs': True,
         'accepts_kwargs': True,
         'is_generator': False,
+        'is_coroutine': False,
+        'is_async_generator': False,
         'kwargs_name': 'kwargs',
         'varargs_name': 'args',
         'positional_args': ['arg1', 'arg2'],
@@ -178,6 +194,89 @@ def test_function_registration():
     assert subparser.get_default('name') == 'world'
 
 
+def test_lazy_registration(monkeypatch):
+    cli = CliApp(lazy=True)
+
+    analyzed = []
+    orig_analyze = cli._analyze_function
+
+    def _analyze_function(func):
+        analyzed.append(func.__name__)
+        return orig_analyze(func)
+
+    monkeypatch.setattr(cli, '_analyze_function', _analyze_function)
+
+    @cli.command
+    def hello(name='world'):
+        """Say hello"""
+        return 'Hello, {0}!'.format(name)
+
+    @cli.command(name='bye')
+    def command_goodbye(name='world'):
+        return 'Bye, {0}!'.format(name)
+
+    assert analyzed == []
+    assert cli._pending_names == ['hello', 'bye']
+
+    assert cli.run(['hello', '--name', 'Python']) == 'Hello, Python!'
+    assert analyzed == ['hello']
+    assert set(cli.subparsers.choices) == set(['hello'])
+
+    ## Listing all the commands only requires stubs
+    with pytest.raises(SystemExit):
+        cli.run(['--help'])
+    assert analyzed == ['hello']
+    assert set(cli.subparsers.choices) == set(['hello', 'bye'])
+
+    ## ..which get completed when the command is run
+    assert cli.run(['bye']) == 'Bye, world!'
+    assert analyzed == ['hello', 'command_goodbye']
+    assert cli._pending == {}
+
+
+def test_register_command_by_path(tmpdir, monkeypatch):
+    import sys
+
+    tmpdir.join('clitools_sample_cmds.py').write(
+        'def command_hello(name="world"):\n'
+        '    """Say hello"""\n'
+        '    return "Hello, {0}!".format(name)\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+
+    cli = CliApp()
+    cli.command('clitools_sample_cmds:command_hello')
+    cli.command('clitools_sample_cmds:command_hello', name='hi',
+                help='Say hi')
+    assert 'clitools_sample_cmds' not in sys.modules
+    assert cli._pending_names == ['hello', 'hi']
+
+    with pytest.raises(SystemExit):
+        cli.run(['--help'])
+    assert 'clitools_sample_cmds' not in sys.modules
+
+    try:
+        assert cli.run(['hello', '--name', 'Python']) == 'Hello, Python!'
+        assert 'clitools_sample_cmds' in sys.modules
+        assert cli._pending_names == ['hi']
+    finally:
+        sys.modules.pop('clitools_sample_cmds', None)
+
+
+def test_register_command_by_invalid_path():
+    cli = CliApp()
+    with pytest.raises(ValueError):
+        cli.command('clitools_sample_cmds.command_hello')
+
+
+def test_find_command_name():
+    cli = CliApp()
+    assert cli._find_command_name([]) is None
+    assert cli._find_command_name(['--help']) is None
+    assert cli._find_command_name(['hello', '--name', 'x']) == 'hello'
+    assert cli._find_command_name(['-h', 'hello']) == 'hello'
+    assert cli._find_command_name(['--', 'hello']) == 'hello'
+
+
 def test_split_function_doc():
     from clitools import split_function_doc, extract_arguments_info
 
@@ -214,3 +313,67 @@ def test_split_function_doc():
             },
         }
     }
+
+
+def _docstring_app():
+    cli = CliApp()
+
+    @cli.command
+    def greet(name, times=None, shout=False):
+        """
+        Greet somebody, 100% politely.
+
+        :param name: Name of the person to greet
+        :param int times: How many times to greet
+        :param shout: Greet loudly
+        """
+        return [name.upper() if shout else name] * (times or 1)
+
+    return cli
+
+
+def test_docstring_help(capsys):
+    cli = _docstring_app()
+    with pytest.raises(SystemExit):
+        cli.run(['greet', '--help'])
+    out, err = capsys.readouterr()
+    assert 'Greet somebody, 100% politely.' in out
+    assert re.search(r'name\s+Name of the person to greet', out)
+    assert re.search(r'--times TIMES\s+How many times to greet', out)
+    assert re.search(r'--shout\s+Greet loudly', out)
+
+    with pytest.raises(SystemExit):
+        cli.run(['--help'])
+    out, err = capsys.readouterr()
+    assert re.search(r'greet\s+Greet somebody, 100% politely.\n', out)
+    assert ':param' not in out
+
+
+def test_docstring_types():
+    cli = _docstring_app()
+    assert cli.run(['greet', 'spam', '--times', '2']) == ['spam', 'spam']
+    assert cli.run(['greet', 'spam', '--shout']) == ['SPAM']
+
+
+def test_docstring_parsed_lazily(monkeypatch):
+    import clitools
+
+    parsed = []
+    orig_parse = clitools._parse_arguments_info
+
+    def _parse_arguments_info(doc):
+        parsed.append(doc)
+        return orig_parse(doc)
+
+    monkeypatch.setattr(clitools, '_arguments_info_cache', {})
+    monkeypatch.setattr(
+        clitools, '_parse_arguments_info', _parse_arguments_info)
+
+    cli = _docstring_app()
+    assert cli.run(['greet', 'spam', '--shout']) == ['SPAM']
+    assert parsed == []
+
+    ## Needed to convert the value, then memoized
+    assert cli.run(['greet', 'spam', '--times', '2']) == ['spam', 'spam']
+    assert cli.run(['greet', 'eggs', '--times', '2']) == ['eggs', 'eggs']
+    assert len(parsed) == 1
@@ -0,0 +1,167 @@
+"""
+Tests for mapping commands over list arguments
+"""
+
+import threading
+import time
+
+import pytest
+
+from clitools import CliApp
+from clitools.fanout import TokenBucket, map_items
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(10, burst=3, clock=clock, sleep=clock.sleep)
+
+    ## Bursts are allowed, then calls are spaced out
+    waits = [bucket.acquire() for _ in range(5)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(0.1)
+    assert waits[4] == pytest.approx(0.1)
+    assert clock.now == pytest.approx(0.2)
+
+    ## Tokens are refilled over time, up to the burst size
+    clock.now += 10
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() == pytest.approx(0.1)
+
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_map_items_concurrency():
+    lock = threading.Lock()
+    running = [0]
+    max_running = [0]
+
+    def func(item):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        if item == 3:
+            raise ValueError('Bad item')
+        return item * 2
+
+    outcomes = list(map_items(func, range(20), jobs=4, ordered=True))
+    assert max_running[0] == 4
+    assert [o.index for o in outcomes] == list(range(20))
+    assert [o.result for o in outcomes if not o.failed] \
+        == [i * 2 for i in range(20) if i != 3]
+    failed = [o for o in outcomes if o.failed]
+    assert [o.item for o in failed] == [3]
+    assert isinstance(failed[0].error, ValueError)
+    assert 'Bad item' in failed[0].traceback
+
+
+def test_map_items_as_completed():
+    def func(item):
+        time.sleep(item)
+        return item
+
+    results = [o.result for o in map_items(func, [0.2, 0.1, 0], jobs=3)]
+    assert results == [0, 0.1, 0.2]
+
+
+@pytest.fixture
+def cli():
+    cli = CliApp()
+    cli.calls = []
+
+    @cli.command(map_over='hosts', map_ordered=True)
+    def ping(hosts=[str], count=1):
+        cli.calls.append(hosts)
+        if hosts == 'down':
+            raise IOError('Host is down')
+        return '{0}: {1} ok'.format(hosts, count)
+
+    @cli.command(map_over='names', map_jobs=2)
+    def greet(names, greeting='Hello'):
+        yield '{0}, {1}!'.format(greeting, names)
+
+    return cli
+
+
+def test_map_over_option(cli, capsys):
+    assert cli.run(['ping', '--hosts', 'a', '--hosts', 'b',
+                    '--hosts', 'c', '--count', '3']) is None
+    out, err = capsys.readouterr()
+    assert out == 'a: 3 ok\nb: 3 ok\nc: 3 ok\n'
+    assert sorted(cli.calls) == ['a', 'b', 'c']
+
+    cli.run(['ping'])
+    out, err = capsys.readouterr()
+    assert out == ''
+
+
+def test_map_over_positional(cli, capsys):
+    cli.run(['greet', 'Alice', 'Bob', '--greeting', 'Hi'])
+    out, err = capsys.readouterr()
+    assert sorted(out.splitlines()) == ['Hi, Alice!', 'Hi, Bob!']
+
+
+def test_map_errors(cli, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        cli.run(['ping', '--hosts', 'a', '--hosts', 'down',
+                 '--hosts', 'c'])
+    assert excinfo.value.code == '1 of 3 calls failed'
+    out, err = capsys.readouterr()
+    assert out == 'a: 1 ok\nc: 1 ok\n'
+    assert "Failed for 'down'" in err
+    assert 'Host is down' in err
+
+
+def test_map_rate(cli, capsys):
+    start = time.time()
+    cli.run(['--map-rate', '20', '--map-jobs', '1', 'ping',
+             '--hosts', 'a', '--hosts', 'b', '--hosts', 'c'])
+    assert time.time() - start >= 0.09
+    out, err = capsys.readouterr()
+    assert out == 'a: 1 ok\nb: 1 ok\nc: 1 ok\n'
+
+
+def test_map_over_unknown_argument():
+    cli = CliApp()
+    with pytest.raises(ValueError):
+        @cli.command(map_over='hosts')
+        def ping(host):
+            pass
+
+
+@pytest.mark.parametrize('options', [
+    {'map_jobs': 0}, {'map_rate': 0}, {'map_rate': -1}, {'map_burst': 0}])
+def test_map_invalid_settings(options):
+    cli = CliApp()
+    with pytest.raises(ValueError):
+        @cli.command(map_over='hosts', **options)
+        def ping(hosts=[str]):
+            pass
+
+
+@pytest.mark.parametrize('args, message', [
+    (['--map-jobs', '0'], 'Number of jobs must be at least 1, got 0'),
+    (['--map-rate', '-1'], 'Rate must be positive, got -1.0'),
+])
+def test_map_invalid_options(cli, capsys, args, message):
+    with pytest.raises(SystemExit) as excinfo:
+        cli.run(args + ['ping', '--hosts', 'a'])
+    assert excinfo.value.code == 2
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert message in err
+    assert cli.calls == []
@@ -0,0 +1,110 @@
+"""
+Make sure the fast-path parser gives the same results as argparse
+"""
+
+import pytest
+
+from clitools import CliApp
+from clitools.fastparse import compile_parser
+
+
+@pytest.fixture(scope='module')
+def cli():
+    cli = CliApp(fast_parse=True)
+
+    @cli.command
+    def no_args():
+        pass
+
+    @cli.command
+    def positionals(aaa, bbb):
+        pass
+
+    @cli.command
+    def options(arg1, kw1='val1', kw2=123, kw3=False, kw4=True, kw5=None,
+                kw6=float, kw7=1.5):
+        pass
+
+    @cli.command
+    def explicit_args(aaa=cli.arg(default='spam'),
+                      bbb=cli.arg(type=int, default=100),
+                      ccc=cli.arg('-c', default='ccc')):
+        pass
+
+    @cli.command
+    def with_list(name=[str]):
+        pass
+
+    @cli.command
+    def with_choices(color=cli.arg(choices=['red', 'green'])):
+        pass
+
+    return cli
+
+
+@pytest.mark.parametrize('name,supported', [
+    ('no_args', True),
+    ('positionals', True),
+    ('options', True),
+    ('explicit_args', True),
+    ('with_list', False),
+    ('with_choices', False),
+])
+def test_compile_parser(cli, name, supported):
+    fast_parser = compile_parser(cli.subparsers.choices[name])
+    assert (fast_parser is not None) == supported
+
+
+@pytest.mark.parametrize('args,fast', [
+    (['no_args'], True),
+    (['no_args', 'garbage'], False),
+    (['no_args', '--garbage'], False),
+    (['no_args', '--help'], False),
+    (['no_args', '-h'], False),
+
+    (['positionals', 'a', 'b'], True),
+    (['positionals', '-', ''], True),
+    (['positionals', 'a'], False),
+    (['positionals', 'a', 'b', 'c'], False),
+    (['positionals', 'a', '--', 'b'], False),
+    (['positionals', '-1', 'b'], False),
+
+    (['options', 'hello'], True),
+    (['options', 'hello', '--kw1', 'spam'], True),
+    (['options', 'hello', '--kw1=spam'], True),
+    (['options', 'hello', '--kw1='], True),
+    (['options', '--kw1', 'spam', 'hello'], True),
+    (['options', 'hello', '--kw1', 'spam', '--kw1', 'eggs'], True),
+    (['options', 'hello', '--kw2', '42'], True),
+    (['options', 'hello', '--kw2=42', '--kw3', '--kw4'], True),
+    (['options', 'hello', '--kw5', 'x', '--kw6', '2', '--kw7', '3'], True),
+    (['options', 'hello', '--kw2', 'not-an-int'], False),
+    (['options', 'hello', '--kw2', '-1'], False),
+    (['options', 'hello', '--kw2'], False),
+    (['options', 'hello', '--kw3=yes'], False),
+    (['options', 'hello', '--kw', 'abbrev'], False),
+    (['options', 'hello', '--kw1', '--kw3'], False),
+    (['options'], False),
+
+    (['explicit_args'], True),
+    (['explicit_args', '--aaa=AAA', '--bbb', '123', '-c', 'foo'], True),
+    (['explicit_args', '--bbb', 'not-an-int'], False),
+    (['explicit_args', '-cfoo'], False),
+
+    (['with_list', '--name', 'spam'], False),
+    (['with_choices', '--color', 'red'], False),
+    (['non_existent_command'], False),
+    (['--help'], False),
+    ([], False),
+])
+def test_fast_parse_equivalence(cli, args, fast):
+    fast_parsed = cli._fast_parse_args(args)
+    assert (fast_parsed is not None) == fast
+
+    try:
+        parsed = cli.parser.parse_args(args)
+    except SystemExit:
+        assert fast_parsed is None
+    else:
+        if fast_parsed is not None:
+            assert vars(fast_parsed) == vars(parsed)
@@ -0,0 +1,111 @@
+"""
+Tests for file arguments
+"""
+
+import mmap
+
+import pytest
+
+from clitools import CliApp
+from clitools.files import InputFile, iter_chunks
+
+
+@pytest.fixture(params=['eager', 'lazy'])
+def cli(request):
+    cli = CliApp(lazy=(request.param == 'lazy'))
+    ## Opened files passed to commands, to check they get closed
+    cli.seen = []
+
+    @cli.command
+    def head(data=InputFile, size=5):
+        cli.seen.append(data)
+        return data.read(size)
+
+    @cli.command
+    def count(path, lines=[InputFile]):
+        """
+        Count lines in files
+
+        :type path: file
+        """
+        cli.seen.append(path)
+        yield path.read(100).count(b'\n')
+        for data in lines:
+            cli.seen.append(data)
+            yield data.read(100).count(b'\n')
+
+    return cli
+
+
+def _is_closed(data):
+    if isinstance(data, mmap.mmap):
+        try:
+            data[:1]
+        except ValueError:
+            return True
+        return False
+    return data.closed
+
+
+def test_mapped_file(cli, tmpdir):
+    path = tmpdir.join('data.txt')
+    path.write('hello, world\n')
+
+    assert cli.run(['head', '--data', str(path)]) == b'hello'
+    assert cli.run(['head', '--data', str(path), '--size', '20']) \
+        == b'hello, world\n'
+
+    assert len(cli.seen) == 2
+    for data in cli.seen:
+        assert isinstance(data, mmap.mmap)
+        assert _is_closed(data)
+
+
+def test_empty_and_stdin(cli, tmpdir, monkeypatch):
+    path = tmpdir.join('empty.txt')
+    path.write('')
+    assert cli.run(['head', '--data', str(path)]) == b''
+    assert not isinstance(cli.seen[0], mmap.mmap)
+    assert _is_closed(cli.seen[0])
+
+    path = tmpdir.join('stdin.txt')
+    path.write('from stdin\n')
+    with path.open('rb') as stdin:
+        monkeypatch.setattr('sys.stdin', stdin)
+        assert cli.run(['head', '--data', '-']) == b'from '
+        assert not stdin.closed
+
+
+def test_docstring_type_and_lists(cli, tmpdir, capsys):
+    tmpdir.join('a.txt').write('1\n2\n3\n')
+    tmpdir.join('b.txt').write('1\n')
+    with tmpdir.as_cwd():
+        assert cli.run(['count', 'a.txt', '--lines', 'b.txt',
+                        '--lines', 'a.txt']) is None
+    out, err = capsys.readouterr()
+    assert out == '3\n1\n3\n'
+    assert len(cli.seen) == 3
+    assert all(_is_closed(data) for data in cli.seen)
+
+
+def test_missing_file(cli, tmpdir, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        cli.run(['count', str(tmpdir.join('missing.txt'))])
+    assert excinfo.value.code == 2
+    out, err = capsys.readouterr()
+    assert "can't open" in err
+    assert cli.seen == []
+
+
+def test_iter_chunks(tmpdir):
+    path = tmpdir.join('data.txt')
+    path.write('0123456789')
+
+    data = InputFile(str(path)).open()
+    assert isinstance(data, mmap.mmap)
+    chunks = [bytes(chunk) for chunk in iter_chunks(data, size=4)]
+    assert chunks == [b'0123', b'4567', b'89']
+    data.close()
+
+    with path.open('rb') as fp:
+        assert list(iter_chunks(fp, size=4)) == [b'0123', b'4567', b'89']
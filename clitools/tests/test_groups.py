@@ -0,0 +1,118 @@
+"""
+Tests for groups of commands
+"""
+
+import sys
+
+import pytest
+
+from clitools import CliApp, CommandGroup
+
+
+SAMPLE_MODULE = '''
+from clitools import CommandGroup
+
+remote = CommandGroup(help='Manage remotes')
+
+
+@remote.command
+def add(name, url=None):
+    """Add a remote"""
+    return 'Added {0}'.format(name)
+
+
+branch = remote.group('branch', help='Manage remote branches')
+
+
+@branch.command
+def delete(name):
+    return 'Deleted {0}'.format(name)
+'''
+
+
+@pytest.fixture
+def sample_module(tmpdir, monkeypatch):
+    source = tmpdir.join('clitools_group_cmds.py')
+    source.write(SAMPLE_MODULE)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    yield source
+    sys.modules.pop('clitools_group_cmds', None)
+
+
+@pytest.fixture(params=['eager', 'lazy'])
+def cli(request, sample_module):
+    cli = CliApp(prog_name='vcs', lazy=(request.param == 'lazy'))
+
+    @cli.command
+    def status():
+        return 'Clean'
+
+    db = cli.group('db', help='Database commands')
+
+    @db.command
+    def migrate(version=0):
+        return 'Migrated to {0}'.format(version)
+
+    @db.command(name='reset')
+    def db_reset(force=False):
+        return 'Reset' if force else 'Not reset'
+
+    cli.group('remote', 'clitools_group_cmds:remote')
+    return cli
+
+
+def test_run_group_commands(cli):
+    assert cli.run(['status']) == 'Clean'
+    assert cli.run(['db', 'migrate', '--version', '3']) == 'Migrated to 3'
+    assert cli.run(['db', 'reset', '--force']) == 'Reset'
+    assert cli.run(['remote', 'add', 'origin']) == 'Added origin'
+    assert cli.run(['remote', 'branch', 'delete', 'spam']) \
+        == 'Deleted spam'
+
+
+def test_groups_loaded_lazily(cli):
+    db = cli._groups['db']['group']
+
+    assert cli.run(['status']) == 'Clean'
+    assert db.parser is None
+    assert 'clitools_group_cmds' not in sys.modules
+
+    assert cli.run(['db', 'migrate']) == 'Migrated to 0'
+    assert sorted(db._commands) == ['migrate']
+    assert 'reset' in db._pending
+    assert 'clitools_group_cmds' not in sys.modules
+    assert 'db' in cli._load_times
+
+
+def test_group_help(cli, capsys):
+    with pytest.raises(SystemExit):
+        cli.run(['--help'])
+    out, err = capsys.readouterr()
+    assert 'Database commands' in out
+    assert 'remote' in out
+    assert 'clitools_group_cmds' not in sys.modules
+
+    with pytest.raises(SystemExit):
+        cli.run(['remote', '--help'])
+    out, err = capsys.readouterr()
+    assert 'Manage remotes' in out
+    assert 'Add a remote' in out
+    assert 'branch' in out
+
+
+def test_load_all_commands(cli):
+    cli._load_all_commands()
+    names = sorted(command.name for command in cli._iter_commands())
+    assert names == ['db migrate', 'db reset', 'remote add',
+                     'remote branch delete', 'status']
+
+
+def test_standalone_group():
+    group = CommandGroup()
+
+    @group.command
+    def hello():
+        return 'Hello'
+
+    assert hello() == 'Hello'
+    assert group._pending_names == ['hello']
@@ -0,0 +1,143 @@
+"""
+Tests for running commands from Python, with CliApp.invoke()
+"""
+
+from __future__ import print_function
+
+import sys
+import threading
+import time
+
+import pytest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from clitools import CliApp
+
+
+@pytest.fixture(params=['eager', 'lazy'])
+def cli(request):
+    cli = CliApp(lazy=(request.param == 'lazy'))
+
+    @cli.command
+    def hello(name='world', delay=0.0):
+        time.sleep(delay)
+        print('Hello, {0}!'.format(name))
+        return name
+
+    @cli.command
+    def fail(code=1):
+        print('Failing', file=sys.stderr)
+        sys.exit(code)
+
+    @cli.command
+    def crash():
+        raise ValueError('Something went wrong')
+
+    @cli.command
+    def numbers(count=3):
+        for i in range(count):
+            yield {'n': i}
+
+    return cli
+
+
+def test_invoke(cli, capsys):
+    result = cli.invoke(['hello', '--name', 'Python'])
+    assert result.success
+    assert result.exit_code == 0
+    assert result.return_value == 'Python'
+    assert result.stdout == 'Hello, Python!\n'
+    assert result.stderr == ''
+    assert result.exception is None
+    assert result.duration >= 0
+
+    result = cli.invoke(['fail', '--code', '3'])
+    assert result.exit_code == 3
+    assert result.stderr == 'Failing\n'
+
+    result = cli.invoke(['crash'])
+    assert result.exit_code == 1
+    assert isinstance(result.exception, ValueError)
+    assert result.exc_info[0] is ValueError
+
+    ## Parsing errors and missing commands
+    result = cli.invoke(['hello', '--garbage'])
+    assert result.exit_code == 2
+    assert 'unrecognized arguments: --garbage' in result.stderr
+    result = cli.invoke(['--output-format', 'jsonl'])
+    assert result.exit_code == 2
+
+    ## Nothing was written out
+    out, err = capsys.readouterr()
+    assert out == err == ''
+
+
+def test_invoke_streams(cli):
+    out, err = StringIO(), StringIO()
+    result = cli.invoke(['hello'], stdout=out, stderr=err)
+    assert result.stdout is None
+    assert out.getvalue() == 'Hello, world!\n'
+
+
+def test_invoke_concurrently(cli):
+    results = {}
+
+    def run(i):
+        args = ['hello', '--name', str(i), '--delay', '0.01']
+        if i % 2:
+            args = ['--output-format', 'jsonl', 'numbers', '--count', str(i)]
+        results[i] = cli.invoke(args)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i in range(20):
+        if i % 2:
+            assert results[i].stdout == ''.join(
+                '{{"n":{0}}}\n'.format(n) for n in range(i))
+        else:
+            assert results[i].stdout == 'Hello, {0}!\n'.format(i)
+            assert results[i].return_value == str(i)
+
+
+def test_invoke_mapped_output(cli):
+    @cli.command(map_over='names', map_ordered=True)
+    def shout(names=[str]):
+        print('Shouting {0}'.format(names))
+        return names.upper()
+
+    result = cli.invoke(['shout', '--names', 'a', '--names', 'b'])
+    assert result.exit_code == 0
+    assert sorted(result.stdout.splitlines()) \
+        == ['A', 'B', 'Shouting a', 'Shouting b']
+
+
+def test_invoke_batches_concurrently(cli, tmpdir):
+    batch = tmpdir.join('batch.txt')
+    batch.write('hello --name a\nhello --name b\n')
+    results = {}
+
+    def run(i):
+        args = ['--jobs', '2', '--ordered', '--batch', str(batch)]
+        if i % 2:
+            args = ['--output-format', 'json'] + args
+        results[i] = cli.invoke(args)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i in range(10):
+        if i % 2:
+            assert results[i].stdout == 'Hello, a!\n"a"\nHello, b!\n"b"\n'
+        else:
+            assert results[i].stdout == 'Hello, a!\nHello, b!\n'
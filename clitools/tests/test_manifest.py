@@ -0,0 +1,117 @@
+"""
+Tests for the commands manifest cache
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+from clitools import CliApp
+
+
+SAMPLE_MODULE = '''
+def hello(name='world', bye=False):
+    """Say hello"""
+    greet = 'Bye' if bye else 'Hello'
+    return '{0}, {1}!'.format(greet, name)
+'''
+
+
+@pytest.fixture
+def sample_module(tmpdir, monkeypatch):
+    source = tmpdir.join('clitools_manifest_cmds.py')
+    source.write(SAMPLE_MODULE)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    yield source
+    sys.modules.pop('clitools_manifest_cmds', None)
+
+
+def _make_app(manifest_path, monkeypatch, lazy=False):
+    from clitools_manifest_cmds import hello
+
+    cli = CliApp(manifest=manifest_path, lazy=lazy)
+    analyzed = []
+    orig_analyze = cli._analyze_function
+
+    def _analyze_function(func):
+        analyzed.append(func.__name__)
+        return orig_analyze(func)
+
+    monkeypatch.setattr(cli, '_analyze_function', _analyze_function)
+    cli.command(hello)
+    return cli, analyzed
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_manifest_is_reused(sample_module, tmpdir, monkeypatch, lazy):
+    manifest_path = str(tmpdir.join('manifest.json'))
+
+    cli, analyzed = _make_app(manifest_path, monkeypatch, lazy=lazy)
+    assert cli.run(['hello', '--bye']) == 'Bye, world!'
+    assert analyzed == ['hello']
+    assert os.path.exists(manifest_path)
+
+    ## Reload the module, to get a pristine function
+    sys.modules.pop('clitools_manifest_cmds')
+    cli, analyzed = _make_app(manifest_path, monkeypatch, lazy=lazy)
+    assert cli.run(['hello', '--name', 'Python']) == 'Hello, Python!'
+    assert analyzed == []
+
+
+def test_manifest_is_invalidated(sample_module, tmpdir, monkeypatch):
+    manifest_path = str(tmpdir.join('manifest.json'))
+
+    cli, analyzed = _make_app(manifest_path, monkeypatch)
+    cli.run(['hello'])
+    assert analyzed == ['hello']
+
+    sys.modules.pop('clitools_manifest_cmds')
+    sample_module.write(SAMPLE_MODULE + '\n# changed\n')
+
+    cli, analyzed = _make_app(manifest_path, monkeypatch)
+    assert cli.run(['hello']) == 'Hello, world!'
+    assert analyzed == ['hello']
+
+
+def test_manifest_help_for_command_paths(sample_module, tmpdir):
+    manifest_path = str(tmpdir.join('manifest.json'))
+
+    cli = CliApp(manifest=manifest_path)
+    cli.command('clitools_manifest_cmds:hello')
+    cli.build_manifest()
+
+    with open(manifest_path) as fp:
+        data = json.load(fp)
+    assert data['version'] == 2
+    assert list(data['modules']) == [str(sample_module)]
+
+    sys.modules.pop('clitools_manifest_cmds')
+    cli = CliApp(manifest=manifest_path)
+    cli.command('clitools_manifest_cmds:hello')
+    cli._load_commands(['--help'])
+    assert 'clitools_manifest_cmds' not in sys.modules
+    assert cli._stubs['hello'].prog == 'cli-app hello'
+    help_text = cli.parser.format_help()
+    assert 'Say hello' in help_text
+
+
+def test_build_manifest_command(sample_module, tmpdir, monkeypatch, capsys):
+    from clitools.__main__ import cli as clitools_cli
+
+    sample_module.write(
+        SAMPLE_MODULE + '\nfrom clitools import CliApp\n'
+        'cli = CliApp()\ncli.command(hello)\n')
+    manifest_path = str(tmpdir.join('manifest.json'))
+
+    clitools_cli.run(['build-manifest', 'clitools_manifest_cmds:cli',
+                      '--manifest', manifest_path])
+    out, err = capsys.readouterr()
+    assert out == 'Manifest written to {0}\n'.format(manifest_path)
+
+    with open(manifest_path) as fp:
+        data = json.load(fp)
+    commands = data['modules'][str(sample_module)]['commands']
+    assert len(commands) == 1
+    assert list(commands.values())[0]['keyword_args'] == ['name', 'bye']
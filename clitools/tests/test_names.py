@@ -0,0 +1,106 @@
+"""
+Tests for the resolution of command names
+"""
+
+import pytest
+
+from clitools import CliApp
+from clitools.trie import Trie
+
+
+def test_trie_prefix():
+    trie = Trie(['start', 'status', 'stop', 'restart'])
+    assert trie.size == 4
+    assert 'stop' in trie
+    assert 'sto' not in trie
+    assert trie.with_prefix('st') == ['start', 'status', 'stop']
+    assert trie.with_prefix('stat') == ['status']
+    assert trie.with_prefix('x') == []
+
+
+def test_trie_suggest():
+    words = ['start', 'status', 'stop', 'restart', 'list', 'lint']
+    ## Padding, which must not affect the results
+    words += ['command{0}'.format(i) for i in range(1000)]
+    trie = Trie(words)
+
+    assert trie.suggest('stauts') == ['status']  # transposition
+    assert trie.suggest('stp') == ['stop']  # insertion
+    assert trie.suggest('sttop') == ['stop']  # deletion
+    assert trie.suggest('lisst', max_distance=1) == ['list']
+    assert trie.suggest('lijt') == ['lint', 'list']
+    assert trie.suggest('xyzzy') == []
+    assert trie.suggest('command12x', limit=1) == ['command12']
+
+
+@pytest.fixture(params=['eager', 'lazy'])
+def cli(request):
+    cli = CliApp(lazy=(request.param == 'lazy'))
+
+    @cli.command
+    def start():
+        return 'Started'
+
+    @cli.command
+    def status():
+        return 'Running'
+
+    @cli.command
+    def restart():
+        return 'Restarted'
+
+    db = cli.group('db')
+
+    @db.command
+    def migrate():
+        return 'Migrated'
+
+    @db.command
+    def merge():
+        return 'Merged'
+
+    return cli
+
+
+def test_suggestions(cli, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        cli.run(['stauts'])
+    assert excinfo.value.code == 2
+    out, err = capsys.readouterr()
+    assert "invalid command 'stauts': did you mean 'status'?" in err
+
+    with pytest.raises(SystemExit):
+        cli.run(['db', 'migrte'])
+    out, err = capsys.readouterr()
+    assert "did you mean 'migrate'?" in err
+    assert 'usage: cli-app db' in err
+
+    ## Nothing near enough: argparse reports the error as usual
+    with pytest.raises(SystemExit):
+        cli.run(['xyzzy'])
+    out, err = capsys.readouterr()
+    assert 'did you mean' not in err
+    assert 'invalid choice' in err
+
+    ## Abbreviations are disabled by default
+    with pytest.raises(SystemExit):
+        cli.run(['resta'])
+    out, err = capsys.readouterr()
+    assert "did you mean 'restart'?" in err
+
+
+def test_abbreviations(cli, capsys):
+    cli.abbreviations = True
+    assert cli.run(['resta']) == 'Restarted'
+    assert cli.run(['stat']) == 'Running'
+    assert cli.run(['d', 'mi']) == 'Migrated'
+
+    with pytest.raises(SystemExit):
+        cli.run(['sta'])
+    out, err = capsys.readouterr()
+    assert "ambiguous command 'sta': could be start, status" in err
+
+    with pytest.raises(SystemExit):
+        cli.run(['db', 'm'])
+    out, err = capsys.readouterr()
+    assert "ambiguous command 'm': could be merge, migrate" in err
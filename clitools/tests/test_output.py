@@ -0,0 +1,226 @@
+"""
+Tests for the output of command results
+"""
+
+import errno
+import json
+import struct
+from collections import OrderedDict
+
+import pytest
+
+from clitools import CliApp
+from clitools.output import (
+    ENCODERS, Encoder, StreamWriter, get_encoder, stream_output)
+
+
+class FakeStream(object):
+    """Stream recording each write, optionally breaking after a while"""
+
+    def __init__(self, max_writes=None):
+        self.writes = []
+        self.flushes = 0
+        self.max_writes = max_writes
+
+    def write(self, data):
+        if self.max_writes is not None \
+                and len(self.writes) >= self.max_writes:
+            raise IOError(errno.EPIPE, 'Broken pipe')
+        self.writes.append(data)
+
+    def flush(self):
+        self.flushes += 1
+
+
+def test_stream_writer_flush_every():
+    stream = FakeStream()
+    writer = StreamWriter(stream, flush_every=3)
+    for i in range(7):
+        writer.write('{0}\n'.format(i))
+    assert stream.writes == ['0\n1\n2\n', '3\n4\n5\n']
+    writer.flush()
+    assert stream.writes[-1] == '6\n'
+
+
+def test_stream_writer_buffer_size():
+    stream = FakeStream()
+    writer = StreamWriter(stream, flush_every=None, buffer_size=4)
+    for i in range(5):
+        writer.write('{0}\n'.format(i))
+    assert stream.writes == ['0\n1\n', '2\n3\n']
+
+
+def test_stream_writer_flush_interval(monkeypatch):
+    import clitools.output
+
+    now = [1000.0]
+    monkeypatch.setattr(clitools.output.time, 'time', lambda: now[0])
+
+    stream = FakeStream()
+    writer = StreamWriter(stream, flush_every=None, flush_interval=5)
+    writer.write('a\n')
+    now[0] += 1
+    writer.write('b\n')
+    assert stream.writes == []
+    now[0] += 4
+    writer.write('c\n')
+    assert stream.writes == ['a\nb\nc\n']
+
+
+@pytest.mark.parametrize('fmt,expected', [
+    ('lines', '1\nspam\n[1, 2]\n'),
+    ('jsonl', '1\n"spam"\n[1, 2]\n'),
+])
+def test_stream_output_formats(fmt, expected):
+    stream = FakeStream()
+    count = stream_output(iter([1, 'spam', [1, 2]]), stream, format=fmt)
+    assert count == 3
+    assert ''.join(stream.writes) == expected
+
+
+def test_stream_output_closed():
+    state = {'produced': 0, 'closed': False}
+
+    def gen():
+        try:
+            while True:
+                state['produced'] += 1
+                yield state['produced']
+        finally:
+            state['closed'] = True
+
+    stream = FakeStream(max_writes=2)
+    assert stream_output(gen(), stream) == 2
+    assert stream.writes == ['1\n', '2\n']
+    assert state == {'produced': 3, 'closed': True}
+
+
+def test_stream_output_generator_failure():
+    def gen():
+        yield 'one'
+        yield 'two'
+        raise ValueError('Something went wrong')
+
+    stream = FakeStream()
+    with pytest.raises(ValueError):
+        stream_output(gen(), stream, flush_every=10)
+    assert stream.writes == ['one\ntwo\n']
+
+
+def test_generator_command(capsys):
+    cli = CliApp()
+
+    @cli.command
+    def count(limit=3):
+        for i in range(limit):
+            yield {'value': i}
+
+    @cli.command(stream_format='jsonl')
+    def count_json(limit=3):
+        for i in range(limit):
+            yield {'value': i}
+
+    assert cli.run(['count_json', '--limit', '2']) is None
+    out, err = capsys.readouterr()
+    assert out == '{"value": 0}\n{"value": 1}\n'
+
+    cli.run(['count', '--limit', '1'])
+    out, err = capsys.readouterr()
+    assert out == "{'value': 0}\n"
+
+
+@pytest.mark.parametrize('fmt,expected', [
+    ('lines', '1\nspam\n[1, 2]\n'),
+    ('jsonl', '1\n"spam"\n[1,2]\n'),
+    ('json', '[1,\n"spam",\n[1,2]]\n'),
+    ('csv', '1\r\nspam\r\n1,2\r\n'),
+    ('tsv', '1\r\nspam\r\n1\t2\r\n'),
+])
+def test_stream_output_encoders(fmt, expected):
+    stream = FakeStream()
+    count = stream_output(iter([1, 'spam', [1, 2]]), stream,
+                          encoder=get_encoder(fmt))
+    assert count == 3
+    assert ''.join(stream.writes) == expected
+
+
+def test_csv_encoder():
+    encoder = get_encoder('csv')
+    assert encoder.encode_value([
+        OrderedDict([('name', 'spam'), ('count', 1)]),
+        {'name': 'eggs, bacon'},
+    ]) == b'name,count\r\nspam,1\r\n"eggs, bacon",\r\n'
+
+
+def test_msgpack_encoder():
+    msgpack = pytest.importorskip('msgpack')
+    data = get_encoder('msgpack').encode_value({'spam': [1, 2]})
+    assert msgpack.unpackb(data, raw=False) == {'spam': [1, 2]}
+
+
+def test_unsupported_encoder():
+    with pytest.raises(ValueError):
+        get_encoder('yaml')
+
+
+def test_output_format_option(capsys):
+    cli = CliApp()
+
+    @cli.command
+    def info(name='spam'):
+        return {'name': name, 'size': 3}
+
+    @cli.command
+    def count(limit=3):
+        for i in range(limit):
+            yield {'value': i}
+
+    assert cli.run(['--output-format', 'json', 'info']) \
+        == {'name': 'spam', 'size': 3}
+    out, err = capsys.readouterr()
+    assert json.loads(out) == {'name': 'spam', 'size': 3}
+
+    ## Without the option, return values are not written
+    cli.run(['info'])
+    out, err = capsys.readouterr()
+    assert out == ''
+
+    assert cli.run(['--output-format', 'jsonl', 'count']) is None
+    out, err = capsys.readouterr()
+    assert out == '{"value":0}\n{"value":1}\n{"value":2}\n'
+
+    with pytest.raises(SystemExit):
+        cli.run(['--output-format', 'yaml', 'info'])
+    out, err = capsys.readouterr()
+    assert 'Unsupported output format: yaml' in err
+
+
+class _BinaryEncoder(Encoder):
+    """Stand-in for binary formats, as msgpack"""
+
+    def encode_item(self, item):
+        return b'\xff' + struct.pack('!I', item)
+
+
+def test_binary_output_captured(monkeypatch, tmpdir, capsys):
+    monkeypatch.setitem(ENCODERS, 'binary', _BinaryEncoder)
+    cli = CliApp(cache_dir=str(tmpdir))
+
+    @cli.command(cache=True)
+    def value(number=1):
+        return number
+
+    expected = b'\xff\x00\x00\x00\x05'
+    for _ in range(2):  # the second time, from the cache
+        result = cli.invoke(['--output-format', 'binary', 'value',
+                             '--number', '5'])
+        assert result.exit_code == 0
+        assert result.stdout_bytes == expected
+
+    ## Captured output of concurrent batch commands
+    batch_file = tmpdir.join('batch.txt')
+    batch_file.write('value --number 5\nvalue --number 6\n')
+    result = cli.invoke(['--output-format', 'binary', '--jobs', '2',
+                         '--ordered', '--batch', str(batch_file)])
+    assert result.exit_code == 0
+    assert result.stdout_bytes == expected + b'\xff\x00\x00\x00\x06'
@@ -0,0 +1,99 @@
+"""
+Tests for in-process pipelines of commands
+"""
+
+import io
+import sys
+
+import pytest
+
+from clitools import CliApp
+
+
+@pytest.fixture
+def cli():
+    cli = CliApp()
+    cli.produced = []
+
+    @cli.command
+    def numbers(count=10):
+        for i in range(count):
+            cli.produced.append(i)
+            yield i
+
+    @cli.command(pipe_input='items')
+    def multiply(items, by=2):
+        for item in items:
+            yield int(item) * by
+
+    @cli.command(pipe_input='items')
+    def above(items=None, min=0):
+        return (item for item in items if item >= min)
+
+    @cli.command(pipe_input='items')
+    def total(items=None):
+        return sum(items)
+
+    @cli.command(pipe_input='items')
+    def first(items=None):
+        return next(iter(items))
+
+    return cli
+
+
+def test_pipeline(cli, capsys):
+    assert cli.run(['numbers', ':::', 'total']) == 45
+    assert cli.run(['numbers', '--count', '5', ':::', 'multiply',
+                    '--by', '3', ':::', 'above', '--min', '6', ':::',
+                    'total']) == 6 + 9 + 12
+
+    cli.run(['numbers', '--count', '3', ':::', 'multiply'])
+    out, err = capsys.readouterr()
+    assert out == '0\n2\n4\n'
+
+
+def test_pipeline_is_lazy(cli):
+    assert cli.run(['numbers', '--count', '1000000', ':::', 'multiply',
+                    ':::', 'first']) == 0
+    assert cli.produced == [0]
+
+
+def test_pipeline_errors(cli, capsys):
+    ## Nothing is run, if any of the command lines is invalid
+    with pytest.raises(SystemExit) as excinfo:
+        cli.run(['numbers', ':::', 'multiply', '--garbage'])
+    assert excinfo.value.code == 2
+    assert cli.produced == []
+
+    with pytest.raises(SystemExit):
+        cli.run(['multiply', ':::', 'numbers'])
+    out, err = capsys.readouterr()
+    assert "command 'numbers' can't take input from a pipeline" in err
+
+    with pytest.raises(SystemExit) as excinfo:
+        cli.run(['numbers', ':::'])
+    assert excinfo.value.code == 2
+    assert cli.produced == []
+
+
+def test_pipe_input_from_stdin(cli, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(u'1\n2\n3\n'))
+    cli.run(['multiply', '--by', '10'])
+    out, err = capsys.readouterr()
+    assert out == '10\n20\n30\n'
+
+    ## Also for the first command of a pipeline
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(u'1\n2\n3\n'))
+    assert cli.run(['multiply', ':::', 'total']) == 12
+
+    ## Not available as an option
+    with pytest.raises(SystemExit):
+        cli.run(['multiply', '--items', 'x'])
+
+
+def test_pipe_input_unknown_argument():
+    cli = CliApp()
+    with pytest.raises(ValueError):
+        @cli.command(pipe_input='rows')
+        def load(items):
+            pass
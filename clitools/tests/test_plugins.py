@@ -0,0 +1,76 @@
+"""
+Tests for the discovery of commands from entry points
+"""
+
+import json
+import sys
+
+import pytest
+
+from clitools import CliApp
+from clitools import plugins
+
+
+PLUGIN_MODULE = '''
+def hello(name='world'):
+    """Say hello"""
+    return 'Hello, {0}!'.format(name)
+'''
+
+ENTRY_POINTS = '''
+[clitools.commands]
+greet = clitools_plugin_cmds:hello
+broken = clitools_plugin_cmds
+
+[console_scripts]
+other = clitools_plugin_cmds:hello
+'''
+
+
+@pytest.fixture
+def plugin_dist(tmpdir, monkeypatch):
+    tmpdir.join('clitools_plugin_cmds.py').write(PLUGIN_MODULE)
+    dist_info = tmpdir.mkdir('clitools_plugin-1.0.dist-info')
+    dist_info.join('METADATA').write(
+        'Metadata-Version: 2.1\nName: clitools-plugin\nVersion: 1.0\n')
+    dist_info.join('entry_points.txt').write(ENTRY_POINTS)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    yield tmpdir
+    sys.modules.pop('clitools_plugin_cmds', None)
+
+
+def test_scan_entry_points(plugin_dist):
+    assert plugins.scan_entry_points('clitools.commands') \
+        == [('greet', 'clitools_plugin_cmds:hello')]
+    assert 'clitools_plugin_cmds' not in sys.modules
+
+
+def test_load_plugins(plugin_dist, tmpdir, monkeypatch):
+    index_path = str(tmpdir.join('cache', 'plugins.json'))
+    scans = []
+    scan_entry_points = plugins.scan_entry_points
+
+    def _scan(group):
+        scans.append(group)
+        return scan_entry_points(group)
+
+    monkeypatch.setattr(plugins, 'scan_entry_points', _scan)
+
+    cli = CliApp()
+    cli.load_plugins(index=index_path)
+    assert scans == ['clitools.commands']
+    assert json.load(open(index_path))['entry_points'] \
+        == [['greet', 'clitools_plugin_cmds:hello']]
+    assert 'clitools_plugin_cmds' not in sys.modules
+
+    ## The index is used, until distributions change
+    cli = CliApp()
+    cli.load_plugins(index=index_path)
+    assert scans == ['clitools.commands']
+    assert cli.run(['greet', '--name', 'Python']) == 'Hello, Python!'
+
+    plugin_dist.mkdir('clitools_other-2.0.dist-info')
+    cli = CliApp()
+    cli.load_plugins(index=index_path)
+    assert scans == ['clitools.commands'] * 2
+    assert cli.run(['greet']) == 'Hello, world!'
@@ -0,0 +1,76 @@
+"""
+Tests for the profiling of runs
+"""
+
+import pstats
+
+import pytest
+
+from clitools import CliApp
+
+
+@pytest.fixture(params=['eager', 'lazy'])
+def cli(request):
+    cli = CliApp(lazy=(request.param == 'lazy'))
+
+    @cli.command
+    def hello(name='world'):
+        return 'Hello, {0}!'.format(name)
+
+    @cli.command
+    def count(limit=3):
+        for i in range(limit):
+            yield i
+
+    return cli
+
+
+def _get_phases(err):
+    phases = {}
+    for line in err.split('Phases breakdown:\n', 1)[1].splitlines():
+        label, value, unit = line.strip().rsplit(None, 2)
+        phases[label] = float(value)
+    return phases
+
+
+def test_profile_text_report(cli, capsys):
+    assert cli.run(['--profile', '-', 'hello', '--name', 'Python']) \
+        == 'Hello, Python!'
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert 'function calls' in err
+
+    phases = _get_phases(err)
+    for label in ('registration', 'parsing', 'mapping', 'command',
+                  'other', 'total (run)'):
+        assert label in phases
+    if cli.lazy:
+        assert 'hello' in phases
+    else:
+        assert 'hello (before run)' in phases
+
+
+def test_profile_stats_file(cli, capsys, tmpdir):
+    stats_file = str(tmpdir.join('run.prof'))
+    assert cli.run(['count', '--limit', '2'], profile=stats_file) is None
+    out, err = capsys.readouterr()
+    assert out == '0\n1\n'
+    assert 'function calls' not in err
+    assert 'command' in _get_phases(err)
+
+    stats = pstats.Stats(stats_file)
+    assert any(func_name == 'count'
+               for _, _, func_name in stats.stats)
+
+
+def test_profile_restores_app(cli, capsys):
+    with pytest.raises(SystemExit):
+        cli.run(['--profile', '-', 'hello', '--no-such-option'])
+    out, err = capsys.readouterr()
+    assert 'Phases breakdown:' in err
+
+    assert '_dispatch' not in vars(cli)
+    assert '_parse_args' not in vars(cli)
+    assert cli.run(['hello']) == 'Hello, world!'
+    out, err = capsys.readouterr()
+    assert err == ''
@@ -0,0 +1,137 @@
+"""
+Tests for the persistent server mode
+"""
+
+from __future__ import print_function
+
+import os
+import signal
+import sys
+import tempfile
+import time
+
+import pytest
+
+from clitools import CliApp
+from clitools.client import run_client
+
+
+def _make_app():
+    cli = CliApp(lazy=True)
+
+    @cli.command
+    def hello(name='world'):
+        print("Hello, {0}!".format(name))
+
+    @cli.command
+    def env(name):
+        print(os.environ.get(name))
+
+    @cli.command
+    def cwd():
+        print(os.getcwd())
+
+    @cli.command
+    def upper():
+        for line in sys.stdin:
+            sys.stdout.write(line.upper())
+
+    @cli.command
+    def spew(size=0):
+        ## Doesn't read its input
+        sys.stdout.write('x' * size)
+
+    @cli.command
+    def pid():
+        print(os.getpid())
+
+    @cli.command
+    def fail():
+        print("Failing", file=sys.stderr)
+        sys.exit(3)
+
+    return cli
+
+
+@pytest.fixture(scope='module')
+def server():
+    socket_path = os.path.join(tempfile.mkdtemp(), 'server.sock')
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _make_app().serve(socket_path, workers=2, max_requests=3)
+        finally:
+            os._exit(0)
+
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+    yield socket_path
+
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+    assert not os.path.exists(socket_path)
+
+
+def _run(socket_path, args, stdin_data=b''):
+    with tempfile.TemporaryFile() as stdin, \
+            tempfile.TemporaryFile() as stdout, \
+            tempfile.TemporaryFile() as stderr:
+        stdin.write(stdin_data)
+        stdin.seek(0)
+        status = run_client(socket_path, args, stdin=stdin,
+                            stdout=stdout, stderr=stderr)
+        stdout.seek(0)
+        stderr.seek(0)
+        return status, stdout.read().decode(), stderr.read().decode()
+
+
+def test_server_run_command(server):
+    assert _run(server, ['hello']) == (0, 'Hello, world!\n', '')
+    assert _run(server, ['hello', '--name', 'Python']) \
+        == (0, 'Hello, Python!\n', '')
+
+
+def test_server_errors(server):
+    assert _run(server, ['fail']) == (3, '', 'Failing\n')
+
+    status, out, err = _run(server, ['hello', '--garbage'])
+    assert status == 2
+    assert 'unrecognized arguments: --garbage' in err
+
+
+def test_server_environment(server, monkeypatch, tmpdir):
+    monkeypatch.setenv('CLITOOLS_TEST_VAR', 'spam')
+    monkeypatch.chdir(str(tmpdir))
+    assert _run(server, ['env', 'CLITOOLS_TEST_VAR']) == (0, 'spam\n', '')
+    assert _run(server, ['cwd']) == (0, '{0}\n'.format(os.getcwd()), '')
+
+
+def test_server_stdin(server):
+    data = b'hello\nworld\n' * 10000
+    status, out, err = _run(server, ['upper'], stdin_data=data)
+    assert status == 0
+    assert out == data.decode().upper()
+
+
+def test_server_large_stdin(server):
+    ## More than what socket buffers can hold, both ways
+    data = b'0123456789abcde\n' * (1 << 17)
+    status, out, err = _run(server, ['upper'], stdin_data=data)
+    assert status == 0
+    assert out == data.decode().upper()
+
+    status, out, err = _run(server, ['spew', '--size', str(len(data))],
+                            stdin_data=data)
+    assert status == 0
+    assert len(out) == len(data)
+
+
+def test_server_recycles_workers(server):
+    pids = set()
+    for _ in range(10):
+        status, out, err = _run(server, ['pid'])
+        pids.add(int(out))
+    assert os.getpid() not in pids
+    assert len(pids) > 2
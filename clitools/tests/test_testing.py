@@ -0,0 +1,83 @@
+"""
+Tests for the in-process test runner
+"""
+
+import os
+import sys
+
+import pytest
+
+from clitools import CliApp
+from clitools.testing import CliRunner
+
+
+@pytest.fixture
+def runner():
+    cli = CliApp()
+
+    @cli.command
+    def getenv(name):
+        print(os.environ.get(name, '<unset>'))
+
+    @cli.command
+    def upper():
+        for line in sys.stdin:
+            print(line.strip().upper())
+
+    @cli.command
+    def touch(name):
+        open(name, 'w').close()
+        return os.path.abspath(name)
+
+    @cli.command
+    def count(path):
+        """:type path: file"""
+        return len(path.read(100))
+
+    return CliRunner(cli, env={'CLITOOLS_TEST': 'spam'})
+
+
+def test_runner_env(runner, monkeypatch):
+    monkeypatch.setenv('CLITOOLS_OTHER', 'eggs')
+
+    result = runner.invoke(['getenv', 'CLITOOLS_TEST'])
+    assert result.exit_code == 0
+    assert result.stdout == 'spam\n'
+    assert 'CLITOOLS_TEST' not in os.environ
+
+    result = runner.invoke('getenv CLITOOLS_TEST',
+                           env={'CLITOOLS_TEST': 'bacon'})
+    assert result.stdout == 'bacon\n'
+
+    result = runner.invoke('getenv CLITOOLS_OTHER',
+                           env={'CLITOOLS_OTHER': None})
+    assert result.stdout == '<unset>\n'
+    assert os.environ['CLITOOLS_OTHER'] == 'eggs'
+
+
+def test_runner_input(runner):
+    result = runner.invoke(['upper'], input=u'hello\nworld\n')
+    assert result.stdout == 'HELLO\nWORLD\n'
+
+    assert runner.invoke(['upper']).stdout == ''
+
+    ## Binary input, for file arguments
+    assert runner.invoke(['count', '-'], input=b'12345').return_value == 5
+
+
+def test_runner_filesystem(runner):
+    cwd = os.getcwd()
+    with runner.isolated_filesystem() as path:
+        result = runner.invoke(['touch', 'test.txt'])
+        assert result.exit_code == 0
+        assert os.path.realpath(os.path.dirname(result.return_value)) \
+            == os.path.realpath(path)
+        assert os.path.exists(os.path.join(path, 'test.txt'))
+        assert os.getcwd() == cwd
+    assert not os.path.exists(path)
+
+
+def test_runner_errors(runner):
+    result = runner.invoke(['getenv'])
+    assert result.exit_code == 2
+    assert 'usage:' in result.stderr
@@ -0,0 +1,110 @@
+"""
+Prefix tree of command names.
+
+Used to expand abbreviated command names, and to suggest the nearest
+names for mistyped ones: the edit distance is computed while walking
+the tree, one row per node, so that shared prefixes are only computed
+once, and branches are abandoned as soon as they can't get within the
+maximum distance.
+"""
+
+from __future__ import absolute_import
+
+
+## Key marking the end of a word, in trie nodes
+_END = None
+
+
+class Trie(object):
+    """
+    Prefix tree of words
+
+    >>> trie = Trie(['start', 'status', 'stop'])
+    >>> trie.with_prefix('sta')
+    ['start', 'status']
+    >>> trie.suggest('stauts')
+    ['status']
+    """
+
+    def __init__(self, words=()):
+        self.root = {}
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        if _END not in node:
+            self.size += 1
+        node[_END] = word
+
+    def __contains__(self, word):
+        node = self._find(word)
+        return node is not None and _END in node
+
+    def _find(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def with_prefix(self, prefix):
+        """:return: the sorted list of words starting with ``prefix``"""
+        node = self._find(prefix)
+        if node is None:
+            return []
+        words = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char is _END:
+                    words.append(child)
+                else:
+                    stack.append(child)
+        return sorted(words)
+
+    def suggest(self, word, max_distance=2, limit=3):
+        """
+        Find the words nearest to a given one, by edit distance
+        (counting transpositions of adjacent characters as one edit).
+
+        :return: up to ``limit`` of the nearest words, if within
+            ``max_distance``
+        """
+        found = []
+        first_row = list(range(len(word) + 1))
+
+        def walk(node, char, prev_char, prev_row, prev_prev_row):
+            row = [prev_row[0] + 1]
+            for i in range(1, len(word) + 1):
+                cost = 0 if word[i - 1] == char else 1
+                value = min(row[i - 1] + 1, prev_row[i] + 1,
+                            prev_row[i - 1] + cost)
+                if i > 1 and prev_prev_row is not None \
+                        and word[i - 1] == prev_char \
+                        and word[i - 2] == char:
+                    value = min(value, prev_prev_row[i - 2] + 1)
+                row.append(value)
+
+            if _END in node and row[-1] <= max_distance:
+                found.append((row[-1], node[_END]))
+            if min(row) <= max_distance:
+                for next_char, child in node.items():
+                    if next_char is not _END:
+                        walk(child, next_char, char, row, prev_row)
+
+        for char, child in self.root.items():
+            if char is not _END:
+                walk(child, char, None, first_row, None)
+
+        if not found:
+            return []
+        found.sort()
+        nearest = found[0][0]
+        return [name for distance, name in found[:limit]
+                if distance == nearest]
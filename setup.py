@@ -17,9 +17,9 @@ tests_require = [
     'pytest-cov',
 ]
 
+## The sources run unchanged on Python 3 (recent setuptools don't
+## support use_2to3 anymore)
 extra = {}
-if sys.version_info >= (3,):
-    extra['use_2to3'] = True
 
 
 class PyTest(TestCommand):
@@ -162,5 +162,11 @@ setup(
         "Programming Language :: Python :: Implementation :: PyPy",
     ],
     package_data={'': ['README.md', 'LICENSE']},
+    entry_points={
+        'console_scripts': [
+            'clitools = clitools.__main__:main',
+            'clitools-client = clitools.client:main',
+        ],
+    },
     cmdclass={'test': PyTest},
     **extra)